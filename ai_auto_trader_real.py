@@ -1,13 +1,20 @@
 import time
 import json
 import os
+import glob
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import pandas as pd
-from sqlalchemy import create_engine, text
-from kraken_client import get_price, get_balance, place_market_order
-from strategie import calculeaza_semnal
-
-print(f"[{datetime.now()}] 🚀 Bot started with SQLAlchemy...")
+from kraken_client import get_prices, get_balance, place_market_order, query_orders, SoldCache
+from strategie import calculeaza_semnal, aplica_candela
+from technical_indicators import StreamingEMA
+from db_writer import DBWriter, opreste_la_sigterm
+from order_manager import OrderManager
+from kraken_ws import KrakenFeed
+from candle_aggregator import AgregatorLumanari
+import metrics
 
 # -------------------- CONFIG --------------------
 db_url = os.getenv("DATABASE_URL")
@@ -25,150 +32,180 @@ DCA_DROP_PCT         = 5.0   # cumpără suplimentar dacă prețul a scăzut cu
 REENTRY_COOLDOWN_SEC = 300   # 5 minute cooldown după vânzare
 REENTRY_DROP_PCT     = 1.0   # re-intră doar dacă prețul e cu ≥1% sub ultimul preț de vânzare
 
+# 📈 Trend EMA50/EMA200 pe prețurile tick (încălzit la pornire cu ultimele TREND_SEED_LEN prețuri din DB)
+TREND_SEED_LEN = 400
+
+# ⚙️ Mod motor: "sync" (buclă secvențială) sau "async" (simboluri evaluate concurent)
+ENGINE_MODE   = os.getenv("ENGINE_MODE", "sync")
+ASYNC_WORKERS = int(os.getenv("ASYNC_WORKERS", "32"))
+
+# 🔁 Re-optimizare walk-forward în fundal (proces în același dyno → același strategy.json).
+# Opt-in: rescrie strategia live nesupravegheat.
+OPTIMIZER_WALK_FORWARD = os.getenv("OPTIMIZER_WALK_FORWARD", "0") == "1"
+
+# 📡 Date de piață: "rest" (Ticker/OHLC la fiecare tick) sau "ws" (feed WebSocket Kraken)
+MARKET_DATA = os.getenv("MARKET_DATA", "rest")
+
+# 🕯️ Lumânări locale (1m/5m/15m/1h) din prețurile fiecărui tick → buffer-ele OHLC ale strategiei
+# se actualizează fără request-uri; "0" = OHLC doar din REST/WS
+LOCAL_CANDLES = os.getenv("LOCAL_CANDLES", "1") == "1"
+
+# 💾 Snapshot local al pozițiilor (repornire rapidă, păstrează intrarea/trailing-ul/re-entry)
+POSITIONS_FILE = os.getenv("POSITIONS_FILE", "pozitii.json")
+
 # -------------------- DB INIT --------------------
-try:
-    engine = create_engine(db_url)
-    conn = engine.connect()
-    print(f"[{datetime.now()}] ✅ Connected to Postgres (schema={DB_SCHEMA})")
-
-    with engine.begin() as con:
-        con.execute(text(f"CREATE SCHEMA IF NOT EXISTS {DB_SCHEMA};"))
-        con.execute(text(f"""
-            CREATE TABLE IF NOT EXISTS {DB_SCHEMA}.signals (
-                id SERIAL PRIMARY KEY,
-                timestamp TIMESTAMP NOT NULL,
-                symbol TEXT NOT NULL,
-                signal TEXT NOT NULL,
-                price NUMERIC,
-                risk_score NUMERIC,
-                volatility NUMERIC
-            )
-        """))
-        con.execute(text(f"""
-            CREATE TABLE IF NOT EXISTS {DB_SCHEMA}.prices (
-                id SERIAL PRIMARY KEY,
-                timestamp TIMESTAMP NOT NULL,
-                symbol TEXT NOT NULL,
-                price NUMERIC
-            )
-        """))
-        con.execute(text(f"""
-            CREATE TABLE IF NOT EXISTS {DB_SCHEMA}.trades (
-                id SERIAL PRIMARY KEY,
-                timestamp TIMESTAMP NOT NULL,
-                symbol TEXT NOT NULL,
-                action TEXT NOT NULL,
-                quantity NUMERIC,
-                price NUMERIC,
-                profit_pct NUMERIC,
-                profit_eur NUMERIC,
-                status TEXT
-            )
-        """))
-        con.execute(text(f"""
-            CREATE TABLE IF NOT EXISTS {DB_SCHEMA}.analysis (
-                id SERIAL PRIMARY KEY,
-                timestamp TIMESTAMP NOT NULL,
-                symbol TEXT NOT NULL,
-                buys INT,
-                sells INT,
-                avg_profit NUMERIC,
-                total_profit NUMERIC,
-                total_profit_eur NUMERIC
-            )
-        """))
-        # safety: coloane
-        con.execute(text(f"ALTER TABLE {DB_SCHEMA}.trades   ADD COLUMN IF NOT EXISTS profit_eur NUMERIC;"))
-        con.execute(text(f"ALTER TABLE {DB_SCHEMA}.analysis ADD COLUMN IF NOT EXISTS total_profit_eur NUMERIC;"))
-
-    print(f"[{datetime.now()}] ✅ DB tables ready in schema {DB_SCHEMA}")
-except Exception as e:
-    print(f"[{datetime.now()}] ❌ DB connection error: {e}")
-    conn = None
+# la pornirea botului (initializeaza_bot), nu la import: modulul se importă fără DB/rețea
+engine = None
+conn = None
+writer = None
+
+def initializeaza_db():
+    global engine, conn, writer
+    if conn is not None:
+        return
+    # SQLAlchemy + schema doar cu DB: importul botului (teste, replay, shard-uri) rămâne ușor
+    from sqlalchemy import create_engine
+    from db_schema import asigura_schema, porneste_retentie
+    try:
+        engine = create_engine(db_url)
+        conn = engine.connect()
+        print(f"[{datetime.now()}] ✅ Connected to Postgres (schema={DB_SCHEMA})")
+
+        asigura_schema(engine, DB_SCHEMA)
+        print(f"[{datetime.now()}] ✅ DB tables ready in schema {DB_SCHEMA}")
+        writer = DBWriter(engine, DB_SCHEMA).start()
+        if os.getenv("SHARD_INDEX") is None:   # în modul shard retenția rulează doar în coordonator
+            porneste_retentie(engine, DB_SCHEMA)
+    except Exception as e:
+        print(f"[{datetime.now()}] ❌ DB connection error: {e}")
+        conn = None
+        writer = None
 
 # -------------------- DB HELPERS --------------------
 def log_signal_db(symbol, signal, price, risk, vol):
     if not conn: return
-    try:
-        with engine.begin() as con:
-            con.execute(
-                text(f"INSERT INTO {DB_SCHEMA}.signals (timestamp, symbol, signal, price, risk_score, volatility) "
-                     "VALUES (:ts, :symbol, :signal, :price, :risk, :vol)"),
-                {"ts": datetime.now(), "symbol": symbol, "signal": str(signal),
-                 "price": float(price), "risk": float(risk) if risk is not None else None,
-                 "vol": float(vol) if vol is not None else None}
-            )
-        print(f"[{datetime.now()}] ✅ Semnal salvat în DB: {symbol}={signal}")
-    except Exception as e:
-        print(f"[{datetime.now()}] ❌ Eroare log_signal_db: {e}")
+    writer.put("signals", {"timestamp": datetime.now(), "symbol": symbol, "signal": str(signal),
+                           "price": float(price), "risk_score": float(risk) if risk is not None else None,
+                           "volatility": float(vol) if vol is not None else None})
+    print(f"[{datetime.now()}] ✅ Semnal trimis spre DB: {symbol}={signal}")
 
 def log_price_db(symbol, price):
     if not conn: return
-    try:
-        with engine.begin() as con:
-            con.execute(
-                text(f"INSERT INTO {DB_SCHEMA}.prices (timestamp, symbol, price) VALUES (:ts, :symbol, :price)"),
-                {"ts": datetime.now(), "symbol": symbol, "price": float(price)}
-            )
-        print(f"[{datetime.now()}] ✅ Preț salvat în DB: {symbol}={price}")
-    except Exception as e:
-        print(f"[{datetime.now()}] ❌ Eroare log_price_db: {e}")
+    writer.put("prices", {"timestamp": datetime.now(), "symbol": symbol, "price": float(price)})
+    print(f"[{datetime.now()}] ✅ Preț trimis spre DB: {symbol}={price}")
 
-def log_trade_db(symbol, action, qty, price, profit_pct, profit_eur, status="EXECUTED"):
+def log_trade_db(symbol, action, qty, price, profit_pct, profit_eur, status="EXECUTED", txid=None, fee=None):
+    actualizeaza_sumar(symbol, action, profit_pct, profit_eur)
     if not conn: return
-    try:
-        with engine.begin() as con:
-            con.execute(
-                text(f"""
-                    INSERT INTO {DB_SCHEMA}.trades
-                    (timestamp, symbol, action, quantity, price, profit_pct, profit_eur, status)
-                    VALUES (:ts, :symbol, :action, :qty, :price, :profit_pct, :profit_eur, :status)
-                """),
-                {"ts": datetime.now(), "symbol": symbol, "action": action,
-                 "qty": float(qty), "price": float(price),
-                 "profit_pct": float(profit_pct), "profit_eur": float(profit_eur),
-                 "status": status}
-            )
-        print(f"[{datetime.now()}] 💾 Tranzacție salvată: {symbol} {action} @ {price:.2f}")
-    except Exception as e:
-        print(f"[{datetime.now()}] ❌ log_trade_db error: {e}")
-
-def log_analysis_db(df):
+    # tranzacțiile sunt urgente → flush imediat în thread-ul writer-ului
+    writer.put("trades", {"timestamp": datetime.now(), "symbol": symbol, "action": action,
+                          "quantity": float(qty), "price": float(price),
+                          "profit_pct": float(profit_pct), "profit_eur": float(profit_eur),
+                          "status": status, "txid": txid,
+                          "fee": float(fee) if fee is not None else None}, urgent=True)
+    print(f"[{datetime.now()}] 💾 Tranzacție salvată: {symbol} {action} @ {price:.2f}")
+
+def log_trade_fill(txid, qty, price, fee, profit_pct, profit_eur, status="FILLED"):
+    # rândul din trades (după txid) primește execuția reală
+    if not conn or not txid: return
+    writer.put("trades_fill", {"txid": txid, "quantity": float(qty), "price": float(price), "fee": float(fee),
+                               "profit_pct": float(profit_pct), "profit_eur": float(profit_eur),
+                               "status": status}, urgent=True)
+
+def log_analysis_db(rows):
+    if not conn: return
+    ts = datetime.now()
+    if not rows:
+        writer.put("analysis", {"timestamp": ts, "symbol": "NONE", "buys": 0, "sells": 0,
+                                "avg_profit": 0.0, "total_profit": 0.0, "total_profit_eur": 0.0})
+        print(f"[{datetime.now()}] ⏳ Analiză rulată – fără tranzacții noi.")
+        return
+    for row in rows:
+        writer.put("analysis", {"timestamp": ts, **row})
+    print(f"[{datetime.now()}] ✅ Analiză trimisă spre DB ({len(rows)} simboluri)")
+
+# -------------------- SUMAR TRANZACȚII (incremental) --------------------
+# {symbol: {"buys", "sells", "n_profit", "total_profit", "total_profit_eur"}}
+sumar_tranzactii = {}
+lacat_sumar = threading.Lock()
+
+def incarca_sumar():
+    # o singură agregare în SQL la pornire; apoi totul se actualizează din log_trade_db
     if not conn: return
+    from sqlalchemy import text
     try:
-        if df.empty:
-            with engine.begin() as con:
-                con.execute(
-                    text(f"""
-                        INSERT INTO {DB_SCHEMA}.analysis
-                        (timestamp, symbol, buys, sells, avg_profit, total_profit, total_profit_eur)
-                        VALUES (:ts, 'NONE', 0, 0, 0, 0, 0)
-                    """), {"ts": datetime.now()}
-                )
-            print(f"[{datetime.now()}] ⏳ Analiză rulată – fără tranzacții noi.")
-            return
-        with engine.begin() as con:
-            for row in df.itertuples():
-                con.execute(
-                    text(f"""
-                        INSERT INTO {DB_SCHEMA}.analysis
-                        (timestamp, symbol, buys, sells, avg_profit, total_profit, total_profit_eur)
-                        VALUES (:ts, :symbol, :buys, :sells, :avg_profit, :total_profit, :total_profit_eur)
-                    """),
-                    {"ts": datetime.now(), "symbol": row.symbol,
-                     "buys": int(row.buys), "sells": int(row.sells),
-                     "avg_profit": float(row.avg_profit) if row.avg_profit is not None else 0.0,
-                     "total_profit": float(row.total_profit) if row.total_profit is not None else 0.0,
-                     "total_profit_eur": float(row.total_profit_eur) if row.total_profit_eur is not None else 0.0}
-                )
-        print(f"[{datetime.now()}] ✅ Analiză salvată ({len(df)} simboluri)")
+        with engine.connect() as con:
+            rows = con.execute(text(f"""
+                SELECT symbol,
+                       COUNT(*) FILTER (WHERE action IN ('BUY', 'BUY_DCA')) AS buys,
+                       COUNT(*) FILTER (WHERE action LIKE 'SELL%')           AS sells,
+                       COUNT(profit_pct)                                    AS n_profit,
+                       COALESCE(SUM(profit_pct), 0)                         AS total_profit,
+                       COALESCE(SUM(profit_eur), 0)                         AS total_profit_eur
+                FROM {DB_SCHEMA}.trades
+                WHERE status IS NULL OR status NOT IN ('CANCELED', 'EXPIRED')   -- ordine neexecutate
+                GROUP BY symbol
+            """)).fetchall()
+        with lacat_sumar:
+            for r in rows:
+                sumar_tranzactii[r.symbol] = {"buys": int(r.buys), "sells": int(r.sells),
+                                              "n_profit": int(r.n_profit),
+                                              "total_profit": float(r.total_profit),
+                                              "total_profit_eur": float(r.total_profit_eur)}
+        print(f"[{datetime.now()}] ✅ Sumar tranzacții încărcat ({len(rows)} simboluri)")
     except Exception as e:
-        print(f"[{datetime.now()}] ❌ Eroare log_analysis_db: {e}")
+        print(f"[{datetime.now()}] ⚠️ Eroare încărcare sumar: {e}")
+
+def actualizeaza_sumar(symbol, action, profit_pct, profit_eur):
+    with lacat_sumar:
+        agg = sumar_tranzactii.setdefault(symbol, {"buys": 0, "sells": 0, "n_profit": 0,
+                                                   "total_profit": 0.0, "total_profit_eur": 0.0})
+        if action in ("BUY", "BUY_DCA"):
+            agg["buys"] += 1
+        elif action.startswith("SELL"):
+            agg["sells"] += 1
+        agg["n_profit"] += 1
+        agg["total_profit"] += float(profit_pct)
+        agg["total_profit_eur"] += float(profit_eur)
+
+def anuleaza_sumar(symbol, action, profit_pct, profit_eur):
+    # ordin trimis (numărat în log_trade_db) dar anulat/expirat fără execuție
+    with lacat_sumar:
+        agg = sumar_tranzactii.get(symbol)
+        if agg is None:
+            return
+        if action in ("BUY", "BUY_DCA"):
+            agg["buys"] -= 1
+        elif action.startswith("SELL"):
+            agg["sells"] -= 1
+        agg["n_profit"] -= 1
+        agg["total_profit"] -= float(profit_pct)
+        agg["total_profit_eur"] -= float(profit_eur)
+
+def corecteaza_sumar(symbol, delta_pct, delta_eur):
+    # profitul estimat la trimiterea ordinului → profitul din execuția reală
+    with lacat_sumar:
+        agg = sumar_tranzactii.get(symbol)
+        if agg is not None:
+            agg["total_profit"] += float(delta_pct)
+            agg["total_profit_eur"] += float(delta_eur)
 
 # -------------------- STRATEGIE --------------------
+STRATEGY_FILE = "strategy.json"
+_semnatura_strategie = None   # (inode, mtime, mărime) la ultima citire
+
+def semnatura_strategie():
+    try:
+        st = os.stat(STRATEGY_FILE)
+        return (st.st_ino, st.st_mtime_ns, st.st_size)
+    except OSError:
+        return None
+
 def incarca_strategia():
+    global _semnatura_strategie
+    _semnatura_strategie = semnatura_strategie()
     try:
-        with open("strategy.json", "r") as f:
+        with open(STRATEGY_FILE, "r") as f:
             strat = json.load(f)
         print(f"[{datetime.now()}] ✅ Strategie încărcată: {strat}")
         return strat
@@ -181,221 +218,662 @@ def incarca_strategia():
             "Stop_Loss": 0.0, "Take_Profit": 4.0, "Trailing_TP": 1.5
         }
 
+def valideaza_strategia(strat):
+    # ValueError dacă strategia nu e utilizabilă (cheile lipsă opționale iau valorile implicite)
+    if not isinstance(strat, dict):
+        raise ValueError("nu e un obiect JSON")
+    for cheie in ("symbols", "allocations", "Take_Profit", "Trailing_TP"):
+        if cheie not in strat:
+            raise ValueError(f"lipsește {cheie}")
+    if not isinstance(strat["symbols"], list) or not strat["symbols"] \
+            or not all(isinstance(s, str) for s in strat["symbols"]):
+        raise ValueError("symbols trebuie să fie o listă nevidă de perechi")
+    alocari = strat["allocations"]
+    if not isinstance(alocari, dict) or any(not isinstance(v, (int, float)) or v < 0 for v in alocari.values()):
+        raise ValueError("allocations trebuie să fie {pereche: pondere ≥ 0}")
+    for cheie, minim in (("RSI_Period", 2), ("MACD_Fast", 1), ("MACD_Slow", 1), ("MACD_Signal", 1)):
+        if cheie in strat and (not isinstance(strat[cheie], int) or strat[cheie] < minim):
+            raise ValueError(f"{cheie} trebuie să fie întreg ≥ {minim}")
+    for cheie in ("RSI_OS", "RSI_OB", "Stop_Loss", "Take_Profit", "Trailing_TP"):
+        if cheie in strat and (not isinstance(strat[cheie], (int, float)) or strat[cheie] < 0):
+            raise ValueError(f"{cheie} trebuie să fie un număr ≥ 0")
+    if strat.get("RSI_OS", 35) >= strat.get("RSI_OB", 65):
+        raise ValueError("RSI_OS trebuie să fie sub RSI_OB")
+    if strat.get("MACD_Fast", 12) >= strat.get("MACD_Slow", 26):
+        raise ValueError("MACD_Fast trebuie să fie sub MACD_Slow")
+
+def verifica_strategie(strat):
+    # ⚡ un stat() per tick; fișierul e citit doar când inode/mtime/mărimea s-au schimbat.
+    # Strategia validă e aplicată pe loc în dict-ul `strat` (îl văd bucla, feed-ul WS, ieșirile),
+    # sub lacat_pozitii → nicio decizie nu vede o strategie pe jumătate schimbată.
+    global _semnatura_strategie
+    semnatura = semnatura_strategie()
+    if semnatura is None or semnatura == _semnatura_strategie:
+        return False
+    _semnatura_strategie = semnatura
+    try:
+        with open(STRATEGY_FILE, "r") as f:
+            nou = json.load(f)
+        valideaza_strategia(nou)
+    except (OSError, ValueError) as e:
+        print(f"[{datetime.now()}] ⚠️ {STRATEGY_FILE} modificat, dar invalid — păstrez strategia curentă: {e}")
+        metrics.incrementeaza("erori", eticheta="strategie")
+        return False
+
+    if nou["symbols"] != strat["symbols"]:
+        print(f"[{datetime.now()}] ⚠️ Lista de simboluri se aplică doar la repornire — păstrez {strat['symbols']}")
+        nou["symbols"] = strat["symbols"]
+    schimbari = {k: nou.get(k) for k in set(nou) | set(strat) if nou.get(k) != strat.get(k)}
+    if not schimbari:
+        return False
+    with lacat_pozitii:
+        for k in set(strat) - set(nou):
+            del strat[k]
+        strat.update(nou)
+    # indicatorii își verifică parametrii la următorul semnal: se reconstruiesc doar cei schimbați
+    print(f"[{datetime.now()}] 🔁 Strategie reîncărcată: {schimbari}")
+    metrics.incrementeaza("strategie_reincarcata")
+    return True
+
 # -------------------- POZIȚII --------------------
+def pozitie_goala():
+    return {"deschis": False, "pret_intrare": 0.0, "cantitate": 0.0, "max_profit": 0.0,
+            "last_sell_time": None, "last_sell_price": None}
+
+# -------------------- SNAPSHOT POZIȚII --------------------
+# Scris atomic (tmp + os.replace) după fiecare schimbare de stare; la pornire se încarcă
+# din fișier, iar exchange-ul e folosit doar pentru reconciliere (un Balance + un Ticker).
+# În modul shard fiecare proces are fișierul lui; la încărcare câștigă cel mai recent.
+pozitii_active = None      # dict-ul live de poziții, setat în initializeaza_bot
+lacat_snapshot = threading.RLock()   # reentrant: handler-ul SIGTERM salvează din thread-ul principal
+_ultimul_snapshot = None
+
+def fisier_snapshot():
+    shard = os.getenv("SHARD_INDEX")
+    if shard is None:
+        return POSITIONS_FILE
+    baza, ext = os.path.splitext(POSITIONS_FILE)
+    return f"{baza}.shard{shard}{ext}"
+
+def _serializeaza(p):
+    return {k: v.isoformat() if isinstance(v, datetime) else v for k, v in p.items()}
+
+def salveaza_pozitii():
+    global _ultimul_snapshot
+    if pozitii_active is None:
+        return
+    with lacat_pozitii:
+        continut = json.dumps({s: _serializeaza(p) for s, p in pozitii_active.items()},
+                              sort_keys=True, separators=(",", ":"))
+    with lacat_snapshot:
+        if continut == _ultimul_snapshot:
+            return   # nimic nou (ex. tick fără schimbare de max_profit)
+        fisier = fisier_snapshot()
+        salvat_la = datetime.now()
+        if conn:
+            # copia din Postgres: fișierul local se pierde la deploy/restart (filesystem efemer);
+            # urgent → scrisă imediat (după fill-uri) și reîncercată dacă DB-ul cade
+            writer.put("position_snapshots", {"cheie": os.path.basename(fisier), "salvat_la": salvat_la,
+                                              "pozitii": continut}, urgent=True)
+        tmp = f"{fisier}.tmp"
+        try:
+            with open(tmp, "w") as f:
+                f.write(f'{{"salvat_la":"{salvat_la.isoformat()}","pozitii":{continut}}}')
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, fisier)
+            _ultimul_snapshot = continut
+        except OSError as e:
+            metrics.incrementeaza("erori", eticheta="snapshot")
+            print(f"[{datetime.now()}] ⚠️ Snapshot poziții nesalvat: {e}")
+
+def _snapshoturi_db():
+    # {cheie: (salvat_la, poziții)} din Postgres — sursa după un deploy, când fișierele lipsesc
+    if not conn:
+        return {}
+    from sqlalchemy import text
+    try:
+        with engine.connect() as con:
+            rows = con.execute(text(f"SELECT cheie, salvat_la, pozitii FROM {DB_SCHEMA}.position_snapshots")).fetchall()
+        return {r[0]: (r[1].isoformat(), r[2]) for r in rows}
+    except Exception as e:
+        print(f"[{datetime.now()}] ⚠️ Snapshot DB indisponibil: {e}")
+        return {}
+
+def incarca_snapshot():
+    # {simbol: poziție} din toate snapshot-urile (inclusiv ale altor shard-uri);
+    # per fișier, varianta mai nouă dintre cea locală și cea din Postgres
+    baza, ext = os.path.splitext(POSITIONS_FILE)
+    snapshoturi = _snapshoturi_db()
+    for fisier in glob.glob(f"{baza}*{ext}"):
+        try:
+            with open(fisier) as f:
+                date = json.load(f)
+            cheie = os.path.basename(fisier)
+            if cheie not in snapshoturi or date["salvat_la"] >= snapshoturi[cheie][0]:
+                snapshoturi[cheie] = (date["salvat_la"], date["pozitii"])
+        except (OSError, ValueError, KeyError) as e:
+            print(f"[{datetime.now()}] ⚠️ Snapshot ignorat ({fisier}): {e}")
+    pozitii = {}
+    for _, continut in sorted(snapshoturi.values(), key=lambda x: x[0]):
+        for s, p in continut.items():
+            poz = pozitie_goala()
+            poz.update(p)
+            if poz["last_sell_time"]:
+                poz["last_sell_time"] = datetime.fromisoformat(poz["last_sell_time"])
+            pozitii[s] = poz
+    return pozitii
+
+# ceasul deciziilor (cooldown re-intrare); înlocuit de ceasul simulat în replay
+def acum():
+    return datetime.now()
+
+# sold din cache: actualizat de ordinele noastre, reconciliat cu Kraken la BALANCE_RECONCILE_SEC
+# (lambda → replay-ul poate înlocui get_balance)
+sold_cache = SoldCache(lambda: get_balance())
+
+# modul shard (sharding.py): proxy către coordonatorul care deține soldul EUR comun;
+# înlocuiește și sold_cache, ca toate shard-urile să rezerve din același sold
+coordonator = None
+
+def activ_baza(s):
+    return PAIR_TO_BAL_KEY.get(s, s.replace("ZEUR", ""))
+
+# -------------------- ORDINE (ne-blocante, urmărite până la execuție) --------------------
+def executa_ordin(side, volume, s, pret, actiune, p, inainte, profit_pct=0.0, profit_eur=0.0):
+    # apelantul a actualizat deja poziția `p` (optimist, la prețul ticker-ului);
+    # `inainte` = starea refăcută dacă ordinul e respins
+    sold_cache.aplica_ordin(side, volume, activ_baza(s), pret, FEE_RATE / 2, s)
+    ordine.trimite({"side": side, "volume": float(volume), "pair": s, "pret": float(pret), "actiune": actiune,
+                    "p": p, "inainte": inainte, "profit_pct": profit_pct, "profit_eur": profit_eur})
+
+def _ordin_trimis(o):
+    log_trade_db(o["pair"], o["actiune"], o["volume"], o["pret"], o["profit_pct"], o["profit_eur"],
+                 status="SUBMITTED", txid=o["txid"])
+
+def _ordin_esuat(o, eroare):
+    print(f"[{datetime.now()}] ❌ {o['pair']}: ordin {o['actiune']} eșuat: {eroare} — refac poziția")
+    sold_cache.invalideaza()
+    with lacat_pozitii:
+        o["p"].update(o["inainte"])
+    salveaza_pozitii()
+    if "trimis_la" in o:
+        # acceptat de exchange (deja în sumar), apoi anulat/expirat fără execuție
+        anuleaza_sumar(o["pair"], o["actiune"], o["profit_pct"], o["profit_eur"])
+
+def _ordin_executat(o, fill):
+    s, p, txid = o["pair"], o["p"], o.get("txid")
+    vol, pret_real, fee = fill["vol"], fill["pret"], fill["fee"]
+    # execuția e deja în soldul unui Balance cerut după ea → fără corecția estimării
+    executat_la = fill.get("inchis_la") or o.get("trimis_la")
+    if vol <= BALANCE_EPS:
+        _ordin_esuat(o, f"status={fill['status']}, neexecutat")
+        log_trade_fill(txid, 0.0, o["pret"], 0.0, 0.0, 0.0, status=fill["status"].upper())
+        return
+
+    valoare_est = o["volume"] * o["pret"]
+    with lacat_pozitii:
+        if o["side"] == "buy":
+            # înlocuiește contribuția estimată cu cea reală în media de intrare
+            if p["deschis"]:
+                qty = p["cantitate"] - o["volume"] + vol
+                if qty > BALANCE_EPS:
+                    cost = p["pret_intrare"] * p["cantitate"] - valoare_est + pret_real * vol
+                    p.update({"pret_intrare": cost / qty, "cantitate": qty})
+            profit_pct, profit_eur = 0.0, 0.0
+            sold_cache.ajusteaza("ZEUR", valoare_est * (1 + FEE_RATE / 2) - (fill["cost"] + fee), executat_la)
+            sold_cache.ajusteaza(activ_baza(s), vol - o["volume"], executat_la)
+        else:
+            intrare = o["inainte"]["pret_intrare"]
+            profit_pct = ((pret_real - intrare) / intrare * 100.0) if intrare > 0 else 0.0
+            profit_eur = (pret_real - intrare) * vol - fee - intrare * vol * FEE_RATE / 2
+            if not p["deschis"]:
+                p["last_sell_price"] = pret_real
+                rest = o["volume"] - vol
+                if rest > BALANCE_EPS:
+                    # vânzare parțială: restul rămâne poziție deschisă
+                    p.update({"deschis": True, "cantitate": rest, "pret_intrare": intrare})
+                    print(f"[{datetime.now()}] ⚠️ {s}: vânzare parțială {vol:.8f}/{o['volume']:.8f} — rest {rest:.8f} rămâne deschis")
+            sold_cache.ajusteaza("ZEUR", (fill["cost"] - fee) - valoare_est * (1 - FEE_RATE / 2), executat_la)
+            sold_cache.ajusteaza(activ_baza(s), o["volume"] - vol, executat_la)
+    salveaza_pozitii()
+
+    if profit_pct != o["profit_pct"] or profit_eur != o["profit_eur"]:
+        corecteaza_sumar(s, profit_pct - o["profit_pct"], profit_eur - o["profit_eur"])
+    log_trade_fill(txid, vol, pret_real, fee, profit_pct, profit_eur,
+                   status="FILLED" if fill["status"] == "closed" else fill["status"].upper())
+    print(f"[{datetime.now()}] 📬 {s} {o['actiune']} executat: {vol:.8f} @ {pret_real:.2f} "
+          f"(estimat {o['pret']:.2f}) | fee={fee:.4f}€ | TXID={txid}")
+
+ordine = OrderManager(place_market_order, query_orders, _ordin_trimis, _ordin_executat, _ordin_esuat)
+
 def sincronizeaza_pozitii(pozitii, strategie):
-    balans = get_balance()
-    print(f"[{datetime.now()}] 🔄 Resincronizare poziții...")
-    for s in strategie.get("symbols", []):
-        key = PAIR_TO_BAL_KEY.get(s, s.replace("ZEUR",""))
-        qty = float(balans.get(key, 0.0))
+    # snapshot local + o singură reconciliere: un Balance și un Ticker (doar pentru
+    # pozițiile găsite pe exchange fără intrare cunoscută)
+    snapshot = incarca_snapshot()
+    balans = sold_cache.get(fortat=True)
+    print(f"[{datetime.now()}] 🔄 Resincronizare poziții (snapshot: {len(snapshot)} simboluri)...")
+    symbols = list(pozitii)   # simbolurile acestui proces (în modul shard, doar subsetul lui)
+    cantitati = {s: float(balans.get(activ_baza(s), 0.0)) for s in symbols}
+    fara_intrare = [s for s in symbols if cantitati[s] > BALANCE_EPS
+                    and not (snapshot.get(s, {}).get("deschis") and snapshot[s]["pret_intrare"] > 0)]
+    preturi = get_prices(fara_intrare) if fara_intrare else {}
+    for s in symbols:
+        qty = cantitati[s]
+        p = snapshot.get(s, pozitie_goala())
         if qty > BALANCE_EPS:
-            pret = float(get_price(s))
-            pozitii[s] = {
-                "deschis": True,
-                "pret_intrare": pret,     # dacă vrei, poți înlocui cu ultimul BUY din DB
-                "cantitate": qty,
-                "max_profit": 0.0,
-                "last_sell_time": None,
-                "last_sell_price": None
-            }
-            print(f"[{datetime.now()}] 🔎 {s}: OPEN qty={qty}")
+            if s in fara_intrare:
+                # deschisă în afara botului (sau fără snapshot): intrarea = prețul curent
+                p.update({"deschis": True, "pret_intrare": float(preturi.get(s, 0.0)), "max_profit": 0.0})
+            elif abs(p["cantitate"] - qty) > BALANCE_EPS:
+                print(f"[{datetime.now()}] 🔁 {s}: cantitate snapshot {p['cantitate']:.8f} → exchange {qty:.8f}")
+            p["cantitate"] = qty
+            print(f"[{datetime.now()}] 🔎 {s}: OPEN qty={qty} @ {p['pret_intrare']:.2f} | max={p['max_profit']:.2f}%")
         else:
-            pozitii[s] = {
-                "deschis": False,
-                "pret_intrare": 0.0,
-                "cantitate": 0.0,
-                "max_profit": 0.0,
-                "last_sell_time": None,
-                "last_sell_price": None
-            }
+            if p["deschis"]:
+                print(f"[{datetime.now()}] ⚠️ {s}: deschisă în snapshot, dar fără sold pe exchange — închid")
+            p.update({"deschis": False, "pret_intrare": 0.0, "cantitate": 0.0, "max_profit": 0.0})
             print(f"[{datetime.now()}] 🔒 {s}: fără poziție activă")
+        pozitii[s] = p
+
+# -------------------- TREND (EMA incremental) --------------------
+def initializeaza_trend(symbols, din_db=True):
+    trend = {s: {"ema50": StreamingEMA(50), "ema200": StreamingEMA(200)} for s in symbols}
+    if not conn or not din_db:
+        return trend
+    from sqlalchemy import text
+    try:
+        # un singur seed din DB la pornire (ultimele TREND_SEED_LEN prețuri)
+        with engine.connect() as con:
+            q = text(f"""
+                SELECT price FROM {DB_SCHEMA}.prices
+                WHERE symbol = :sym
+                ORDER BY timestamp DESC
+                LIMIT {TREND_SEED_LEN}
+            """)
+            for s in symbols:
+                rows = con.execute(q, {"sym": s}).fetchall()
+                for r in rows[::-1]:  # oldest -> newest
+                    actualizeaza_trend(trend, s, float(r[0]))
+        print(f"[{datetime.now()}] ✅ Trend EMA inițializat din DB")
+    except Exception as e:
+        print(f"[{datetime.now()}] ⚠️ Eroare inițializare trend: {e}")
+    return trend
+
+def actualizeaza_trend(trend, symbol, pret):
+    t = trend[symbol]
+    ema50 = t["ema50"].update(pret)
+    ema200 = t["ema200"].update(pret)
+    return ema50 > ema200
+
+# -------------------- LUMÂNĂRI LOCALE --------------------
+# 1m/5m/15m/1h din tick-uri: bara curentă actualizează buffer-ele OHLC încărcate (fără request-uri;
+# REST doar la pornire și pentru golurile din buffer). Barele 1m/1h închise ajung imediat în
+# rollup-uri ca rânduri provizorii; rollup-ul SQL din prices le rescrie la următoarea rulare.
+ROLLUP_TABELE = {1: "prices_1m", 60: "prices_1h"}
+
+def _bara_inchisa(pair, interval, bara):
+    tabel = ROLLUP_TABELE.get(interval)
+    if tabel is None or not conn:
+        return
+    writer.put(tabel, {"symbol": pair, "bucket": datetime.fromtimestamp(bara["time"]),
+                       "open": bara["open"], "high": bara["high"], "low": bara["low"],
+                       "close": bara["close"], "count": bara["count"]})
+
+lumanari = AgregatorLumanari(la_inchidere=_bara_inchisa)
+
+def actualizeaza_lumanari(preturi):
+    lumanari.inchide_expirate()
+    for s, pret in preturi.items():
+        lumanari.adauga(s, pret)
+        if not LOCAL_CANDLES:
+            continue
+        for interval in lumanari.intervale:
+            if feed is not None and interval == feed.interval:
+                continue   # lumânările acestui interval vin din feed-ul WS (cu volum real)
+            # doar buffer-ele deja încărcate (aplica_candela ignoră restul)
+            aplica_candela(s, interval, lumanari.bara_curenta(s, interval), combina=True)
+
+# -------------------- DATE DE PIAȚĂ (REST / WS) --------------------
+feed = None
+
+def porneste_feed(symbols, pozitii, strat):
+    global feed
+    # ieșirile declanșate de WS rulează în ordine, în afara thread-ului feed-ului
+    executor_iesiri = ThreadPoolExecutor(max_workers=1, thread_name_prefix="ws-exit")
+
+    def iesire_ws(pair, pret):
+        try:
+            with metrics.cronometreaza("iesire_ws", pair):
+                verifica_iesire(pair, pret, pozitii, strat, log=False)
+                salveaza_pozitii()
+        except Exception as e:
+            print(f"[{datetime.now()}] ❌ {pair}: eroare ieșire WS: {e}")
+            metrics.incrementeaza("erori", eticheta="ws")
+
+    def la_pret(pair, pret):
+        if pozitii[pair]["deschis"]:
+            executor_iesiri.submit(iesire_ws, pair, pret)
+
+    feed = KrakenFeed(symbols, interval=60, on_price=la_pret, on_candle=aplica_candela).start()
+    if not feed.conectat.wait(10):
+        print(f"[{datetime.now()}] ⚠️ WS încă neconectat — folosesc REST până la conectare")
+
+def citeste_preturi(symbols):
+    if feed is None:
+        return get_prices(symbols)
+    preturi = feed.get_prices(symbols)
+    lipsa = [s for s in symbols if s not in preturi]
+    if lipsa:
+        preturi.update(get_prices(lipsa))
+    return preturi
+
+# -------------------- DECIZIE PER SIMBOL --------------------
+lacat_pozitii = threading.RLock()
+
+def pregateste_cont(symbols, pozitii, strat):
+    balans = sold_cache.get()
+    # împărțim EUR disponibili doar între simbolurile care NU sunt deschise (BUY) sau care cer DCA
+    need_buy = [s for s in symbols if not pozitii[s]["deschis"]]
+    if coordonator is not None:
+        # alocarea se împarte între simbolurile închise din TOATE shard-urile
+        alloc_sum = coordonator.alloc_sum({s: pozitii[s]["deschis"] for s in symbols})
+    else:
+        alloc_sum = sum(strat["allocations"].get(s, 0.0) for s in need_buy)
+    return {
+        "eur_avail": float(balans.get("ZEUR", 0.0)),
+        "alloc_sum": alloc_sum or 0.0,
+    }
+
+# ---------------- MONITORIZARE / SELL (TP, Trailing, SL) ----------------
+# Apelată din bucla principală și, în modul WS, la fiecare tick din feed.
+def verifica_iesire(s, pret, pozitii, strat, log=True):
+    with lacat_pozitii:
+        p = pozitii[s]
+        if not p["deschis"]:
+            return False
+
+        # calculează profitul curent
+        profit_pct = ((pret - p["pret_intrare"]) / p["pret_intrare"] * 100.0) if p["pret_intrare"] > 0 else 0.0
+        profit_eur = (pret - p["pret_intrare"]) * p["cantitate"]
+        fee = (pret * p["cantitate"]) * FEE_RATE
+        net_profit_eur = profit_eur - fee
+
+        # actualizează max profit
+        if profit_pct > p["max_profit"]:
+            p["max_profit"] = profit_pct
+
+        # 🧪 log la fiecare iterație pentru toate pozițiile deschise
+        if log:
+            print(f"[{datetime.now()}] 🧪 {s}: profit={profit_pct:.2f}% | max={p['max_profit']:.2f}% | qty={p['cantitate']:.6f}")
+
+        # 1) Take Profit — doar prag pentru trailing
+        if log and profit_pct >= float(strat["Take_Profit"]):
+            print(f"[{datetime.now()}] ℹ️ TP REACHED {s}: profit {profit_pct:.2f}% — trailing activat")
+            pass
+
+        # 2) Trailing — vinde dacă avem retragere din vârf
+        if p["max_profit"] >= float(strat["Take_Profit"]) and \
+           profit_pct <= p["max_profit"] - float(strat["Trailing_TP"]):
+            inainte = dict(p)
+            p["deschis"] = False
+            p["max_profit"] = 0.0
+            p["last_sell_time"] = acum()
+            p["last_sell_price"] = pret
+            executa_ordin("sell", inainte["cantitate"], s, pret, "SELL_TRAILING", p, inainte,
+                          profit_pct, net_profit_eur)
+            print(f"[{datetime.now()}] ✅ VÂNZARE TRAILING: {s}")
+            return True
+
+        # 3) Stop-Loss
+        sl = float(strat.get("Stop_Loss", 0.0))
+        if sl > 0 and profit_pct <= -sl:
+            inainte = dict(p)
+            p["deschis"] = False
+            p["max_profit"] = 0.0
+            p["last_sell_time"] = acum()
+            p["last_sell_price"] = pret
+            executa_ordin("sell", inainte["cantitate"], s, pret, "SELL_SL", p, inainte,
+                          profit_pct, net_profit_eur)
+            print(f"[{datetime.now()}] ✅ VÂNZARE SL: {s}")
+            return True
+
+        return False
+
+def proceseaza_simbol(s, pret, semnal, scor, vol, pozitii, trend, strat, cont):
+    # pozițiile sunt modificate și din thread-ul feed-ului WS → lacăt comun
+    with lacat_pozitii:
+        _proceseaza_simbol(s, pret, semnal, scor, vol, pozitii, trend, strat, cont)
+        salveaza_pozitii()
+
+def _proceseaza_simbol(s, pret, semnal, scor, vol, pozitii, trend, strat, cont):
+    # log preț + semnal
+    with metrics.cronometreaza("db_log", s):
+        log_price_db(s, pret)
+        log_signal_db(s, semnal, pret, scor, vol)
+    with metrics.cronometreaza("ema", s):
+        trend_ok = actualizeaza_trend(trend, s, pret)
+
+    if verifica_iesire(s, pret, pozitii, strat):
+        return
+
+    p = pozitii[s]
+
+    # ---------------- BUY LOGIC (poziție închisă) ----------------
+    # (A) Re-entry guard: dacă am vândut recent, nu re-cumpărăm imediat și nu la preț mai mare
+    can_reenter = True
+    if p["last_sell_time"] is not None:
+        since = (acum() - p["last_sell_time"]).total_seconds()
+        if since < REENTRY_COOLDOWN_SEC:
+            can_reenter = False
+        elif p["last_sell_price"] is not None:
+            # re-intră doar mai ieftin cu REENTRY_DROP_PCT
+            if pret > p["last_sell_price"] * (1.0 - REENTRY_DROP_PCT/100.0):
+                can_reenter = False
+
+    # (B) Buy pe poziție închisă
+
+    if (not p["deschis"]) and cont["alloc_sum"] > 0 and (semnal == "BUY" or trend_ok) and can_reenter:
+        alloc = strat["allocations"].get(s, 0.0)
+        eur_target = cont["eur_avail"] * (alloc / cont["alloc_sum"])
+        eur_min = MIN_ORDER_EUR.get(s, 15.0)
+        if eur_target < eur_min:
+            eur_target = eur_min
+
+        if cont["eur_avail"] >= eur_target * 0.99 and pret > 0 and sold_cache.rezerva(s, eur_target):
+            qty = (eur_target * 0.99) / pret
+            inainte = dict(p)
+            p.update({"deschis": True, "pret_intrare": pret, "cantitate": qty, "max_profit": 0.0})
+            executa_ordin("buy", qty, s, pret, "BUY", p, inainte)
+            cont["eur_avail"] -= eur_target
+            print(f"[{datetime.now()}] ✅ CUMPĂRARE: {s} qty={qty:.6f} @ {pret:.2f} | EUR_spent≈{eur_target:.2f}")
+        else:
+            print(f"[{datetime.now()}] ⛔ {s}: ZEUR insuficient (need≈{eur_target:.2f}, avail≈{cont['eur_avail']:.2f})")
+
+    # ---------------- DCA (poziție deschisă) ----------------
+    elif p["deschis"]:
+        # DCA doar între -DCA_DROP_PCT și pragul de Stop-Loss
+        drop_pct = ( (p["pret_intrare"] - pret) / p["pret_intrare"] * 100.0 ) if p["pret_intrare"] > 0 else 0.0
+
+        # DCA eligibil: scădere >= DCA_DROP_PCT și NU suntem sub SL
+        if drop_pct >= DCA_DROP_PCT:
+            # dacă profitul actual e deja sub SL, NU mai face DCA (SL a fost deja rulat mai sus)
+            sl = float(strat.get("Stop_Loss", 0.0))
+            if sl > 0 and drop_pct >= sl:
+            # SL a fost tratat mai sus; nu DCA aici
+                return
+
+            # fonduri suficiente?
+            eur_min = MIN_ORDER_EUR.get(s, 15.0)
+            if cont["eur_avail"] < eur_min:
+                print(f"[{datetime.now()}] ⚠️ Fonduri insuficiente pentru DCA {s} — sar peste (avail={cont['eur_avail']:.2f}€, min={eur_min:.2f}€).")
+                # nu blochez bucla; merg mai departe
+                pass
+            else:
+                # alocă până la greutatea simbolului, din EUR_avail
+                alloc_eur = min(cont["eur_avail"], strat["allocations"].get(s, 0.5) * max(cont["eur_avail"], 0))
+                eur_to_spend = max(eur_min, min(alloc_eur, cont["eur_avail"]))
+                if eur_to_spend > 0 and pret > 0 and sold_cache.rezerva(s, eur_to_spend):
+                    add_qty = (eur_to_spend * 0.99) / pret
+                    # medie ponderată a prețului de intrare
+                    inainte = dict(p)
+                    new_qty = p["cantitate"] + add_qty
+                    new_avg = ((p["pret_intrare"] * p["cantitate"]) + (pret * add_qty)) / new_qty
+                    p.update({"pret_intrare": new_avg, "cantitate": new_qty})
+                    executa_ordin("buy", add_qty, s, pret, "BUY_DCA", p, inainte)
+                    cont["eur_avail"] -= eur_to_spend
+                    print(f"[{datetime.now()}] 🔄 DCA BUY: {s} +{add_qty:.6f} @ {pret:.2f} | avg={new_avg:.2f}")
+        # altfel: nu face DCA
+
+# -------------------- ANALIZĂ --------------------
+def ruleaza_analiza(symbols=None):
+    try:
+        with lacat_sumar:
+            rows = [{"symbol": sym, "buys": agg["buys"], "sells": agg["sells"],
+                     "avg_profit": agg["total_profit"] / agg["n_profit"] if agg["n_profit"] else 0.0,
+                     "total_profit": agg["total_profit"], "total_profit_eur": agg["total_profit_eur"]}
+                    for sym, agg in sorted(sumar_tranzactii.items()) if symbols is None or sym in symbols]
+        if rows:
+            print(f"\n=== 💰 Analiză @ {datetime.now()} ===\n{pd.DataFrame(rows)}\n")
+        log_analysis_db(rows)
+    except Exception as e:
+        print(f"❌ Eroare analiză: {e}")
 
 # -------------------- MAIN LOOP --------------------
-def ruleaza_bot():
+def ruleaza_tick(symbols, pozitii, trend, strat):
+    with metrics.cronometreaza("cont"):
+        cont = pregateste_cont(symbols, pozitii, strat)
+
+    # ⚡ toate prețurile într-un singur request (sau din feed-ul WS)
+    with metrics.cronometreaza("preturi"):
+        preturi = citeste_preturi(symbols)
+    with metrics.cronometreaza("lumanari"):
+        actualizeaza_lumanari(preturi)
+
+    for s in symbols:
+        if s not in preturi:
+            print(f"[{datetime.now()}] ⚠️ {s}: preț lipsă în răspunsul Ticker — sar peste")
+            metrics.incrementeaza("preturi_lipsa", eticheta=s)
+            continue
+        pret = float(preturi[s])
+        with metrics.cronometreaza("semnal", s):
+            semnal, scor, vol = calculeaza_semnal(s, strat)
+        with metrics.cronometreaza("decizie", s):
+            proceseaza_simbol(s, pret, semnal, scor, vol, pozitii, trend, strat, cont)
+
+async def ruleaza_tick_async(symbols, pozitii, trend, strat, lacat):
+    # I/O (ticker, OHLC, ordine) în thread-uri; doar contul EUR e serializat
+    with metrics.cronometreaza("cont"):
+        cont = await asyncio.to_thread(pregateste_cont, symbols, pozitii, strat)
+    with metrics.cronometreaza("preturi"):
+        preturi = await asyncio.to_thread(citeste_preturi, symbols)
+    with metrics.cronometreaza("lumanari"):
+        await asyncio.to_thread(actualizeaza_lumanari, preturi)
+
+    async def un_simbol(s):
+        if s not in preturi:
+            print(f"[{datetime.now()}] ⚠️ {s}: preț lipsă în răspunsul Ticker — sar peste")
+            metrics.incrementeaza("preturi_lipsa", eticheta=s)
+            return
+        pret = float(preturi[s])
+        with metrics.cronometreaza("semnal", s):
+            semnal, scor, vol = await asyncio.to_thread(calculeaza_semnal, s, strat)
+        async with lacat:
+            with metrics.cronometreaza("decizie", s):
+                await asyncio.to_thread(proceseaza_simbol, s, pret, semnal, scor, vol, pozitii, trend, strat, cont)
+
+    rezultate = await asyncio.gather(*(un_simbol(s) for s in symbols), return_exceptions=True)
+    for s, r in zip(symbols, rezultate):
+        if isinstance(r, Exception):
+            print(f"[{datetime.now()}] ❌ {s}: eroare simbol: {r}")
+            metrics.incrementeaza("erori", eticheta="simbol")
+
+def porneste_optimizator():
+    # o singură instanță: în modul shard o pornește coordonatorul, nu fiecare shard
+    if not OPTIMIZER_WALK_FORWARD or os.getenv("SHARD_INDEX") is not None:
+        return None
+    try:
+        import ai_optimizer
+        return ai_optimizer.porneste_in_fundal()
+    except Exception as e:
+        # optimizatorul e opțional: botul tranzacționează și fără el
+        print(f"[{datetime.now()}] ⚠️ Walk-forward nepornit: {e}")
+        return None
+
+def initializeaza_bot(symbols=None):
+    # symbols: subsetul unui shard (implicit toate simbolurile din strategie)
+    print(f"[{datetime.now()}] 🚀 Bot started with SQLAlchemy...")
+    initializeaza_db()
     strat = incarca_strategia()
-    symbols = strat.get("symbols", ["XXBTZEUR","XETHZEUR"])
-    pozitii = {s: {"deschis": False, "pret_intrare": 0.0, "cantitate": 0.0, "max_profit": 0.0,
-                   "last_sell_time": None, "last_sell_price": None} for s in symbols}
+    symbols = symbols or strat.get("symbols", ["XXBTZEUR","XETHZEUR"])
+    global pozitii_active
+    pozitii = {s: pozitie_goala() for s in symbols}
     sincronizeaza_pozitii(pozitii, strat)
+    pozitii_active = pozitii
+    salveaza_pozitii()
+    trend = initializeaza_trend(symbols)
+    incarca_sumar()
+    ordine.start()
+    metrics.porneste()
+    porneste_optimizator()
+    if MARKET_DATA == "ws":
+        porneste_feed(symbols, pozitii, strat)
+    return strat, symbols, pozitii, trend
+
+def ruleaza_bot(symbols=None):
+    strat, symbols, pozitii, trend = initializeaza_bot(symbols)
 
     next_analysis = datetime.now() + timedelta(minutes=15)
 
     while True:
         try:
-            balans = get_balance()
-            eur_avail = float(balans.get("ZEUR", 0.0))
+            verifica_strategie(strat)
+            with metrics.cronometreaza("tick"):
+                ruleaza_tick(symbols, pozitii, trend, strat)
 
-            # împărțim EUR disponibili doar între simbolurile care NU sunt deschise (BUY) sau care cer DCA
-            need_buy = []
-            for s in symbols:
-                p = pozitii[s]
-                if not p["deschis"]:
-                    need_buy.append(s)
+            # 📊 ANALIZA LA 15 MINUTE (chiar și fără tranzacții)
+            if datetime.now() >= next_analysis:
+                ruleaza_analiza(symbols if coordonator else None)
+                next_analysis = datetime.now() + timedelta(minutes=15)
 
-            alloc_sum = sum(strat["allocations"].get(s, 0.0) for s in need_buy) or 0.0
+        except Exception as e:
+            print(f"[{datetime.now()}] ❌ Loop error: {e}")
+            metrics.incrementeaza("erori", eticheta="loop")
 
-            for s in symbols:
-                pret = float(get_price(s))
-                semnal, scor, vol = calculeaza_semnal(s, strat)
-
-                # log preț + semnal
-                log_price_db(s, pret)
-                log_signal_db(s, semnal, pret, scor, vol)
-
-                p = pozitii[s]
-
-                # ---------------- MONITORIZARE / SELL (TP, Trailing, SL) ----------------
-                if p["deschis"]:
-                    # calculează profitul curent
-                    profit_pct = ((pret - p["pret_intrare"]) / p["pret_intrare"] * 100.0) if p["pret_intrare"] > 0 else 0.0
-                    profit_eur = (pret - p["pret_intrare"]) * p["cantitate"]
-                    fee = (pret * p["cantitate"]) * FEE_RATE
-                    net_profit_eur = profit_eur - fee
-
-                    # actualizează max profit
-                    if profit_pct > p["max_profit"]:
-                        p["max_profit"] = profit_pct
-
-                    # 🧪 log la fiecare iterație pentru toate pozițiile deschise
-                    print(f"[{datetime.now()}] 🧪 {s}: profit={profit_pct:.2f}% | max={p['max_profit']:.2f}% | qty={p['cantitate']:.6f}")
-
-                    # 1) Take Profit — doar prag pentru trailing
-                    if profit_pct >= float(strat["Take_Profit"]):
-                        print(f"[{datetime.now()}] ℹ️ TP REACHED {s}: profit {profit_pct:.2f}% — trailing activat")
-                        pass
-
-                    # 2) Trailing — vinde dacă avem retragere din vârf
-                    if p["max_profit"] >= float(strat["Take_Profit"]) and \
-                       profit_pct <= p["max_profit"] - float(strat["Trailing_TP"]):
-                        place_market_order("sell", p["cantitate"], s)
-                        log_trade_db(s, "SELL_TRAILING", p["cantitate"], pret, profit_pct, net_profit_eur)
-                        p["deschis"] = False
-                        p["max_profit"] = 0.0
-                        p["last_sell_time"] = datetime.now()
-                        p["last_sell_price"] = pret
-                        print(f"[{datetime.now()}] ✅ VÂNZARE TRAILING: {s}")
-                        continue
-
-                    # 3) Stop-Loss
-                    sl = float(strat.get("Stop_Loss", 0.0))
-                    if sl > 0 and profit_pct <= -sl:
-                        place_market_order("sell", p["cantitate"], s)
-                        log_trade_db(s, "SELL_SL", p["cantitate"], pret, profit_pct, net_profit_eur)
-                        p["deschis"] = False
-                        p["max_profit"] = 0.0
-                        p["last_sell_time"] = datetime.now()
-                        p["last_sell_price"] = pret
-                        print(f"[{datetime.now()}] ✅ VÂNZARE SL: {s}")
-                        continue
-
-                # ---------------- BUY LOGIC (poziție închisă) ----------------
-                # (A) Re-entry guard: dacă am vândut recent, nu re-cumpărăm imediat și nu la preț mai mare
-                can_reenter = True
-                if p["last_sell_time"] is not None:
-                    since = (datetime.now() - p["last_sell_time"]).total_seconds()
-                    if since < REENTRY_COOLDOWN_SEC:
-                        can_reenter = False
-                    elif p["last_sell_price"] is not None:
-                        # re-intră doar mai ieftin cu REENTRY_DROP_PCT
-                        if pret > p["last_sell_price"] * (1.0 - REENTRY_DROP_PCT/100.0):
-                            can_reenter = False
-
-                # (B) Buy pe poziție închisă
-
-                # PATCH: calculează trend EMA din DB (ultimele 400 prețuri)
-                try:
-                    with engine.connect() as con:
-                        q = text(f"""
-                            SELECT price FROM {DB_SCHEMA}.prices
-                            WHERE symbol = :sym
-                            ORDER BY timestamp DESC
-                            LIMIT 400
-                        """)
-                        rows = con.execute(q, {"sym": s}).fetchall()
-                        closes = pd.Series([float(r[0]) for r in rows][::-1])  # oldest -> newest
-                        ema50 = closes.ewm(span=50, adjust=False).mean().iloc[-1]
-                        ema200 = closes.ewm(span=200, adjust=False).mean().iloc[-1]
-                        trend_ok = (ema50 > ema200)
-                except Exception as _e:
-                        trend_ok = False
-
-                if (not p["deschis"]) and alloc_sum > 0 and (semnal == "BUY" or trend_ok) and can_reenter:
-                    alloc = strat["allocations"].get(s, 0.0)
-                    eur_target = eur_avail * (alloc / alloc_sum)
-                    eur_min = MIN_ORDER_EUR.get(s, 15.0)
-                    if eur_target < eur_min:
-                        eur_target = eur_min
-
-                    if eur_avail >= eur_target * 0.99 and pret > 0:
-                        qty = (eur_target * 0.99) / pret
-                        place_market_order("buy", qty, s)
-                        p.update({"deschis": True, "pret_intrare": pret, "cantitate": qty, "max_profit": 0.0})
-                        log_trade_db(s, "BUY", qty, pret, 0.0, 0.0)
-                        eur_avail -= eur_target
-                        print(f"[{datetime.now()}] ✅ CUMPĂRARE: {s} qty={qty:.6f} @ {pret:.2f} | EUR_spent≈{eur_target:.2f}")
-                    else:
-                        print(f"[{datetime.now()}] ⛔ {s}: ZEUR insuficient (need≈{eur_target:.2f}, avail≈{eur_avail:.2f})")
-
-                # ---------------- DCA (poziție deschisă) ----------------
-                elif p["deschis"]:
-                    # DCA doar între -DCA_DROP_PCT și pragul de Stop-Loss
-                    drop_pct = ( (p["pret_intrare"] - pret) / p["pret_intrare"] * 100.0 ) if p["pret_intrare"] > 0 else 0.0
-
-                    # DCA eligibil: scădere >= DCA_DROP_PCT și NU suntem sub SL
-                    if drop_pct >= DCA_DROP_PCT:
-                        # dacă profitul actual e deja sub SL, NU mai face DCA (SL a fost deja rulat mai sus)
-                        sl = float(strat.get("Stop_Loss", 0.0))
-                        if sl > 0 and cur_profit_pct <= -sl:
-                        # SL a fost tratat mai sus; nu DCA aici
-                            continue
-
-                        # fonduri suficiente?
-                        eur_min = MIN_ORDER_EUR.get(s, 15.0)
-                        if eur_avail < eur_min:
-                            print(f"[{datetime.now()}] ⚠️ Fonduri insuficiente pentru DCA {s} — sar peste (avail={eur_avail:.2f}€, min={eur_min:.2f}€).")
-                            # nu blochez bucla; merg mai departe
-                            pass
-                        else:
-                            # alocă până la greutatea simbolului, din EUR_avail
-                            alloc_eur = min(eur_avail, strat["allocations"].get(s, 0.5) * max(eur_avail, 0))
-                            eur_to_spend = max(eur_min, min(alloc_eur, eur_avail))
-                            if eur_to_spend > 0 and pret > 0:
-                                add_qty = (eur_to_spend * 0.99) / pret
-                                place_market_order("buy", add_qty, s)
-                                # medie ponderată a prețului de intrare
-                                new_qty = p["cantitate"] + add_qty
-                                new_avg = ((p["pret_intrare"] * p["cantitate"]) + (pret * add_qty)) / new_qty
-                                p.update({"pret_intrare": new_avg, "cantitate": new_qty})
-                                log_trade_db(s, "BUY_DCA", add_qty, pret, 0.0, 0.0)
-                                eur_avail -= eur_to_spend
-                                print(f"[{datetime.now()}] 🔄 DCA BUY: {s} +{add_qty:.6f} @ {pret:.2f} | avg={new_avg:.2f}")
-                    # altfel: nu face DCA
+        time.sleep(10)
 
-            # 📊 ANALIZA LA 15 MINUTE (chiar și fără tranzacții)
-            if datetime.now() >= next_analysis:
-                try:
-                    df = pd.read_sql(f"SELECT * FROM {DB_SCHEMA}.trades", engine)
-                    if df.empty:
-                        log_analysis_db(pd.DataFrame())
-                    else:
-                        summary = df.groupby("symbol").agg(
-                            buys=("action", lambda x: (x == "BUY").sum() + (x == "BUY_DCA").sum()),
-                            sells=("action", lambda x: x.str.startswith("SELL").sum()),
-                            avg_profit=("profit_pct", "mean"),
-                            total_profit=("profit_pct", "sum"),
-                            total_profit_eur=("profit_eur", "sum")
-                        ).reset_index()
-                        print(f"\n=== 💰 Analiză @ {datetime.now()} ===\n{summary}\n")
-                        log_analysis_db(summary)
-                except Exception as e:
-                    print(f"❌ Eroare analiză: {e}")
+async def ruleaza_bot_async(symbols=None):
+    asyncio.get_running_loop().set_default_executor(ThreadPoolExecutor(max_workers=ASYNC_WORKERS))
+    strat, symbols, pozitii, trend = await asyncio.to_thread(initializeaza_bot, symbols)
+    lacat = asyncio.Lock()
+
+    next_analysis = datetime.now() + timedelta(minutes=15)
+
+    while True:
+        inceput = time.monotonic()
+        try:
+            verifica_strategie(strat)
+            with metrics.cronometreaza("tick"):
+                await ruleaza_tick_async(symbols, pozitii, trend, strat, lacat)
 
+            if datetime.now() >= next_analysis:
+                await asyncio.to_thread(ruleaza_analiza, symbols if coordonator else None)
                 next_analysis = datetime.now() + timedelta(minutes=15)
 
         except Exception as e:
             print(f"[{datetime.now()}] ❌ Loop error: {e}")
+            metrics.incrementeaza("erori", eticheta="loop")
 
-        time.sleep(10)
+        await asyncio.sleep(max(0.0, 10 - (time.monotonic() - inceput)))
+
+def instaleaza_oprire():
+    # SIGTERM (Heroku: deploy/restart) → ultimul snapshot de poziții, apoi rândurile din coada DB
+    # (inclusiv tranzacțiile și snapshot-ul) sunt scrise
+    opreste_la_sigterm(lambda: writer, inainte=salveaza_pozitii)
 
 if __name__ == "__main__":
-    ruleaza_bot()
+    instaleaza_oprire()
+    if ENGINE_MODE == "async":
+        asyncio.run(ruleaza_bot_async())
+    else:
+        ruleaza_bot()
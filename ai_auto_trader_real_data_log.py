@@ -2,42 +2,29 @@ import time
 import os
 import json
 from datetime import datetime
-from sqlalchemy import create_engine, text
-from kraken_client import get_price
+from sqlalchemy import create_engine
+from db_writer import DBWriter, opreste_la_sigterm
+from db_schema import asigura_schema, porneste_retentie
+from kraken_client import get_prices
 from strategie import calculeaza_semnal
 
-print(f"[{datetime.now()}] 📝 Data Logger starting...")
-
-# DB INIT
 db_url = os.getenv("DATABASE_URL")
 if db_url and db_url.startswith("postgres://"):
     db_url = db_url.replace("postgres://", "postgresql://", 1)
 DB_SCHEMA = os.getenv("DB_SCHEMA", "public")
 
-engine = create_engine(db_url)
-conn = engine.connect()
-with engine.begin() as con:
-    con.execute(text(f"CREATE SCHEMA IF NOT EXISTS {DB_SCHEMA};"))
-    con.execute(text(f"""
-        CREATE TABLE IF NOT EXISTS {DB_SCHEMA}.signals(
-            id SERIAL PRIMARY KEY,
-            timestamp TIMESTAMP NOT NULL,
-            symbol TEXT NOT NULL,
-            signal TEXT NOT NULL,
-            price NUMERIC,
-            risk_score NUMERIC,
-            volatility NUMERIC
-        )
-    """))
-    con.execute(text(f"""
-        CREATE TABLE IF NOT EXISTS {DB_SCHEMA}.prices(
-            id SERIAL PRIMARY KEY,
-            timestamp TIMESTAMP NOT NULL,
-            symbol TEXT NOT NULL,
-            price NUMERIC
-        )
-    """))
-print(f"[{datetime.now()}] ✅ Logger DB ready in schema {DB_SCHEMA}")
+# DB INIT — la pornirea logger-ului (run_logger), nu la import
+engine = None
+writer = None
+
+def initializeaza_db():
+    global engine, writer
+    engine = create_engine(db_url)
+    asigura_schema(engine, DB_SCHEMA)
+    print(f"[{datetime.now()}] ✅ Logger DB ready in schema {DB_SCHEMA}")
+    writer = DBWriter(engine, DB_SCHEMA).start()
+    # partițiile zilelor următoare + rollup/retenție și când logger-ul rulează fără bot
+    porneste_retentie(engine, DB_SCHEMA)
 
 def incarca_strategia():
     try:
@@ -47,38 +34,28 @@ def incarca_strategia():
         return {"symbols": ["XXBTZEUR","XETHZEUR"], "RSI_Period": 10, "RSI_OB": 70, "RSI_OS": 30}
 
 def log_price(symbol, price):
-    try:
-        with engine.begin() as con:
-            con.execute(
-                text(f"INSERT INTO {DB_SCHEMA}.prices (timestamp, symbol, price) VALUES (:ts,:s,:p)"),
-                {"ts": datetime.now(), "s": symbol, "p": float(price)}
-            )
-        print(f"[{datetime.now()}] 📦 price -> {symbol} = {price}")
-    except Exception as e:
-        print(f"[{datetime.now()}] ❌ price log error: {e}")
+    writer.put("prices", {"timestamp": datetime.now(), "symbol": symbol, "price": float(price)})
+    print(f"[{datetime.now()}] 📦 price -> {symbol} = {price}")
 
 def log_signal(symbol, signal, price, score, vol):
-    try:
-        with engine.begin() as con:
-            con.execute(
-                text(f"INSERT INTO {DB_SCHEMA}.signals (timestamp, symbol, signal, price, risk_score, volatility) "
-                     "VALUES (:ts,:s,:sig,:p,:r,:v)"),
-                {"ts": datetime.now(), "s": symbol, "sig": str(signal),
-                 "p": float(price) if price is not None else None,
-                 "r": float(score) if score is not None else None,
-                 "v": float(vol) if vol is not None else None}
-            )
-        print(f"[{datetime.now()}] 📨 signal -> {symbol} = {signal}")
-    except Exception as e:
-        print(f"[{datetime.now()}] ❌ signal log error: {e}")
+    writer.put("signals", {"timestamp": datetime.now(), "symbol": symbol, "signal": str(signal),
+                           "price": float(price) if price is not None else None,
+                           "risk_score": float(score) if score is not None else None,
+                           "volatility": float(vol) if vol is not None else None})
+    print(f"[{datetime.now()}] 📨 signal -> {symbol} = {signal}")
 
 def run_logger():
+    print(f"[{datetime.now()}] 📝 Data Logger starting...")
+    initializeaza_db()
     strat = incarca_strategia()
     symbols = strat.get("symbols", ["XXBTZEUR","XETHZEUR"])
     while True:
         try:
+            preturi = get_prices(symbols)
             for s in symbols:
-                price = get_price(s)
+                if s not in preturi:
+                    continue
+                price = preturi[s]
                 signal, score, vol = calculeaza_semnal(s, strat)
                 log_price(s, price)
                 log_signal(s, signal, price, score, vol)
@@ -89,4 +66,5 @@ def run_logger():
             time.sleep(10)
 
 if __name__ == "__main__":
+    opreste_la_sigterm(lambda: writer)
     run_logger()
@@ -1,11 +1,16 @@
 import os
 import json
+import math
+import time
+import argparse
+from datetime import datetime
+import tempfile
 import numpy as np
 import pandas as pd
-import ta
 from dotenv import load_dotenv
-from binance.client import Client
 from itertools import product
+from concurrent.futures import ProcessPoolExecutor
+import candle_store
 
 # === CONFIG ===
 load_dotenv()
@@ -14,11 +19,16 @@ API_SECRET = os.getenv("API_SECRET")
 SYMBOL = "BTCUSDT"
 CAPITAL_INITIAL = 10000
 
-client = Client(API_KEY, API_SECRET)
-client.API_URL = "https://testnet.binance.vision/api"
+# Sursa datelor: "store" (depozitul local candle_store, perechi Kraken) sau "binance" (testnet)
+DATA_SOURCE = os.getenv("OPTIMIZER_SOURCE", "store")
+PAIR = os.getenv("OPTIMIZER_PAIR", "XXBTZEUR")
+ISTORIC_ZILE = 182
 
 # === DESCĂRCARE DATE ===
 def get_historical_data(period="6 months ago UTC", interval="1h"):
+    from binance.client import Client
+    client = Client(API_KEY, API_SECRET)
+    client.API_URL = "https://testnet.binance.vision/api"
     klines = client.get_historical_klines(SYMBOL, interval, period)
     df = pd.DataFrame(klines, columns=[
         "timestamp", "open", "high", "low", "close", "volume",
@@ -28,90 +38,522 @@ def get_historical_data(period="6 months ago UTC", interval="1h"):
     df["close"] = df["close"].astype(float)
     return df
 
-# === FUNCȚIE DE SIMULARE ===
-def simulate(df, rsi_period, rsi_ob, rsi_os, macd_fast, macd_slow, macd_signal, stop_loss, take_profit):
-    df["rsi"] = ta.momentum.RSIIndicator(df["close"], window=rsi_period).rsi()
-    macd = ta.trend.MACD(df["close"], window_slow=macd_slow, window_fast=macd_fast, window_sign=macd_signal)
-    df["macd"] = macd.macd()
-    df["signal"] = macd.macd_signal()
-    df.dropna(inplace=True)
+def verifica_acoperire(pair, interval, zile):
+    # Kraken dă doar ultimele 720 de lumânări — avertizează în loc să optimizeze tăcut pe un istoric scurt
+    acoperit = candle_store.acoperire_zile(pair, interval)
+    if 0 < acoperit < zile - 1:
+        print(f"[{datetime.now()}] ⚠️ Depozitul {pair}/{interval}m acoperă doar {acoperit:.0f} din {zile} zile "
+              f"— completează: python candle_store.py istoric {pair} --interval {interval} --zile {zile}")
+    return acoperit
+
+def load_store_data(pair=PAIR, interval=60, zile=ISTORIC_ZILE):
+    # fără rețea: lumânările vin din fișierele mapate de candle_store
+    verifica_acoperire(pair, interval, zile)
+    return candle_store.incarca_df(pair, interval, since=int(time.time()) - zile * 86400)
+
+def incarca_date():
+    if DATA_SOURCE == "binance":
+        return get_historical_data()
+    df = load_store_data()
+    if df.empty:
+        print(f"⚠️ Depozit local gol pentru {PAIR} — rulează: python candle_store.py kraken {PAIR}")
+    return df
+
+# === BACKTEST VECTORIZAT (NumPy) ===
+def _prima_iesire(close, sell_mask, start, entry_price, stop_loss, take_profit):
+    # caută prima bară >= start unde se închide poziția, în ferestre care se dublează
+    n = len(close)
+    pas = 64
+    while start < n:
+        stop = min(n, start + pas)
+        change = (close[start:stop] - entry_price) / entry_price * 100
+        iesire = (change <= -stop_loss) | (change >= take_profit) | sell_mask[start:stop]
+        if iesire.any():
+            return start + int(np.argmax(iesire))
+        start = stop
+        pas *= 2
+    return -1
+
+def backtest_np(close, rsi, macd, signal, rsi_ob, rsi_os, stop_loss, take_profit):
+    # aceeași logică ca bucla bar-cu-bar, pe array-uri fără NaN
+    buy_mask = (rsi < rsi_os) & (macd > signal)
+    sell_mask = (rsi > rsi_ob) & (macd < signal)
+    intrari = np.flatnonzero(buy_mask)
 
     capital = CAPITAL_INITIAL
-    position = None
-    entry_price = None
-
-    for i in range(1, len(df)):
-        price = df["close"].iloc[i]
-        rsi = df["rsi"].iloc[i]
-        macd_val = df["macd"].iloc[i]
-        macd_sig = df["signal"].iloc[i]
-
-        # BUY
-        if position is None and rsi < rsi_os and macd_val > macd_sig:
-            position = "LONG"
-            entry_price = price
-
-        # SELL sau TAKE-PROFIT
-        elif position == "LONG":
-            change = (price - entry_price) / entry_price * 100
-            if change <= -stop_loss:
-                capital += -CAPITAL_INITIAL * (stop_loss / 100)
-                position = None
-            elif change >= take_profit or (rsi > rsi_ob and macd_val < macd_sig):
-                capital += CAPITAL_INITIAL * (change / 100)
-                position = None
+    i = 1  # bara 0 nu e evaluată (range(1, len(df)))
+    while True:
+        k = np.searchsorted(intrari, i)
+        if k >= len(intrari):
+            break
+        intrare = intrari[k]
+        entry_price = close[intrare]
+
+        j = _prima_iesire(close, sell_mask, intrare + 1, entry_price, stop_loss, take_profit)
+        if j < 0:
+            break  # poziție rămasă deschisă la final
+        change = (close[j] - entry_price) / entry_price * 100
+        if change <= -stop_loss:
+            capital += -CAPITAL_INITIAL * (stop_loss / 100)
+        else:
+            capital += CAPITAL_INITIAL * (change / 100)
+        i = j + 1  # pe bara de ieșire nu se mai cumpără
 
     return capital
 
-# === OPTIMIZATOR ===
-def run_optimizer():
-    df = get_historical_data()
-
-    # Intervalele pe care le testăm
-    rsi_periods = [7, 14, 21]
-    rsi_ob_levels = [65, 70, 75]
-    rsi_os_levels = [25, 30, 35]
-    macd_fast_vals = [8, 12]
-    macd_slow_vals = [18, 26]
-    macd_signal_vals = [5, 9]
-    stop_losses = [1.5, 2.0, 3.0]
-    take_profits = [2.0, 3.0, 5.0]
+def calculeaza_indicatori(close, rsi_period, macd_fast, macd_slow, macd_signal):
+    import ta  # doar grila offline; walk-forward-ul pornit de bot are indicatorii proprii (_RSI/_MACD)
 
-    best_profit = -999999
-    best_config = None
+    rsi = ta.momentum.RSIIndicator(close, window=rsi_period).rsi()
+    macd = ta.trend.MACD(close, window_slow=macd_slow, window_fast=macd_fast, window_sign=macd_signal)
+    return rsi, macd.macd(), macd.macd_signal()
+
+# === FUNCȚIE DE SIMULARE ===
+def simulate(df, rsi_period, rsi_ob, rsi_os, macd_fast, macd_slow, macd_signal, stop_loss, take_profit):
+    rsi, macd, signal = calculeaza_indicatori(df["close"], rsi_period, macd_fast, macd_slow, macd_signal)
+    valid = (rsi.notna() & macd.notna() & signal.notna() & df.notna().all(axis=1)).to_numpy()
+
+    return backtest_np(
+        df["close"].to_numpy(dtype=float)[valid],
+        rsi.to_numpy(dtype=float)[valid],
+        macd.to_numpy(dtype=float)[valid],
+        signal.to_numpy(dtype=float)[valid],
+        rsi_ob, rsi_os, stop_loss, take_profit
+    )
+
+# === GRILA DE PARAMETRI ===
+GRID = {
+    "RSI_Period": [7, 14, 21],
+    "RSI_OB": [65, 70, 75],
+    "RSI_OS": [25, 30, 35],
+    "MACD_Fast": [8, 12],
+    "MACD_Slow": [18, 26],
+    "MACD_Signal": [5, 9],
+    "Stop_Loss": [1.5, 2.0, 3.0],
+    "Take_Profit": [2.0, 3.0, 5.0],
+}
+WORKERS = int(os.getenv("OPTIMIZER_WORKERS", str(os.cpu_count() or 1)))
+
+# === INDICATORI PRECALCULAȚI (o singură dată per serie distinctă) ===
+def precalculeaza_indicatori(df, grid, cale):
+    # o matrice (serii × bare) scrisă ca .npy și mapată read-only în fiecare worker
+    import ta
+
+    close = df["close"]
+    serii = {"close": close.to_numpy(dtype=float),
+             "valid": df.notna().all(axis=1).to_numpy(dtype=float)}
+    for rsi_period in grid["RSI_Period"]:
+        serii[f"rsi_{rsi_period}"] = ta.momentum.RSIIndicator(close, window=rsi_period).rsi().to_numpy(dtype=float)
+    for fast, slow, sign in product(grid["MACD_Fast"], grid["MACD_Slow"], grid["MACD_Signal"]):
+        macd = ta.trend.MACD(close, window_slow=slow, window_fast=fast, window_sign=sign)
+        serii[f"macd_{fast}_{slow}_{sign}"] = macd.macd().to_numpy(dtype=float)
+        serii[f"signal_{fast}_{slow}_{sign}"] = macd.macd_signal().to_numpy(dtype=float)
+
+    index = {nume: i for i, nume in enumerate(serii)}
+    matrice = np.lib.format.open_memmap(cale, mode="w+", dtype=float, shape=(len(serii), len(df)))
+    for nume, i in index.items():
+        matrice[i] = serii[nume]
+    matrice.flush()
+    return index
 
-    for rsi_period, rsi_ob, rsi_os, macd_fast, macd_slow, macd_signal, stop_loss, take_profit in product(
-        rsi_periods, rsi_ob_levels, rsi_os_levels,
-        macd_fast_vals, macd_slow_vals, macd_signal_vals,
-        stop_losses, take_profits
-    ):
+_INDICATORI = None
+_INDEX = None
+
+def _init_worker(cale, index):
+    global _INDICATORI, _INDEX
+    _INDICATORI = np.load(cale, mmap_mode="r")
+    _INDEX = index
+
+def _profituri(close, rsi, macd, signal, valid, combinatii):
+    # combinațiile (idx, RSI_OB, RSI_OS, SL, TP) peste aceleași serii → [(idx, profit)]
+    valid = valid & ~np.isnan(rsi) & ~np.isnan(macd) & ~np.isnan(signal)
+    close, rsi, macd, signal = (np.asarray(x)[valid] for x in (close, rsi, macd, signal))
+
+    rezultate = []
+    for idx, rsi_ob, rsi_os, stop_loss, take_profit in combinatii:
         try:
-            capital = simulate(df, rsi_period, rsi_ob, rsi_os, macd_fast, macd_slow, macd_signal, stop_loss, take_profit)
-            profit = capital - CAPITAL_INITIAL
-            if profit > best_profit:
-                best_profit = profit
-                best_config = {
-                    "RSI_Period": rsi_period,
-                    "RSI_OB": rsi_ob,
-                    "RSI_OS": rsi_os,
-                    "MACD_Fast": macd_fast,
-                    "MACD_Slow": macd_slow,
-                    "MACD_Signal": macd_signal,
-                    "Stop_Loss": stop_loss,
-                    "Take_Profit": take_profit,
-                    "Profit": round(profit, 2)
-                }
+            capital = backtest_np(close, rsi, macd, signal, rsi_ob, rsi_os, stop_loss, take_profit)
+            rezultate.append((idx, capital - CAPITAL_INITIAL))
         except Exception:
             continue
+    return rezultate
+
+def _evalueaza_grup(sarcina):
+    # toate combinațiile care împart același RSI și același MACD
+    rsi_period, fast, slow, sign, combinatii = sarcina
+    return _profituri(_INDICATORI[_INDEX["close"]],
+                      _INDICATORI[_INDEX[f"rsi_{rsi_period}"]],
+                      _INDICATORI[_INDEX[f"macd_{fast}_{slow}_{sign}"]],
+                      _INDICATORI[_INDEX[f"signal_{fast}_{slow}_{sign}"]],
+                      _INDICATORI[_INDEX["valid"]] > 0, combinatii)
+
+def grupeaza_grila(grid):
+    # grupăm combinațiile pe (RSI, MACD) → fiecare grup folosește aceiași indicatori
+    chei = list(grid)
+    combinatii = list(product(*(grid[k] for k in chei)))
+    grupuri = {}
+    for idx, c in enumerate(combinatii):
+        cfg = dict(zip(chei, c))
+        cheie = (cfg["RSI_Period"], cfg["MACD_Fast"], cfg["MACD_Slow"], cfg["MACD_Signal"])
+        grupuri.setdefault(cheie, []).append(
+            (idx, cfg["RSI_OB"], cfg["RSI_OS"], cfg["Stop_Loss"], cfg["Take_Profit"]))
+    return chei, combinatii, [(*cheie, lista) for cheie, lista in grupuri.items()]
+
+def alege_cea_mai_buna(rezultate, chei, combinatii):
+    # prima combinație (în ordinea grilei) cu profitul maxim
+    best_profit = -999999
+    best_config = None
+    for idx, profit in sorted(rezultate):
+        if profit > best_profit:
+            best_profit = profit
+            best_config = dict(zip(chei, combinatii[idx]))
+            best_config["Profit"] = round(float(profit), 2)
+    return best_config
+
+def cauta_grila(df, grid=GRID, workers=WORKERS):
+    chei, combinatii, sarcini = grupeaza_grila(grid)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        cale = os.path.join(tmp, "indicatori.npy")
+        index = precalculeaza_indicatori(df, grid, cale)
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                     initargs=(cale, index)) as ex:
+                rezultate = [r for lot in ex.map(_evalueaza_grup, sarcini) for r in lot]
+        else:
+            _init_worker(cale, index)
+            rezultate = [r for s in sarcini for r in _evalueaza_grup(s)]
+
+    print(f"🔎 {len(rezultate)} combinații evaluate ({workers} procese)")
+    return alege_cea_mai_buna(rezultate, chei, combinatii)
+
+# === PUBLICARE strategy.json ===
+STRATEGY_FILE = "strategy.json"
+
+def citeste_strategia():
+    try:
+        with open(STRATEGY_FILE, "r") as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"[{datetime.now()}] ⚠️ {STRATEGY_FILE} ilizibil: {e}")
+        return None
+
+def publica_strategia(config, baza=None):
+    # peste strategia existentă: symbols, allocations, Trailing_TP etc. rămân neatinse.
+    # Scriere atomică (tmp + fsync + os.replace) → botul (care reîncarcă fișierul la
+    # schimbare) nu poate citi niciodată un JSON pe jumătate scris.
+    strat = dict(baza or {})
+    strat.update(config)
+    strat["Updated"] = pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
+    tmp = f"{STRATEGY_FILE}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(strat, f, indent=4)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, STRATEGY_FILE)
+    return strat
+
+# === OPTIMIZATOR ===
+def run_optimizer():
+    df = incarca_date()
+    if df.empty:
+        print("⚠️ Nu am găsit o strategie optimă.")
+        return
+    best_config = cauta_grila(df)
 
     # Salvăm strategia optimă
     if best_config:
-        best_config["Updated"] = pd.Timestamp.now().strftime("%Y-%m-%d %H:%M:%S")
-        with open("strategy.json", "w") as f:
-            json.dump(best_config, f, indent=4)
+        publica_strategia(best_config, citeste_strategia())
         print(f"✅ Strategie optimizată salvată! Profit estimat: {best_config['Profit']} USDT")
     else:
         print("⚠️ Nu am găsit o strategie optimă.")
 
+# === WALK-FORWARD (serviciu de fundal, lângă bot) ===
+# Pornit de bot (sau de coordonatorul shard-urilor) prin porneste_in_fundal, cu
+# OPTIMIZER_WALK_FORWARD=1; manual: python ai_optimizer.py --walk-forward.
+# La fiecare rulare: lumânările noi din depozit → indicatorii din cache extinși doar cu
+# barele noi → pe fiecare fereastră de antrenare (rulantă) se alege cea mai bună combinație
+# din grilă, apoi e comparată cu strategia curentă pe fereastra de test care urmează.
+# strategy.json e rescris doar dacă candidata câștigă out-of-sample, întâi în backtest_np,
+# apoi în replay-ul logicii live (trailing TP, trend EMA, DCA) pe aceleași ferestre de test.
+# Stop_Loss-ul live rămâne neatins dacă grila nu îl acoperă (ex. 0 = dezactivat).
+WF_INTERVAL_SEC = int(os.getenv("OPTIMIZER_INTERVAL_SEC", "3600"))
+WF_TRAIN_ZILE   = int(os.getenv("OPTIMIZER_TRAIN_DAYS", "60"))
+WF_TEST_ZILE    = int(os.getenv("OPTIMIZER_TEST_DAYS", "14"))
+WF_FERESTRE     = int(os.getenv("OPTIMIZER_FOLDS", "4"))
+WF_MARJA        = float(os.getenv("OPTIMIZER_MIN_GAIN", "0"))   # profit OOS minim peste strategia curentă
+WF_INGESTIE     = os.getenv("OPTIMIZER_INGEST", "kraken")       # kraken | prices | none
+WF_INTERVAL     = 60   # minute / lumânare
+WF_ISTORIC_ZILE = max(ISTORIC_ZILE, WF_TRAIN_ZILE + WF_FERESTRE * WF_TEST_ZILE)
+
+
+class _EMA:
+    # ewm(adjust=False, min_periods=perioada) din pandas: pornește de la prima observație
+    def __init__(self, alpha, perioada):
+        self.alpha = alpha
+        self.perioada = perioada
+        self.valoare = None
+        self.n = 0
+
+    def update(self, x):
+        self.valoare = x if self.valoare is None else (1.0 - self.alpha) * self.valoare + self.alpha * x
+        self.n += 1
+        return self.valoare if self.n >= self.perioada else math.nan
+
+
+class _RSI:
+    # RSI Wilder ca ta.momentum.RSIIndicator (nu varianta rolling din technical_indicators)
+    def __init__(self, window):
+        self.up = _EMA(1.0 / window, window)
+        self.dn = _EMA(1.0 / window, window)
+        self.prev = None
+
+    def extinde(self, close):
+        rsi = np.empty(len(close))
+        for i, c in enumerate(close):
+            d = 0.0 if self.prev is None else c - self.prev   # primul diff e NaN → where(...) îl face 0
+            self.prev = c
+            up = self.up.update(d if d > 0 else 0.0)
+            dn = self.dn.update(-d if d < 0 else 0.0)
+            if math.isnan(dn):
+                rsi[i] = math.nan
+            else:
+                rsi[i] = 100.0 if dn == 0 else 100 - (100 / (1 + up / dn))
+        return (rsi,)
+
+
+class _MACD:
+    # ca ta.trend.MACD: semnalul pornește de la prima valoare MACD validă
+    def __init__(self, fast, slow, sign):
+        self.fast = _EMA(2.0 / (fast + 1), fast)
+        self.slow = _EMA(2.0 / (slow + 1), slow)
+        self.sign = _EMA(2.0 / (sign + 1), sign)
+
+    def extinde(self, close):
+        macd = np.empty(len(close))
+        signal = np.empty(len(close))
+        for i, c in enumerate(close):
+            macd[i] = self.fast.update(c) - self.slow.update(c)
+            signal[i] = math.nan if math.isnan(macd[i]) else self.sign.update(macd[i])
+        return macd, signal
+
+
+class IndicatoriIncrementali:
+    # close + indicatorii calculați o singură dată; starea recursivă (EMA) e păstrată între
+    # rulări, deci o rulare nouă calculează doar barele adăugate între timp
+    def __init__(self, max_bare=None):
+        self.max_bare = max_bare
+        self.time = np.empty(0, dtype=np.int64)
+        self.close = np.empty(0)
+        self.stari = {}   # ("rsi", p) / ("macd", f, s, g) → (stare, serii)
+
+    def adauga(self, time, close):
+        time = np.asarray(time, dtype=np.int64)
+        close = np.asarray(close, dtype=float)
+        if len(self.time):
+            noi = time > self.time[-1]
+            time, close = time[noi], close[noi]
+        if not len(time):
+            return 0
+        self.time = np.concatenate([self.time, time])
+        self.close = np.concatenate([self.close, close])
+        for cheie, (stare, serii) in self.stari.items():
+            self.stari[cheie] = (stare, tuple(np.concatenate([v, n]) for v, n in zip(serii, stare.extinde(close))))
+
+        if self.max_bare and len(self.time) > self.max_bare:
+            k = len(self.time) - self.max_bare
+            self.time, self.close = self.time[k:], self.close[k:]
+            self.stari = {c: (st, tuple(v[k:] for v in serii)) for c, (st, serii) in self.stari.items()}
+        return len(time)
+
+    def serii(self, cheie):
+        # la prima cerere, seria e calculată peste tot istoricul păstrat
+        if cheie not in self.stari:
+            stare = _RSI(*cheie[1:]) if cheie[0] == "rsi" else _MACD(*cheie[1:])
+            self.stari[cheie] = (stare, stare.extinde(self.close))
+        return self.stari[cheie][1]
+
+    def rsi(self, cfg):
+        return self.serii(("rsi", cfg["RSI_Period"]))[0]
+
+    def macd(self, cfg):
+        return self.serii(("macd", cfg["MACD_Fast"], cfg["MACD_Slow"], cfg["MACD_Signal"]))
+
+
+def ferestre_walk_forward(time, train_sec, test_sec, n):
+    # [(început train, început test, sfârșit test)] ca indici în `time`, cea mai recentă prima
+    if not len(time):
+        return []
+    sfarsit = int(time[-1]) + 1
+    ferestre = []
+    for k in range(n):
+        b = sfarsit - k * test_sec
+        t = b - test_sec
+        a = t - train_sec
+        if a < time[0]:
+            break   # istoric insuficient pentru fereastra de antrenare
+        ferestre.append(tuple(int(np.searchsorted(time, x)) for x in (a, t, b)))
+    return ferestre
+
+def parametri_curenti(strat):
+    # strategia live în termenii backtest-ului (valorile lipsă = cele implicite din bot)
+    return {
+        "RSI_Period": strat.get("RSI_Period", 14), "RSI_OB": strat.get("RSI_OB", 65),
+        "RSI_OS": strat.get("RSI_OS", 35), "MACD_Fast": strat.get("MACD_Fast", 12),
+        "MACD_Slow": strat.get("MACD_Slow", 26), "MACD_Signal": strat.get("MACD_Signal", 9),
+        "Stop_Loss": strat.get("Stop_Loss", 0.0) or math.inf,   # 0 = SL dezactivat în bot
+        "Take_Profit": strat.get("Take_Profit", 4.0),
+    }
+
+def grila_efectiva(grid, strat):
+    # (grila, chei fixate): Stop_Loss-ul live (ex. 0 = dezactivat) nu e înlocuit cu o valoare din grilă
+    grid = dict(grid)
+    fixate = set()
+    if strat.get("Stop_Loss", 0.0) not in grid.get("Stop_Loss", []):
+        grid["Stop_Loss"] = [parametri_curenti(strat)["Stop_Loss"]]
+        fixate.add("Stop_Loss")
+    return grid, fixate
+
+def profit_replay(cache, pair, strat, a, b):
+    # PnL-ul logicii live (replay.ruleaza_replay) pe barele [a, b), cu încălzire de MAX_CANDELE bare
+    # înainte (aceeași pentru ambele strategii comparate); un tick per lumânare, la închiderea ei
+    import replay
+
+    k = max(0, a - replay.MAX_CANDELE)
+    ticks = pd.DataFrame({"timestamp": pd.to_datetime(cache.time[k:b] + WF_INTERVAL * 60, unit="s"),
+                          "symbol": pair, "price": cache.close[k:b]})
+    return replay.ruleaza_replay(ticks, {**strat, "symbols": [pair]})["pnl_eur"]
+
+def profit_fereastra(cache, cfg, a, b):
+    macd, signal = cache.macd(cfg)
+    rezultate = _profituri(cache.close[a:b], cache.rsi(cfg)[a:b], macd[a:b], signal[a:b],
+                           np.ones(b - a, dtype=bool),
+                           [(0, cfg["RSI_OB"], cfg["RSI_OS"], cfg["Stop_Loss"], cfg["Take_Profit"])])
+    return rezultate[0][1] if rezultate else 0.0
+
+def cauta_fereastra(cache, grid, a, b):
+    # grila pe bare [a, b) din cache, într-un singur proces (serviciul rulează lângă bot)
+    chei, combinatii, sarcini = grupeaza_grila(grid)
+    rezultate = []
+    for rsi_period, fast, slow, sign, lista in sarcini:
+        rsi = cache.serii(("rsi", rsi_period))[0]
+        macd, signal = cache.serii(("macd", fast, slow, sign))
+        rezultate += _profituri(cache.close[a:b], rsi[a:b], macd[a:b], signal[a:b],
+                                np.ones(b - a, dtype=bool), lista)
+    return alege_cea_mai_buna(rezultate, chei, combinatii)
+
+
+class WalkForward:
+    def __init__(self, pair=PAIR, grid=GRID):
+        self.pair = pair
+        self.grid = grid
+        self.cache = IndicatoriIncrementali(max_bare=WF_ISTORIC_ZILE * 24 * 60 // WF_INTERVAL)
+        self.evaluat = None   # (ultima bară, parametrii curenți) la ultima evaluare
+
+    def actualizeaza(self):
+        # lumânările închise noi: ingestie în depozit, apoi citite doar cele după ultima din cache
+        try:
+            if WF_INGESTIE == "kraken":
+                candle_store.ingereaza_kraken(self.pair, WF_INTERVAL)
+            elif WF_INGESTIE == "prices":
+                candle_store.ingereaza_prices(self.pair, WF_INTERVAL)
+        except Exception as e:
+            print(f"[{datetime.now()}] ⚠️ Ingestie {self.pair} eșuată: {e}")
+        if WF_INGESTIE != "none" and not len(self.cache.time):
+            # la prima încărcare: istoricul dinaintea celor 720 de lumânări Kraken, din Postgres
+            try:
+                candle_store.completeaza_istoric(self.pair, WF_INTERVAL, WF_ISTORIC_ZILE)
+            except Exception as e:
+                print(f"[{datetime.now()}] ⚠️ Completare istoric {self.pair} eșuată: {e}")
+        if len(self.cache.time):
+            since = int(self.cache.time[-1]) + 1
+        else:
+            verifica_acoperire(self.pair, WF_INTERVAL, WF_ISTORIC_ZILE)
+            since = int(time.time()) - WF_ISTORIC_ZILE * 86400
+        df = candle_store.incarca_df(self.pair, WF_INTERVAL, since=since)
+        return self.cache.adauga(df["time"], df["close"])
+
+    def pas(self):
+        noi = self.actualizeaza()
+        strat = citeste_strategia()
+        if strat is None:
+            return False   # nu rescriem un fișier pe care nu l-am putut citi
+        curent = parametri_curenti(strat)
+        cheie = (int(self.cache.time[-1]) if len(self.cache.time) else None, tuple(curent.items()))
+        if cheie == self.evaluat:
+            print(f"[{datetime.now()}] 💤 Walk-forward: nicio lumânare nouă, strategie neschimbată")
+            return False
+
+        ferestre = ferestre_walk_forward(self.cache.time, WF_TRAIN_ZILE * 86400, WF_TEST_ZILE * 86400, WF_FERESTRE)
+        if not ferestre:
+            print(f"[{datetime.now()}] ⚠️ Walk-forward: istoric insuficient pentru {self.pair} "
+                  f"({len(self.cache.time)} lumânări)")
+            return False
+
+        grid, fixate = grila_efectiva(self.grid, strat)
+        rezultate = []
+        for a, t, b in ferestre:
+            candidat = cauta_fereastra(self.cache, grid, a, t)
+            if candidat is None:
+                return False
+            rezultate.append((candidat, profit_fereastra(self.cache, candidat, t, b),
+                              profit_fereastra(self.cache, curent, t, b)))
+        oos = sum(r[1] for r in rezultate)
+        oos_curent = sum(r[2] for r in rezultate)
+        candidat, oos_ultim, curent_ultim = rezultate[0]
+        self.evaluat = cheie
+        print(f"[{datetime.now()}] 🔎 Walk-forward {self.pair} (+{noi} lumânări, {len(ferestre)} ferestre): "
+              f"OOS candidat {oos:.2f} vs curent {oos_curent:.2f} | ultima fereastră "
+              f"{oos_ultim:.2f} vs {curent_ultim:.2f}")
+
+        config = {k: candidat[k] for k in grid if k not in fixate}
+        if all(curent[k] == v for k, v in config.items()):
+            return False
+        if oos <= oos_curent + WF_MARJA or oos_ultim < curent_ultim:
+            return False
+
+        # backtest_np ignoră trailing TP, trendul și DCA → decizia finală vine din replay
+        replay_candidat = sum(profit_replay(self.cache, self.pair, {**strat, **config}, t, b) for _, t, b in ferestre)
+        replay_curent = sum(profit_replay(self.cache, self.pair, strat, t, b) for _, t, b in ferestre)
+        print(f"[{datetime.now()}] 🎞️ Replay {self.pair}: candidat {replay_candidat:.2f}€ vs curent {replay_curent:.2f}€")
+        if replay_candidat <= replay_curent + WF_MARJA:
+            return False
+        config["Profit"] = round(float(oos_ultim), 2)
+        publica_strategia(config, strat)
+        print(f"[{datetime.now()}] ✅ Strategie nouă publicată: {config}")
+        return True
+
+
+def ruleaza_walk_forward(interval_sec=WF_INTERVAL_SEC, o_data=False):
+    wf = WalkForward()
+    print(f"[{datetime.now()}] 🔁 Walk-forward {wf.pair}: antrenare {WF_TRAIN_ZILE}z, test {WF_TEST_ZILE}z, "
+          f"{WF_FERESTRE} ferestre, la fiecare {interval_sec}s")
+    while True:
+        try:
+            wf.pas()
+        except Exception as e:
+            print(f"[{datetime.now()}] ❌ Walk-forward eșuat: {e}")
+        if o_data:
+            return
+        time.sleep(interval_sec)
+
+def porneste_in_fundal():
+    # proces separat (spawn), în același dyno cu botul: strategy.json publicat aici e cel pe care
+    # botul îl reîncarcă, iar grila nu concurează cu bucla de trading pentru GIL
+    import multiprocessing as mp
+    p = mp.get_context("spawn").Process(target=ruleaza_walk_forward, name="walk-forward", daemon=True)
+    p.start()
+    print(f"[{datetime.now()}] 🔁 Walk-forward pornit în fundal (pid={p.pid})")
+    return p
+
 if __name__ == "__main__":
-    run_optimizer()
+    parser = argparse.ArgumentParser(description="Optimizare parametri strategie")
+    parser.add_argument("--walk-forward", action="store_true",
+                        help="serviciu periodic: re-optimizare pe ferestre rulante, publică doar dacă bate strategia curentă OOS")
+    parser.add_argument("--o-data", action="store_true", help="cu --walk-forward: o singură rulare")
+    args = parser.parse_args()
+
+    if args.walk_forward:
+        ruleaza_walk_forward(o_data=args.o_data)
+    else:
+        run_optimizer()
@@ -1,9 +1,9 @@
-import psycopg2
 import os
-import pandas as pd
 
 def analyze_db():
     try:
+        import psycopg2
+        import pandas as pd
         conn = psycopg2.connect(os.getenv("DATABASE_URL"))
         print("✅ Conectat la baza de date\n")
 
@@ -1,10 +1,10 @@
-import psycopg2
 import os
-import pandas as pd
-import matplotlib.pyplot as plt
 
 def analyze_db_charts():
     try:
+        import psycopg2
+        import pandas as pd
+        import matplotlib.pyplot as plt
         conn = psycopg2.connect(os.getenv("DATABASE_URL"))
         print("✅ Conectat la baza de date\n")
 
@@ -1,8 +1,8 @@
-import pandas as pd
 from datetime import datetime, timedelta
 
 def analyze_signals(file="signals_log.csv"):
     try:
+        import pandas as pd
         df = pd.read_csv(file)
 
         # conversie coloană Timp la datetime
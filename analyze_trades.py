@@ -1,7 +1,6 @@
-import pandas as pd
-
 def analyze_trades(file="trades_log.csv"):
     try:
+        import pandas as pd
         df = pd.read_csv(file)
 
         # verificăm că există coloanele necesare
@@ -0,0 +1,230 @@
+import os
+import gc
+import json
+import time
+import argparse
+import contextlib
+import platform
+import tracemalloc
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+import strategie
+import technical_indicators
+import ai_optimizer
+import candle_store
+
+# Benchmark offline pentru căile fierbinți: indicatori, semnal, backtest, grilă.
+# Raportează latență/apel, throughput și vârf de memorie; compară cu un baseline salvat.
+BASELINE_FILE = os.getenv("BENCHMARK_BASELINE", "benchmark_baseline.json")
+TOLERANTA     = 0.25    # regresie dacă e cu >25% mai lent decât baseline-ul
+PRAG_MS       = 0.5     # și cu cel puțin atât mai lent (zgomotul apelurilor sub-milisecundă)
+
+STRATEGIE_BENCH = {
+    "RSI_Period": 14, "RSI_OB": 70, "RSI_OS": 30,
+    "MACD_Fast": 12, "MACD_Slow": 26, "MACD_Signal": 9,
+    "Stop_Loss": 2.0, "Take_Profit": 3.0,
+}
+GRILA_BENCH = {
+    "RSI_Period": [7, 14],
+    "RSI_OB": [65, 70, 75],
+    "RSI_OS": [25, 30, 35],
+    "MACD_Fast": [8, 12],
+    "MACD_Slow": [18, 26],
+    "MACD_Signal": [9],
+    "Stop_Loss": [1.5, 3.0],
+    "Take_Profit": [2.0, 5.0],
+}
+
+# -------------------- DATE --------------------
+def candele_sintetice(n, pret=50000.0, seed=0, interval=60):
+    # random walk log-normal, în formatul lui candle_store.incarca_df / obtine_ohlc
+    rng = np.random.default_rng(seed)
+    close = pret * np.exp(np.cumsum(rng.normal(0, 0.01, n)))
+    open_ = np.concatenate([[pret], close[:-1]])
+    zgomot = np.abs(rng.normal(0, 0.003, n))
+    t0 = (int(time.time()) // (interval * 60) - n + 1) * interval * 60
+    timp = t0 + np.arange(n, dtype=np.int64) * interval * 60
+    df = pd.DataFrame({
+        "time": timp,
+        "open": open_,
+        "high": np.maximum(open_, close) * (1 + zgomot),
+        "low": np.minimum(open_, close) * (1 - zgomot),
+        "close": close,
+        "vwap": (open_ + close) / 2,
+        "volume": rng.uniform(1, 10, n),
+        "count": rng.integers(10, 500, n),
+    })
+    df.insert(0, "timestamp", pd.to_datetime(df["time"], unit="s"))
+    return df
+
+def candele_store(pair, n, interval=60):
+    df = candle_store.incarca_df(pair, interval)
+    if df.empty:
+        raise SystemExit(f"⚠️ Depozit local gol pentru {pair} — rulează: python candle_store.py kraken {pair}")
+    return df.iloc[-n:].reset_index(drop=True)
+
+def ohlc_cache(df):
+    # cum arată un DataFrame din candele_cache (index dtime, ultima lumânare = ora curentă)
+    ohlc = df.drop(columns=["timestamp"]).iloc[-strategie.MAX_CANDELE:].copy()
+    ohlc.index = pd.to_datetime(ohlc["time"], unit="s")
+    ohlc.index.name = "dtime"
+    return ohlc
+
+# -------------------- MĂSURARE --------------------
+def masoara(fn, repetari, unitati=1):
+    # latență mediană/apel, throughput (unități/s) și vârf de memorie alocată (MB);
+    # stdout e redirecționat: strategie/optimizer printează la fiecare apel
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):
+        fn()  # încălzire (cache-uri, import-uri lazy)
+        gc.collect()
+        durate = []
+        for _ in range(repetari):
+            t = time.perf_counter()
+            fn()
+            durate.append(time.perf_counter() - t)
+        tracemalloc.start()
+        fn()
+        _, varf = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+    mediana = float(np.median(durate))
+    return {
+        "ms": round(mediana * 1000, 4),
+        "throughput": round(unitati / mediana, 1) if mediana > 0 else None,
+        "mem_mb": round(varf / 2**20, 3),
+    }
+
+def ruleaza_benchmark(sursa="sintetic", pair="XXBTZEUR", lungimi=(500, 2000, 8760),
+                      simboluri=(1, 5, 20), repetari=5, workers=ai_optimizer.WORKERS):
+    rezultate = {}
+
+    def adauga(nume, unitate, rez):
+        rez["unitate"] = unitate
+        rezultate[nume] = rez
+        print(f"  {nume:<40} {rez['ms']:>10.3f} ms   {rez['throughput'] or 0:>14,.0f} {unitate}/s"
+              f"   {rez['mem_mb']:>8.2f} MB")
+
+    s = STRATEGIE_BENCH
+    for n in lungimi:
+        df = candele_sintetice(n) if sursa == "sintetic" else candele_store(pair, n)
+        n = len(df)
+        close = df["close"]
+        print(f"📏 {n} bare")
+
+        adauga(f"calculeaza_RSI/{n}", "bare",
+               masoara(lambda: strategie.calculeaza_RSI(close, s["RSI_Period"]), repetari, n))
+        adauga(f"calculeaza_MACD/{n}", "bare",
+               masoara(lambda: strategie.calculeaza_MACD(close, s["MACD_Fast"], s["MACD_Slow"], s["MACD_Signal"]),
+                       repetari, n))
+        adauga(f"calculate_indicators/{n}", "bare",
+               masoara(lambda: technical_indicators.calculate_indicators(df[["close"]].copy(), s), repetari, n))
+        adauga(f"simulate/{n}", "bare",
+               masoara(lambda: ai_optimizer.simulate(df[["timestamp", "close"]], s["RSI_Period"], s["RSI_OB"],
+                                                     s["RSI_OS"], s["MACD_Fast"], s["MACD_Slow"],
+                                                     s["MACD_Signal"], s["Stop_Loss"], s["Take_Profit"]),
+                       repetari, n))
+
+    # semnal pe N simboluri: "rece" = stare incrementală reconstruită din tot buffer-ul,
+    # "cald" = o lumânare nouă peste starea existentă (cazul live, o dată pe oră)
+    df = candele_sintetice(strategie.MAX_CANDELE + 1) if sursa == "sintetic" else candele_store(pair, strategie.MAX_CANDELE + 1)
+    ohlc_plin = ohlc_cache(df)
+    ohlc_anterior = ohlc_plin.iloc[:-1]
+    for n_sim in simboluri:
+        perechi = [f"SIM{i}ZEUR" for i in range(n_sim)]
+
+        def semnal_rece():
+            strategie.ultima_ora_semnal.clear()
+            strategie.indicatori_stare.clear()
+            for p in perechi:
+                strategie.evalueaza_semnal(p, ohlc_plin, s)
+
+        def semnal_cald():
+            strategie.ultima_ora_semnal.clear()
+            for p in perechi:
+                strategie.indicatori_stare[p]["time"] = int(ohlc_anterior["time"].iloc[-2])
+                strategie.evalueaza_semnal(p, ohlc_plin, s)
+
+        def semnal_cache():
+            # calculeaza_semnal complet: lumânarea orei curente e în candele_cache → fără rețea
+            for p in perechi:
+                strategie.calculeaza_semnal(p, s)
+
+        adauga(f"evalueaza_semnal_rece/{n_sim}sym", "simboluri", masoara(semnal_rece, repetari, n_sim))
+        adauga(f"evalueaza_semnal_cald/{n_sim}sym", "simboluri", masoara(semnal_cald, repetari, n_sim))
+        for p in perechi:
+            strategie.candele_cache[(p, 60)] = {"df": ohlc_plin, "last": int(ohlc_plin["time"].iloc[-1]),
+                                                "ultima": int(ohlc_plin["time"].iloc[-1]), "curenta": None}
+        adauga(f"calculeaza_semnal/{n_sim}sym", "simboluri", masoara(semnal_cache, repetari, n_sim))
+        for p in perechi:
+            strategie.candele_cache.pop((p, 60), None)
+            strategie.indicatori_stare.pop(p, None)
+            strategie.ultima_ora_semnal.pop(p, None)
+
+    # grilă: combinații/s, secvențial și cu procese
+    df = candele_sintetice(max(lungimi)) if sursa == "sintetic" else candele_store(pair, max(lungimi))
+    n_comb = int(np.prod([len(v) for v in GRILA_BENCH.values()]))
+    for w in sorted({1, workers}):
+        adauga(f"cauta_grila/{n_comb}comb/{w}proc", "combinatii",
+               masoara(lambda: ai_optimizer.cauta_grila(df[["timestamp", "close"]], GRILA_BENCH, workers=w),
+                       max(1, repetari // 2), n_comb))
+
+    return rezultate
+
+# -------------------- BASELINE --------------------
+def compara(rezultate, baseline, toleranta=TOLERANTA, prag_ms=PRAG_MS):
+    regresii = []
+    for nume, rez in rezultate.items():
+        ref = baseline.get(nume)
+        if not ref or not ref.get("ms"):
+            continue
+        raport = rez["ms"] / ref["ms"]
+        if raport > 1 + toleranta and rez["ms"] - ref["ms"] > prag_ms:
+            regresii.append((nume, ref["ms"], rez["ms"], raport))
+    return regresii
+
+def salveaza_baseline(rezultate, cale=BASELINE_FILE):
+    date = {
+        "meta": {"creat": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+                 "python": platform.python_version(), "masina": platform.node(),
+                 "pandas": pd.__version__, "numpy": np.__version__},
+        "rezultate": rezultate,
+    }
+    tmp = f"{cale}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(date, f, indent=4)
+    os.replace(tmp, cale)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark offline pentru indicatori, semnal și optimizer")
+    parser.add_argument("--sursa", choices=["sintetic", "store"], default="sintetic")
+    parser.add_argument("--pair", default="XXBTZEUR")
+    parser.add_argument("--lungimi", default="500,2000,8760", help="număr de bare, separate prin virgulă")
+    parser.add_argument("--simboluri", default="1,5,20")
+    parser.add_argument("--repetari", type=int, default=5)
+    parser.add_argument("--workers", type=int, default=ai_optimizer.WORKERS)
+    parser.add_argument("--baseline", default=BASELINE_FILE)
+    parser.add_argument("--salveaza", action="store_true", help="scrie rezultatele ca baseline nou")
+    parser.add_argument("--toleranta", type=float, default=TOLERANTA)
+    args = parser.parse_args()
+
+    print(f"[{datetime.now()}] ⏱️ Benchmark ({args.sursa}, {args.repetari} repetări)")
+    rezultate = ruleaza_benchmark(
+        args.sursa, args.pair,
+        [int(x) for x in args.lungimi.split(",")],
+        [int(x) for x in args.simboluri.split(",")],
+        args.repetari, args.workers,
+    )
+
+    if args.salveaza:
+        salveaza_baseline(rezultate, args.baseline)
+        print(f"[{datetime.now()}] 💾 Baseline salvat în {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as f:
+            baseline = json.load(f)["rezultate"]
+        regresii = compara(rezultate, baseline, args.toleranta)
+        for nume, vechi, nou, raport in regresii:
+            print(f"❌ REGRESIE {nume}: {vechi:.3f} ms → {nou:.3f} ms (x{raport:.2f})")
+        if regresii:
+            raise SystemExit(1)
+        print(f"[{datetime.now()}] ✅ Fără regresii față de {args.baseline} (toleranță {args.toleranta:.0%})")
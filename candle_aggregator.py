@@ -0,0 +1,99 @@
+import time
+import threading
+from collections import deque
+import pandas as pd
+
+# Lumânări OHLC în memorie (1m, 5m, 15m, 1h) construite din prețurile pe care botul
+# le citește oricum la fiecare tick — fără request-uri OHLC suplimentare.
+# Bara curentă (parțială) e actualizată la fiecare tick; la trecerea graniței de timp
+# e finalizată și mutată în istoricul închis (maxim MAX_BARE per pereche/interval).
+INTERVALE = (1, 5, 15, 60)   # minute
+MAX_BARE  = 720
+
+
+class AgregatorLumanari:
+    def __init__(self, intervale=INTERVALE, max_bare=MAX_BARE, la_inchidere=None):
+        self.intervale = tuple(intervale)
+        self.max_bare = max_bare
+        self.la_inchidere = la_inchidere   # fn(pair, interval, bara) pentru fiecare bară finalizată
+        self.curente = {}   # (pair, interval) → bara deschisă
+        self.inchise = {}   # (pair, interval) → deque de bare finalizate
+        self._lacat = threading.Lock()
+
+    def adauga(self, pair, pret, ts=None):
+        # → barele finalizate de acest tick [(pair, interval, bara)]
+        ts = int(time.time() if ts is None else ts)
+        pret = float(pret)
+        finalizate = []
+        with self._lacat:
+            for interval in self.intervale:
+                cheie = (pair, interval)
+                inceput = ts // (interval * 60) * (interval * 60)
+                bara = self.curente.get(cheie)
+                if bara is not None and inceput < bara["time"]:
+                    continue   # tick întârziat pentru o bară deja închisă
+                if bara is None or inceput > bara["time"]:
+                    if bara is not None:
+                        finalizate.append(self._finalizeaza(cheie, bara))
+                    self.curente[cheie] = {"time": inceput, "open": pret, "high": pret, "low": pret,
+                                           "close": pret, "suma": pret, "count": 1}
+                else:
+                    bara["high"] = max(bara["high"], pret)
+                    bara["low"] = min(bara["low"], pret)
+                    bara["close"] = pret
+                    bara["suma"] += pret
+                    bara["count"] += 1
+        self._notifica(finalizate)
+        return finalizate
+
+    def inchide_expirate(self, ts=None):
+        # finalizare la granița de timp, și pentru perechile fără tick în intervalul nou
+        ts = int(time.time() if ts is None else ts)
+        finalizate = []
+        with self._lacat:
+            for (pair, interval), bara in list(self.curente.items()):
+                if bara["time"] + interval * 60 <= ts:
+                    finalizate.append(self._finalizeaza((pair, interval), bara))
+                    del self.curente[(pair, interval)]
+        self._notifica(finalizate)
+        return finalizate
+
+    def _finalizeaza(self, cheie, bara):
+        inchise = self.inchise.get(cheie)
+        if inchise is None:
+            inchise = self.inchise[cheie] = deque(maxlen=self.max_bare)
+        inchise.append(bara)
+        return (cheie[0], cheie[1], bara)
+
+    def _notifica(self, finalizate):
+        if self.la_inchidere is not None:
+            for pair, interval, bara in finalizate:
+                self.la_inchidere(pair, interval, candela(bara))
+
+    # -------------------- CITIRE --------------------
+    def bara_curenta(self, pair, interval):
+        with self._lacat:
+            bara = self.curente.get((pair, interval))
+            return candela(bara) if bara is not None else None
+
+    def bare(self, pair, interval, partiala=True):
+        with self._lacat:
+            bare = list(self.inchise.get((pair, interval), ()))
+            if partiala and (pair, interval) in self.curente:
+                bare.append(self.curente[(pair, interval)])
+            return [candela(b) for b in bare]
+
+    def df(self, pair, interval, partiala=True):
+        # același format ca obtine_ohlc: coloane time/open/high/low/close/vwap/volume/count, index dtime
+        df = pd.DataFrame(self.bare(pair, interval, partiala),
+                          columns=["time", "open", "high", "low", "close", "vwap", "volume", "count"])
+        df.index = pd.to_datetime(df["time"], unit="s")
+        df.index.name = "dtime"
+        return df
+
+
+def candela(bara):
+    # fără volum din ticker: vwap = media tick-urilor din bară
+    return {"time": bara["time"], "open": bara["open"], "high": bara["high"], "low": bara["low"],
+            "close": bara["close"], "vwap": bara["suma"] / bara["count"], "volume": 0.0,
+            "count": bara["count"]}
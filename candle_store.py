@@ -0,0 +1,225 @@
+import os
+import time
+import shutil
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+
+# Depozit local de lumânări: un fișier binar per coloană, per pereche și interval
+#   candles/XXBTZEUR/60/time.i8, open.f8, ... — append-only, citit prin np.memmap
+STORE_DIR = os.getenv("CANDLE_STORE_DIR", "candles")
+
+COLOANE = {
+    "time": "<i8",
+    "open": "<f8",
+    "high": "<f8",
+    "low": "<f8",
+    "close": "<f8",
+    "vwap": "<f8",
+    "volume": "<f8",
+    "count": "<i8",
+}
+
+def _director(pair, interval):
+    return os.path.join(STORE_DIR, pair, str(interval))
+
+def _cale(pair, interval, col):
+    return os.path.join(_director(pair, interval), f"{col}.{COLOANE[col][1:]}")
+
+def _randuri(pair, interval):
+    # numărul de rânduri complete (un append întrerupt lasă coloane inegale)
+    lungimi = []
+    for col, dtype in COLOANE.items():
+        cale = _cale(pair, interval, col)
+        if not os.path.exists(cale):
+            return 0
+        lungimi.append(os.path.getsize(cale) // np.dtype(dtype).itemsize)
+    return min(lungimi)
+
+def incarca(pair, interval=60):
+    # {coloană: np.memmap read-only}; fără parsare, doar mapare în memorie
+    n = _randuri(pair, interval)
+    if n == 0:
+        return {col: np.empty(0, dtype=dtype) for col, dtype in COLOANE.items()}
+    return {col: np.memmap(_cale(pair, interval, col), dtype=dtype, mode="r", shape=(n,))
+            for col, dtype in COLOANE.items()}
+
+def incarca_df(pair, interval=60, since=None):
+    cols = incarca(pair, interval)
+    start = int(np.searchsorted(cols["time"], since)) if since is not None else 0
+    df = pd.DataFrame({col: np.asarray(v[start:]) for col, v in cols.items()})
+    df.insert(0, "timestamp", pd.to_datetime(df["time"], unit="s"))
+    return df
+
+def ultimul_time(pair, interval=60):
+    n = _randuri(pair, interval)
+    if n == 0:
+        return None
+    return int(np.memmap(_cale(pair, interval, "time"), dtype=COLOANE["time"], mode="r", shape=(n,))[-1])
+
+def adauga(pair, interval, df):
+    # adaugă doar lumânările închise, mai noi decât ultima stocată
+    ultim = ultimul_time(pair, interval)
+    if ultim is not None:
+        df = df[df["time"] > ultim]
+    if df.empty:
+        return 0
+    df = df.sort_values("time")
+
+    os.makedirs(_director(pair, interval), exist_ok=True)
+    n = _randuri(pair, interval)
+    for col, dtype in COLOANE.items():
+        cale = _cale(pair, interval, col)
+        with open(cale, "ab") as f:
+            f.truncate(n * np.dtype(dtype).itemsize)  # repară un append anterior întrerupt
+            valori = df[col] if col in df else np.zeros(len(df))
+            f.write(np.asarray(valori, dtype=dtype).tobytes())
+    return len(df)
+
+def rescrie(pair, interval, df):
+    # înlocuiește tot istoricul (ex. completat cu lumânări mai vechi decât prima stocată):
+    # director nou, apoi schimbat cu cel vechi — cititorii văd fie istoricul vechi, fie pe cel nou
+    director = _director(pair, interval)
+    tmp, vechi = f"{director}.tmp", f"{director}.vechi"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    df = df.sort_values("time").drop_duplicates("time", keep="last")
+    for col, dtype in COLOANE.items():
+        valori = df[col] if col in df else np.zeros(len(df))
+        with open(os.path.join(tmp, f"{col}.{dtype[1:]}"), "wb") as f:
+            f.write(np.asarray(valori, dtype=dtype).tobytes())
+    shutil.rmtree(vechi, ignore_errors=True)
+    if os.path.exists(director):
+        os.rename(director, vechi)
+    os.rename(tmp, director)
+    shutil.rmtree(vechi, ignore_errors=True)
+    return len(df)
+
+def acoperire_zile(pair, interval=60):
+    # câte zile de istoric are depozitul (de la prima lumânare până acum)
+    cols = incarca(pair, interval)
+    if not len(cols["time"]):
+        return 0.0
+    return (time.time() - int(cols["time"][0])) / 86400
+
+# -------------------- INGESTIE --------------------
+# Kraken OHLC întoarce doar ultimele 720 de lumânări, indiferent de `since` (la 1h: ~30 zile).
+# Istoricul mai vechi vine din Postgres: rollup-ul prices_1h (păstrat nelimitat) sau tick-urile
+# din prices (RAW_RETENTION_DAYS) → completeaza_istoric.
+def ingereaza_kraken(pair, interval=60):
+    from kraken_client import get_ohlc  # doar pentru sursa kraken
+
+    since = ultimul_time(pair, interval)
+    ohlc, _ = get_ohlc(pair, interval=interval, since=since)
+    inchise = ohlc.iloc[:-1]  # ultima lumânare e încă deschisă
+    total = adauga(pair, interval, inchise)
+    print(f"[{datetime.now()}] 📥 {pair}/{interval}m: +{total} lumânări din Kraken")
+    return total
+
+def _engine_db():
+    from sqlalchemy import create_engine
+
+    db_url = os.getenv("DATABASE_URL")
+    if db_url and db_url.startswith("postgres://"):
+        db_url = db_url.replace("postgres://", "postgresql://", 1)
+    return create_engine(db_url), os.getenv("DB_SCHEMA", "public")
+
+def _tipizeaza(df):
+    return df.astype({"time": "int64", "count": "int64",
+                      **{c: "float64" for c in ("open", "high", "low", "close", "vwap", "volume")}})
+
+def bare_prices(engine, schema, pair, interval=60, de_la=None, pana_la=None):
+    # agregă tick-urile proprii din tabelul prices în lumânări OHLC (doar intervale închise), [de_la, pana_la)
+    from sqlalchemy import text
+
+    sec = interval * 60
+    q = text(f"""
+        SELECT bucket AS time,
+               (array_agg(price ORDER BY timestamp))[1]      AS open,
+               MAX(price)                                    AS high,
+               MIN(price)                                    AS low,
+               (array_agg(price ORDER BY timestamp DESC))[1] AS close,
+               AVG(price)                                    AS vwap,
+               0                                             AS volume,
+               COUNT(*)                                      AS count
+        FROM (
+            SELECT FLOOR(EXTRACT(EPOCH FROM timestamp) / :sec)::BIGINT * :sec AS bucket, timestamp, price
+            FROM {schema}.prices
+            WHERE symbol = :sym AND timestamp >= to_timestamp(:from_ts) AT TIME ZONE 'UTC'
+              AND timestamp < to_timestamp(:to_ts) AT TIME ZONE 'UTC'
+        ) t
+        WHERE bucket < FLOOR(EXTRACT(EPOCH FROM NOW() AT TIME ZONE 'UTC') / :sec)::BIGINT * :sec
+        GROUP BY bucket
+        ORDER BY bucket
+    """)
+    df = pd.read_sql(q, engine, params={"sec": sec, "sym": pair, "from_ts": de_la or 0,
+                                         "to_ts": pana_la if pana_la is not None else 2**40})
+    return _tipizeaza(df)
+
+def bare_rollup_1h(engine, schema, pair, de_la=None, pana_la=None):
+    # lumânări 1h din rollup-ul prices_1h (fără vwap/volum: vwap = close)
+    from sqlalchemy import text
+
+    q = text(f"""
+        SELECT EXTRACT(EPOCH FROM bucket)::BIGINT AS time, open, high, low, close,
+               close AS vwap, 0 AS volume, count
+        FROM {schema}.prices_1h
+        WHERE symbol = :sym AND bucket >= to_timestamp(:from_ts) AT TIME ZONE 'UTC'
+          AND bucket < to_timestamp(:to_ts) AT TIME ZONE 'UTC'
+        ORDER BY bucket
+    """)
+    df = pd.read_sql(q, engine, params={"sym": pair, "from_ts": de_la or 0,
+                                         "to_ts": pana_la if pana_la is not None else 2**40})
+    return _tipizeaza(df)
+
+def ingereaza_prices(pair, interval=60):
+    engine, schema = _engine_db()
+    sec = interval * 60
+    ultim = ultimul_time(pair, interval)
+    df = bare_prices(engine, schema, pair, interval, de_la=(ultim + sec) if ultim is not None else 0)
+    total = adauga(pair, interval, df)
+    print(f"[{datetime.now()}] 📥 {pair}/{interval}m: +{total} lumânări din prices")
+    return total
+
+def completeaza_istoric(pair, interval=60, zile=182):
+    # lumânările dinaintea primei stocate, până la `zile` în urmă, din Postgres
+    cols = incarca(pair, interval)
+    de_la = int(time.time()) - zile * 86400
+    primul = int(cols["time"][0]) if len(cols["time"]) else None
+    if primul is not None and primul <= de_la + interval * 60:
+        return 0
+    engine, schema = _engine_db()
+    if interval == 60:
+        vechi = bare_rollup_1h(engine, schema, pair, de_la, primul)
+        # orele încă neagregate în prices_1h (rollup orar) → direct din tick-uri
+        ultim_rollup = int(vechi["time"].iloc[-1]) + 3600 if len(vechi) else de_la
+        if primul is None or ultim_rollup < primul:
+            vechi = pd.concat([vechi, bare_prices(engine, schema, pair, 60, ultim_rollup, primul)])
+    else:
+        vechi = bare_prices(engine, schema, pair, interval, de_la, primul)
+    if vechi.empty:
+        return 0
+    if primul is None:
+        total = adauga(pair, interval, vechi)
+    else:
+        total = rescrie(pair, interval, pd.concat([vechi, incarca_df(pair, interval).drop(columns="timestamp")])) \
+            - len(cols["time"])
+    print(f"[{datetime.now()}] 📥 {pair}/{interval}m: +{total} lumânări mai vechi din Postgres")
+    return total
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Depozit local de lumânări OHLC")
+    parser.add_argument("sursa", choices=["kraken", "prices", "istoric"],
+                        help="istoric = completează din Postgres lumânările mai vechi decât prima stocată")
+    parser.add_argument("pairs", nargs="+")
+    parser.add_argument("--interval", type=int, default=60)
+    parser.add_argument("--zile", type=int, default=182)
+    args = parser.parse_args()
+    for pair in args.pairs:
+        if args.sursa == "kraken":
+            ingereaza_kraken(pair, args.interval)
+        elif args.sursa == "prices":
+            ingereaza_prices(pair, args.interval)
+        else:
+            completeaza_istoric(pair, args.interval, args.zile)
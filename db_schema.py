@@ -0,0 +1,406 @@
+import os
+import re
+import time
+import threading
+from datetime import datetime, date, timedelta
+from sqlalchemy import create_engine, text, exc
+
+# Schema DB: prices/signals partiționate zilnic pe timestamp, indecși compuși,
+# rollup-uri OHLC (1m, 1h) și retenție pe partițiile brute.
+RAW_RETENTION_DAYS = int(os.getenv("RAW_RETENTION_DAYS", "14"))
+# retenția rollup-urilor (0 = păstrate nelimitat); prices_1h e istoricul din care
+# candle_store completează backtest-urile → implicit păstrat
+ROLLUP_RETENTION_DAYS = {
+    "prices_1m": int(os.getenv("ROLLUP_1M_RETENTION_DAYS", "90")),
+    "prices_1h": int(os.getenv("ROLLUP_1H_RETENTION_DAYS", "0")),
+}
+STERGERE_LOT       = 50000  # rânduri de rollup șterse per tranzacție
+LOCK_TIMEOUT_DDL   = "5s"   # DETACH așteaptă cel mult atât după lock, apoi încearcă la rularea următoare
+PARTITII_INAINTE   = 7      # zile de partiții create în avans
+RETENTIE_SEC       = 3600   # cât de des rulează rollup + retenție în bot
+
+# marcaj de versiune în {schema}.schema_version: dacă e la zi, pornirea sare peste DDL.
+# Se incrementează la orice schimbare din asigura_schema.
+SCHEMA_VERSION = 4
+
+# coloanele (în afară de id/timestamp) ale tabelelor partiționate
+TABELE_PARTITIONATE = {
+    "prices":  "symbol TEXT NOT NULL, price NUMERIC",
+    "signals": "symbol TEXT NOT NULL, signal TEXT NOT NULL, price NUMERIC, risk_score NUMERIC, volatility NUMERIC",
+}
+
+def versiune_schema(con, schema):
+    if con.execute(text("SELECT to_regclass(:t)"), {"t": f"{schema}.schema_version"}).scalar() is None:
+        return 0
+    return con.execute(text(f"SELECT COALESCE(MAX(versiune), 0) FROM {schema}.schema_version")).scalar()
+
+def asigura_schema(engine, schema):
+    with engine.begin() as con:
+        if versiune_schema(con, schema) >= SCHEMA_VERSION:
+            # schemă la zi: doar partițiile zilelor următoare (o interogare de catalog per tabel)
+            for tabel in TABELE_PARTITIONATE:
+                creeaza_partitii(con, schema, tabel)
+            return False
+
+    with engine.begin() as con:
+        # trader-ul și logger-ul pot porni simultan → o singură migrare odată
+        con.execute(text("SELECT pg_advisory_xact_lock(hashtext(:k))"), {"k": f"{schema}.schema"})
+        if versiune_schema(con, schema) >= SCHEMA_VERSION:
+            return False   # migrată între timp de celălalt proces
+        con.execute(text(f"CREATE SCHEMA IF NOT EXISTS {schema};"))
+        con.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {schema}.trades (
+                id SERIAL PRIMARY KEY,
+                timestamp TIMESTAMP NOT NULL,
+                symbol TEXT NOT NULL,
+                action TEXT NOT NULL,
+                quantity NUMERIC,
+                price NUMERIC,
+                profit_pct NUMERIC,
+                profit_eur NUMERIC,
+                status TEXT
+            )
+        """))
+        con.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {schema}.analysis (
+                id SERIAL PRIMARY KEY,
+                timestamp TIMESTAMP NOT NULL,
+                symbol TEXT NOT NULL,
+                buys INT,
+                sells INT,
+                avg_profit NUMERIC,
+                total_profit NUMERIC,
+                total_profit_eur NUMERIC
+            )
+        """))
+        # safety: coloane
+        con.execute(text(f"ALTER TABLE {schema}.trades   ADD COLUMN IF NOT EXISTS profit_eur NUMERIC;"))
+        con.execute(text(f"ALTER TABLE {schema}.analysis ADD COLUMN IF NOT EXISTS total_profit_eur NUMERIC;"))
+        con.execute(text(f"ALTER TABLE {schema}.trades   ADD COLUMN IF NOT EXISTS txid TEXT;"))
+        con.execute(text(f"ALTER TABLE {schema}.trades   ADD COLUMN IF NOT EXISTS fee NUMERIC;"))
+        con.execute(text(f"CREATE INDEX IF NOT EXISTS trades_symbol_ts_idx ON {schema}.trades (symbol, timestamp)"))
+        con.execute(text(f"CREATE INDEX IF NOT EXISTS trades_txid_idx ON {schema}.trades (txid)"))
+
+        for tabel, coloane in TABELE_PARTITIONATE.items():
+            _asigura_partitionat(con, schema, tabel, coloane)
+            # rândurile pentru care nu există (încă) o partiție zilnică nu mai eșuează la INSERT;
+            # creeaza_partitii le mută apoi în partiția zilei lor
+            con.execute(text(f"CREATE TABLE IF NOT EXISTS {schema}.{tabel}_default PARTITION OF {schema}.{tabel} DEFAULT"))
+            con.execute(text(f"CREATE INDEX IF NOT EXISTS {tabel}_symbol_ts_idx ON {schema}.{tabel} (symbol, timestamp DESC)"))
+            con.execute(text(f"CREATE INDEX IF NOT EXISTS {tabel}_ts_idx ON {schema}.{tabel} (timestamp DESC)"))
+            creeaza_partitii(con, schema, tabel)
+
+        for rollup in ("prices_1m", "prices_1h"):
+            con.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {schema}.{rollup} (
+                    symbol TEXT NOT NULL,
+                    bucket TIMESTAMP NOT NULL,
+                    open NUMERIC,
+                    high NUMERIC,
+                    low NUMERIC,
+                    close NUMERIC,
+                    count INT,
+                    PRIMARY KEY (symbol, bucket)
+                )
+            """))
+            con.execute(text(f"CREATE INDEX IF NOT EXISTS {rollup}_bucket_idx ON {schema}.{rollup} (bucket)"))
+
+        # watermark-ul rollup-ului per (tabel, simbol): botul scrie și el bare provizorii în
+        # prices_1m/prices_1h, deci MAX(bucket) din tabel nu mai spune până unde a agregat SQL-ul
+        con.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {schema}.rollup_watermark (
+                tabel TEXT NOT NULL,
+                symbol TEXT NOT NULL,
+                bucket TIMESTAMP NOT NULL,
+                PRIMARY KEY (tabel, symbol)
+            )
+        """))
+        for rollup in ("prices_1m", "prices_1h"):
+            con.execute(text(f"""
+                INSERT INTO {schema}.rollup_watermark (tabel, symbol, bucket)
+                SELECT '{rollup}', symbol, MAX(bucket) FROM {schema}.{rollup} GROUP BY symbol
+                ON CONFLICT DO NOTHING
+            """))
+
+        # snapshot-ul pozițiilor (un rând JSONB per fișier/shard): supraviețuiește deploy-urilor Heroku
+        con.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {schema}.position_snapshots (
+                cheie TEXT PRIMARY KEY,
+                salvat_la TIMESTAMP NOT NULL,
+                pozitii JSONB NOT NULL
+            )
+        """))
+
+        con.execute(text(f"""
+            CREATE TABLE IF NOT EXISTS {schema}.schema_version (
+                versiune INT PRIMARY KEY,
+                aplicat_la TIMESTAMP NOT NULL DEFAULT now()
+            )
+        """))
+        con.execute(text(f"INSERT INTO {schema}.schema_version (versiune) VALUES (:v) ON CONFLICT DO NOTHING"),
+                    {"v": SCHEMA_VERSION})
+    print(f"[{datetime.now()}] 🧱 Schema {schema} migrată la versiunea {SCHEMA_VERSION}")
+    return True
+
+def _relkind(con, schema, tabel):
+    return con.execute(text("""
+        SELECT c.relkind FROM pg_class c JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE n.nspname = :schema AND c.relname = :tabel
+    """), {"schema": schema, "tabel": tabel}).scalar()
+
+def _asigura_partitionat(con, schema, tabel, coloane):
+    relkind = _relkind(con, schema, tabel)
+    if relkind == "p":
+        return
+
+    con.execute(text(f"CREATE SEQUENCE IF NOT EXISTS {schema}.{tabel}_id_seq"))
+    if relkind == "r":
+        # tabelul vechi devine partiția "legacy"; PK-ul (id) e înlocuit la ATTACH de (id, timestamp)
+        con.execute(text(f"ALTER TABLE {schema}.{tabel} RENAME TO {tabel}_legacy"))
+        con.execute(text(f"ALTER TABLE {schema}.{tabel}_legacy DROP CONSTRAINT IF EXISTS {tabel}_pkey"))
+
+    # INTEGER (nu BIGINT) ca tipul coloanei să fie identic cu partiția legacy
+    con.execute(text(f"""
+        CREATE TABLE {schema}.{tabel} (
+            id INTEGER NOT NULL DEFAULT nextval('{schema}.{tabel}_id_seq'),
+            timestamp TIMESTAMP NOT NULL,
+            {coloane},
+            PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+    """))
+    con.execute(text(f"ALTER SEQUENCE {schema}.{tabel}_id_seq OWNED BY {schema}.{tabel}.id"))
+
+    if relkind == "r":
+        # toate rândurile existente sunt < mâine
+        maine = date.today() + timedelta(days=1)
+        con.execute(text(f"""
+            ALTER TABLE {schema}.{tabel} ATTACH PARTITION {schema}.{tabel}_legacy
+            FOR VALUES FROM (MINVALUE) TO ('{maine}')
+        """))
+    print(f"[{datetime.now()}] 🧱 {schema}.{tabel} partiționat pe zile")
+
+def partitii(con, schema, tabel):
+    # [(nume, de_la | None, pana_la)] din limitele declarate ale partițiilor (fără DEFAULT)
+    rows = con.execute(text("""
+        SELECT c.relname, pg_get_expr(c.relpartbound, c.oid)
+        FROM pg_inherits i
+        JOIN pg_class c ON c.oid = i.inhrelid
+        JOIN pg_class p ON p.oid = i.inhparent
+        JOIN pg_namespace n ON n.oid = p.relnamespace
+        WHERE n.nspname = :schema AND p.relname = :tabel
+    """), {"schema": schema, "tabel": tabel}).fetchall()
+    rezultat = []
+    for nume, limite in rows:
+        if limite == "DEFAULT":
+            continue
+        valori = re.findall(r"\('([^']+)'\)|\((MINVALUE|MAXVALUE)\)", limite)
+        de_la, pana_la = [v[0] or v[1] for v in valori[:2]]
+        rezultat.append((
+            nume,
+            None if de_la == "MINVALUE" else datetime.fromisoformat(de_la),
+            datetime.fromisoformat(pana_la),
+        ))
+    return rezultat
+
+def creeaza_partitii(con, schema, tabel, zile=PARTITII_INAINTE):
+    # apelată de fiecare proces care scrie (bot, coordonator, logger) → una singură odată
+    con.execute(text("SELECT pg_advisory_xact_lock(hashtext(:k))"), {"k": f"{schema}.{tabel}.partitii"})
+    existente = partitii(con, schema, tabel)
+    azi = datetime.combine(date.today(), datetime.min.time())
+    zile_noi = {azi + timedelta(days=d) for d in range(zile + 1)}
+
+    default = f"{tabel}_default"
+    are_default = _relkind(con, schema, default) is not None
+    if are_default:
+        # zilele rămase fără partiție (ex. proces oprit > PARTITII_INAINTE zile) → partiția lor
+        zile_noi |= {zi for (zi,) in con.execute(text(
+            f"SELECT DISTINCT date_trunc('day', timestamp) FROM {schema}.{default}"))}
+
+    for start in sorted(zile_noi):
+        stop = start + timedelta(days=1)
+        if any((de_la is None or de_la < stop) and start < pana_la for _, de_la, pana_la in existente):
+            continue
+        nume = f"{tabel}_p{start:%Y%m%d}"
+        limite = {"de_la": start, "pana_la": stop}
+        if are_default and con.execute(text(f"""
+                SELECT EXISTS (SELECT 1 FROM {schema}.{default} WHERE timestamp >= :de_la AND timestamp < :pana_la)
+                """), limite).scalar():
+            # rândurile zilei sunt în DEFAULT → mutate în tabelul nou, apoi atașat ca partiție
+            con.execute(text(f"CREATE TABLE {schema}.{nume} (LIKE {schema}.{tabel} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+            con.execute(text(f"""
+                WITH mutate AS (
+                    DELETE FROM {schema}.{default} WHERE timestamp >= :de_la AND timestamp < :pana_la RETURNING *
+                )
+                INSERT INTO {schema}.{nume} SELECT * FROM mutate
+            """), limite)
+            con.execute(text(f"""
+                ALTER TABLE {schema}.{tabel} ATTACH PARTITION {schema}.{nume}
+                FOR VALUES FROM ('{start}') TO ('{stop}')
+            """))
+            print(f"[{datetime.now()}] 🧱 {schema}.{nume}: rânduri mutate din partiția DEFAULT")
+        else:
+            con.execute(text(f"""
+                CREATE TABLE IF NOT EXISTS {schema}.{nume}
+                PARTITION OF {schema}.{tabel} FOR VALUES FROM ('{start}') TO ('{stop}')
+            """))
+        existente.append((nume, start, stop))
+
+# -------------------- ROLLUP + RETENȚIE --------------------
+def _ultimele_bucketuri(schema, tabel):
+    # CTE: ultimul bucket agregat per simbol (doar simbolurile active în ultima zi) + pragul minim,
+    # folosit ca limită constantă pentru pruning pe partițiile sursei
+    return f"""
+        ultim AS (
+            SELECT symbol, bucket FROM {schema}.rollup_watermark
+            WHERE tabel = '{tabel}' AND bucket >= LOCALTIMESTAMP - INTERVAL '1 day'
+        ),
+        prag AS (SELECT COALESCE(MIN(bucket), '-infinity'::timestamp) AS bucket FROM ultim)
+    """
+
+def _rollup(con, schema, tabel, agregare):
+    # agregare: SELECT (symbol, bucket, open, high, low, close, count) peste ultim/prag.
+    # Rândurile rollup-ului le înlocuiesc pe cele provizorii scrise de bot; watermark-ul avansează
+    # doar cu ce a agregat SQL-ul
+    con.execute(text(f"""
+        WITH {_ultimele_bucketuri(schema, tabel)},
+        agregat AS ({agregare}),
+        scrise AS (
+            INSERT INTO {schema}.{tabel} (symbol, bucket, open, high, low, close, count)
+            SELECT * FROM agregat
+            ON CONFLICT (symbol, bucket) DO UPDATE
+            SET open = EXCLUDED.open, high = EXCLUDED.high, low = EXCLUDED.low,
+                close = EXCLUDED.close, count = EXCLUDED.count
+        )
+        INSERT INTO {schema}.rollup_watermark (tabel, symbol, bucket)
+        SELECT '{tabel}', symbol, MAX(bucket) FROM agregat GROUP BY symbol
+        ON CONFLICT (tabel, symbol) DO UPDATE
+        SET bucket = GREATEST({schema}.rollup_watermark.bucket, EXCLUDED.bucket)
+    """))
+
+def ruleaza_rollup(con, schema):
+    # minute închise din prices → prices_1m. Watermark per simbol: un simbol rămas în urmă
+    # nu pierde minute din cauza altuia mai nou; ultimul bucket al fiecăruia e reluat
+    # (rândurile întârziate).
+    _rollup(con, schema, "prices_1m", f"""
+        SELECT p.symbol, date_trunc('minute', p.timestamp) AS bucket,
+               (array_agg(p.price ORDER BY p.timestamp))[1] AS open,
+               MAX(p.price) AS high, MIN(p.price) AS low,
+               (array_agg(p.price ORDER BY p.timestamp DESC))[1] AS close,
+               COUNT(*) AS count
+        FROM {schema}.prices p
+        LEFT JOIN ultim u ON u.symbol = p.symbol
+        WHERE p.timestamp >= (SELECT bucket FROM prag)
+          AND p.timestamp >= COALESCE(u.bucket, '-infinity'::timestamp)
+          AND p.timestamp < date_trunc('minute', LOCALTIMESTAMP)
+        GROUP BY p.symbol, 2
+    """)
+    # ore închise din prices_1m → prices_1h (același watermark per simbol)
+    _rollup(con, schema, "prices_1h", f"""
+        SELECT m.symbol, date_trunc('hour', m.bucket) AS bucket,
+               (array_agg(m.open ORDER BY m.bucket))[1] AS open,
+               MAX(m.high) AS high, MIN(m.low) AS low,
+               (array_agg(m.close ORDER BY m.bucket DESC))[1] AS close,
+               SUM(m.count) AS count
+        FROM {schema}.prices_1m m
+        LEFT JOIN ultim u ON u.symbol = m.symbol
+        WHERE m.bucket >= (SELECT bucket FROM prag)
+          AND m.bucket >= COALESCE(u.bucket, '-infinity'::timestamp)
+          AND m.bucket < date_trunc('hour', LOCALTIMESTAMP)
+        GROUP BY m.symbol, 2
+    """)
+
+def ruleaza_retentie(engine, schema, zile=RAW_RETENTION_DAYS):
+    # Tranzacții scurte, una per pas: DETACH/DROP iau ACCESS EXCLUSIVE pe tabelul părinte și,
+    # ținute cât durează rollup-ul, ar bloca INSERT-urile botului.
+    with engine.connect() as con:
+        # bot/coordonator și logger rulează toți mentenanța → un singur proces odată
+        # (lock de sesiune: rămâne peste commit-urile de mai jos)
+        if not con.execute(text("SELECT pg_try_advisory_lock(hashtext(:k))"),
+                           {"k": f"{schema}.retentie"}).scalar():
+            con.rollback()
+            return
+        con.commit()
+        try:
+            sterse = _ruleaza_retentie(con, schema, zile)
+        finally:
+            con.rollback()
+            con.execute(text("SELECT pg_advisory_unlock(hashtext(:k))"), {"k": f"{schema}.retentie"})
+            con.commit()
+    if sterse:
+        print(f"[{datetime.now()}] 🧹 Partiții șterse (> {zile} zile): {', '.join(sterse)}")
+
+def _ruleaza_retentie(con, schema, zile):
+    with con.begin():
+        ruleaza_rollup(con, schema)
+        # rollup-ul de mai sus a acoperit toate minutele închise, pentru fiecare simbol
+        rollup_pana_la = con.execute(text("SELECT date_trunc('minute', LOCALTIMESTAMP)")).scalar()
+    limita = datetime.combine(date.today() - timedelta(days=zile), datetime.min.time())
+
+    sterse = []
+    for tabel in TABELE_PARTITIONATE:
+        # întâi: mută eventualele rânduri din DEFAULT (ATTACH blochează și el tabelul)
+        _ddl_scurt(con, schema, tabel, lambda: creeaza_partitii(con, schema, tabel))
+        with con.begin():
+            de_sters = [nume for nume, _, pana_la in partitii(con, schema, tabel)
+                        # prices: doar partițiile deja acoperite de rollup
+                        if pana_la <= limita and not (tabel == "prices" and pana_la > rollup_pana_la)]
+        for nume in de_sters:
+            if _ddl_scurt(con, schema, nume, lambda: (
+                    con.execute(text(f"ALTER TABLE {schema}.{tabel} DETACH PARTITION {schema}.{nume}")),
+                    con.execute(text(f"DROP TABLE {schema}.{nume}")))):
+                sterse.append(nume)
+
+    for tabel, zile_rollup in ROLLUP_RETENTION_DAYS.items():
+        if zile_rollup > 0:
+            _curata_rollup(con, schema, tabel, datetime.now() - timedelta(days=zile_rollup))
+    return sterse
+
+def _ddl_scurt(con, schema, tabel, pas):
+    # pas DDL în tranzacția lui, cu lock_timeout: nu stă la coadă în spatele unei citiri lungi
+    # (iar INSERT-urile botului în spatele lui); la timeout rămâne pentru rularea următoare
+    try:
+        with con.begin():
+            con.execute(text(f"SET LOCAL lock_timeout = '{LOCK_TIMEOUT_DDL}'"))
+            pas()
+        return True
+    except exc.OperationalError as e:
+        print(f"[{datetime.now()}] ⚠️ {schema}.{tabel}: mentenanță amânată ({str(e.orig).strip()})")
+        return False
+
+def _curata_rollup(con, schema, tabel, limita):
+    # tabelele de rollup nu sunt partiționate → DELETE în loturi, fiecare în tranzacția lui
+    total = 0
+    while True:
+        with con.begin():
+            n = con.execute(text(f"""
+                DELETE FROM {schema}.{tabel} WHERE ctid IN (
+                    SELECT ctid FROM {schema}.{tabel} WHERE bucket < :limita LIMIT {STERGERE_LOT}
+                )
+            """), {"limita": limita}).rowcount
+        total += n
+        if n < STERGERE_LOT:
+            break
+    if total:
+        print(f"[{datetime.now()}] 🧹 {schema}.{tabel}: {total} rânduri mai vechi de {limita:%Y-%m-%d %H:%M} șterse")
+
+def porneste_retentie(engine, schema, interval_sec=RETENTIE_SEC):
+    def bucla():
+        while True:
+            try:
+                ruleaza_retentie(engine, schema)
+            except Exception as e:
+                print(f"[{datetime.now()}] ❌ Eroare retenție: {e}")
+            time.sleep(interval_sec)
+    t = threading.Thread(target=bucla, name="db-retentie", daemon=True)
+    t.start()
+    return t
+
+if __name__ == "__main__":
+    db_url = os.getenv("DATABASE_URL")
+    if db_url and db_url.startswith("postgres://"):
+        db_url = db_url.replace("postgres://", "postgresql://", 1)
+    schema = os.getenv("DB_SCHEMA", "public")
+    engine = create_engine(db_url)
+    asigura_schema(engine, schema)
+    ruleaza_retentie(engine, schema)
+    print(f"[{datetime.now()}] ✅ Schema + retenție OK în {schema}")
@@ -0,0 +1,234 @@
+import os
+import sys
+import time
+import queue
+import atexit
+import signal
+import threading
+from datetime import datetime
+import metrics
+
+# Coloanele scrise pentru fiecare tabel (ordinea din INSERT)
+COLOANE = {
+    "prices":  ["timestamp", "symbol", "price"],
+    "signals": ["timestamp", "symbol", "signal", "price", "risk_score", "volatility"],
+    "trades":  ["timestamp", "symbol", "action", "quantity", "price", "profit_pct", "profit_eur", "status",
+                "txid", "fee"],
+    "analysis": ["timestamp", "symbol", "buys", "sells", "avg_profit", "total_profit", "total_profit_eur"],
+    "position_snapshots": ["cheie", "salvat_la", "pozitii"],
+    "prices_1m": ["symbol", "bucket", "open", "high", "low", "close", "count"],
+    "prices_1h": ["symbol", "bucket", "open", "high", "low", "close", "count"],
+}
+
+# barele provizorii ale botului nu suprascriu un bucket deja agregat de rollup-ul SQL
+CONFLICTE = {
+    "prices_1m": "ON CONFLICT (symbol, bucket) DO NOTHING",
+    "prices_1h": "ON CONFLICT (symbol, bucket) DO NOTHING",
+}
+
+# INSERT ... ON CONFLICT (cheie) DO UPDATE — doar ultimul rând per cheie din batch e scris
+UPSERTURI = {
+    "position_snapshots": "cheie",
+}
+
+# Actualizări (UPDATE ... WHERE) — scrise după INSERT-urile din același batch
+ACTUALIZARI = {
+    "trades_fill": ("trades", ["quantity", "price", "fee", "profit_pct", "profit_eur", "status"], "txid"),
+}
+
+_STOP = object()
+_FLUSH = object()
+
+REINCERCARE_MAX_SEC = 60.0   # pauza maximă între reîncercările rândurilor urgente nescrise
+
+# Heroku oprește dyno-ul cu SIGTERM (deploy, restart, scale) și trimite SIGKILL după 30 s.
+# Coada e golită în cel mult atât; restul de grație rămâne pentru ieșirea procesului.
+OPRIRE_FLUSH_SEC = float(os.getenv("SHUTDOWN_FLUSH_SEC", "20"))
+
+def _tranzitorie(e):
+    # DB indisponibil / conexiune căzută → rândul poate reuși mai târziu (spre deosebire de un rând invalid)
+    from sqlalchemy import exc
+    return isinstance(e, (exc.OperationalError, exc.InterfaceError)) or getattr(e, "connection_invalidated", False)
+
+
+# Scrie rândurile în DB dintr-un thread separat, în batch-uri (executemany).
+# Flush la `max_batch` rânduri, la `flush_interval` secunde sau imediat pentru
+# rândurile urgente (trades). Bucla de trading doar pune în coadă, fără să aștepte:
+# rândurile obișnuite sunt limitate la `max_queue` (surplusul e ignorat), cele urgente nu.
+# Rândurile urgente au tranzacția lor; cele nescrise din cauza DB-ului sunt reîncercate.
+class DBWriter:
+    def __init__(self, engine, schema, max_batch=500, flush_interval=2.0, max_queue=20000):
+        self.engine = engine
+        self.schema = schema
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+        self.q = queue.Queue()
+        self.thread = None
+        self.dropped = 0
+        self.restante = []        # rânduri urgente de reîncercat (doar thread-ul writer-ului)
+        self._pauza = 0.0
+        self._reincearca_la = 0.0
+
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=self._run, name="db-writer", daemon=True)
+            self.thread.start()
+            atexit.register(self.stop)
+        return self
+
+    def put(self, table, row, urgent=False):
+        # tranzacțiile nu se pierd și nu blochează bucla: trec peste limita cozii
+        if urgent or self.q.qsize() < self.max_queue:
+            self.q.put_nowait((table, row, urgent))
+        else:
+            self.dropped += 1
+            metrics.incrementeaza("db_dropped", eticheta=table)
+            print(f"[{datetime.now()}] ⚠️ Coadă DB plină — rând {table} ignorat (total ignorate={self.dropped})")
+
+    def flush(self):
+        self.q.put(_FLUSH)
+
+    def stop(self, timeout=10.0):
+        if self.thread is None or not self.thread.is_alive():
+            return
+        self.q.put(_STOP)
+        self.thread.join(timeout)
+
+    def _run(self):
+        buffer = []
+        ultima = time.monotonic()
+        while True:
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - ultima))
+            try:
+                item = self.q.get(timeout=timeout)
+            except queue.Empty:
+                item = None
+
+            if item is _STOP:
+                # golim tot ce a rămas în coadă înainte de oprire
+                while True:
+                    try:
+                        rest = self.q.get_nowait()
+                    except queue.Empty:
+                        break
+                    if isinstance(rest, tuple):
+                        buffer.append(rest)
+                self._reincearca_la = 0.0   # ultima șansă pentru restanțe, fără pauză
+                self._scrie(buffer)
+                if self.restante:
+                    print(f"[{datetime.now()}] ❌ Oprire cu {len(self.restante)} rânduri urgente nescrise în DB")
+                return
+
+            urgent = False
+            if isinstance(item, tuple):
+                buffer.append(item)
+                urgent = item[2]
+
+            if (item is _FLUSH or urgent or len(buffer) >= self.max_batch
+                    or time.monotonic() - ultima >= self.flush_interval):
+                self._scrie(buffer)
+                buffer = []
+                ultima = time.monotonic()
+
+    def _scrie(self, buffer):
+        urgente = list(self.restante)
+        pe_tabel = {}
+        for item in buffer:
+            if item[2]:
+                urgente.append(item)
+            else:
+                pe_tabel.setdefault(item[0], []).append(item)
+        self.restante = []
+        if urgente and time.monotonic() < self._reincearca_la:
+            # în pauza de reîncercare: rândurile urgente noi așteaptă după restanțe (în ordine)
+            self.restante, urgente = urgente, []
+        if not urgente and not pe_tabel:
+            return
+
+        with metrics.cronometreaza("db_flush"):
+            if urgente:
+                self._scrie_urgente(urgente)
+            # fiecare tabel în tranzacția lui: un rând invalid nu pierde și celelalte tabele
+            for table, items in pe_tabel.items():
+                try:
+                    self._tranzactie(items)
+                except Exception as e:
+                    metrics.incrementeaza("erori", eticheta="db")
+                    print(f"[{datetime.now()}] ❌ Eroare flush DB {table} ({len(items)} rânduri): {e}")
+
+    def _scrie_urgente(self, items):
+        try:
+            self._tranzactie(items)
+            self._pauza = 0.0
+            return
+        except Exception as e:
+            eroare = e
+        metrics.incrementeaza("erori", eticheta="db")
+        if not _tranzitorie(eroare):
+            # un rând invalid strică tot lotul → rând cu rând, ca restul să ajungă în DB
+            print(f"[{datetime.now()}] ❌ Eroare flush DB (urgente, {len(items)} rânduri): {eroare} — scriu rând cu rând")
+            nescrise = []
+            for item in items:
+                try:
+                    self._tranzactie([item])
+                except Exception as e:
+                    if _tranzitorie(e):
+                        nescrise.append(item)
+                    else:
+                        metrics.incrementeaza("db_dropped", eticheta=item[0])
+                        print(f"[{datetime.now()}] ❌ Rând {item[0]} respins de DB, ignorat: {item[1]} ({e})")
+            if not nescrise:
+                return
+            items = nescrise
+        # DB indisponibil → păstrăm rândurile și reîncercăm cu pauză exponențială
+        self.restante = items + self.restante
+        self._pauza = min(REINCERCARE_MAX_SEC, max(self.flush_interval, self._pauza * 2))
+        self._reincearca_la = time.monotonic() + self._pauza
+        metrics.incrementeaza("db_retries", eticheta="urgente")
+        print(f"[{datetime.now()}] ⏳ {len(self.restante)} rânduri urgente nescrise — reîncerc în {self._pauza:.1f}s")
+
+    def _tranzactie(self, items):
+        from sqlalchemy import text
+        pe_tabel = {}
+        for table, row, _ in items:
+            pe_tabel.setdefault(table, []).append(row)
+        with self.engine.begin() as con:
+            # INSERT-urile înaintea UPDATE-urilor: un fill poate sosi în același batch cu rândul lui
+            for table, rows in sorted(pe_tabel.items(), key=lambda x: x[0] in ACTUALIZARI):
+                if table in ACTUALIZARI:
+                    tabel, cols, cheie = ACTUALIZARI[table]
+                    sql = (f"UPDATE {self.schema}.{tabel} SET {', '.join(f'{c} = :{c}' for c in cols)} "
+                           f"WHERE {cheie} = :{cheie}")
+                else:
+                    cols = COLOANE[table]
+                    sql = (f"INSERT INTO {self.schema}.{table} ({', '.join(cols)}) "
+                           f"VALUES ({', '.join(':' + c for c in cols)})")
+                    if table in CONFLICTE:
+                        sql += f" {CONFLICTE[table]}"
+                    if table in UPSERTURI:
+                        cheie = UPSERTURI[table]
+                        rows = list({r[cheie]: r for r in rows}.values())
+                        sql += (f" ON CONFLICT ({cheie}) DO UPDATE SET "
+                                + ", ".join(f"{c} = EXCLUDED.{c}" for c in cols if c != cheie))
+                con.execute(text(sql), rows)
+                metrics.incrementeaza("db_statements", eticheta=table)
+                metrics.incrementeaza("db_rows", len(rows), eticheta=table)
+
+
+def opreste_la_sigterm(writer_curent, inainte=None):
+    # atexit nu rulează la SIGTERM (și nici thread-ul daemon nu apucă să golească coada) →
+    # handler instalat din thread-ul principal al fiecărui punct de intrare.
+    # writer_curent: fn → DBWriter sau None (writer-ul e creat după instalare);
+    # inainte: rulată înaintea golirii (ex. ultimul snapshot de poziții)
+    def la_sigterm(semnal, cadru):
+        print(f"[{datetime.now()}] 🛑 SIGTERM — golesc coada DB (max {OPRIRE_FLUSH_SEC:.0f}s) și opresc")
+        try:
+            if inainte is not None:
+                inainte()
+        finally:
+            writer = writer_curent()
+            if writer is not None:
+                writer.stop(timeout=OPRIRE_FLUSH_SEC)
+            sys.exit(0)
+    signal.signal(signal.SIGTERM, la_sigterm)
@@ -1,6 +1,9 @@
 import os
+import argparse
+from datetime import datetime
+from decimal import Decimal
 import pandas as pd
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
 from dotenv import load_dotenv
 
 # încarcă variabilele din .env (Kraken + DB)
@@ -12,17 +15,101 @@ if db_url and db_url.startswith("postgres://"):
 
 DB_SCHEMA = os.getenv("DB_SCHEMA", "public")
 
+# export în bucăți: memoria e limitată la ~CHUNK_ROWS rânduri, indiferent de mărimea tabelului
+CHUNK_ROWS = int(os.getenv("EXPORT_CHUNK_ROWS", "50000"))
+COMPRESIE  = os.getenv("EXPORT_COMPRESSION", "zstd")
+
+# tip Python al coloanei SQL → dtype pandas stabil (aceeași schemă Parquet în fiecare bucată,
+# chiar dacă o bucată are doar NULL pe o coloană)
+DTYPE = {int: "Int64", float: "float64", Decimal: "float64", datetime: "datetime64[ns]",
+         bool: "boolean", str: "string"}
+
 engine = create_engine(db_url)
 
-def export_table(table_name, file_name):
+# -------------------- CITIRE ÎN BUCĂȚI --------------------
+def tipuri_coloane(engine, table_name):
+    tipuri = {}
+    for col in inspect(engine).get_columns(table_name, schema=DB_SCHEMA):
+        try:
+            tip = col["type"].python_type
+        except NotImplementedError:
+            tip = str
+        tipuri[col["name"]] = DTYPE.get(tip, "string")
+    return tipuri
+
+def tipizeaza(df, tipuri):
+    for col, tip in tipuri.items():
+        if col in df:
+            df[col] = pd.to_numeric(df[col]).astype(tip) if tip in ("Int64", "float64") else df[col].astype(tip)
+    return df
+
+def cadru_gol(tipuri):
+    return pd.DataFrame({col: pd.Series(dtype=tip) for col, tip in tipuri.items()})
+
+def citeste_bucati(engine, table_name, chunksize=CHUNK_ROWS):
+    # cursor server-side (stream_results): rândurile vin în ordinea timestamp, câte o bucată;
+    # produce cel puțin o bucată (goală, dar cu coloanele tabelului)
+    tipuri = tipuri_coloane(engine, table_name)
+    q = text(f"SELECT * FROM {DB_SCHEMA}.{table_name} ORDER BY timestamp")
+    gol = True
+    with engine.connect().execution_options(stream_results=True, max_row_buffer=chunksize) as conn:
+        for df in pd.read_sql(q, conn, chunksize=chunksize):
+            gol = False
+            yield tipizeaza(df, tipuri)
+    if gol:
+        yield cadru_gol(tipuri)
+
+# -------------------- SCRIERE ÎN BUCĂȚI --------------------
+class ScriitorBucati:
+    # .parquet → Parquet comprimat (un row group per bucată); altfel CSV în mod append
+    def __init__(self, file_name, compresie=COMPRESIE):
+        self.file_name = file_name
+        self.compresie = compresie
+        self.parquet = file_name.endswith(".parquet")
+        self.writer = None
+        self.randuri = 0
+        if self.parquet:
+            try:
+                import pyarrow  # noqa: F401 — dependență opțională, doar pentru export Parquet
+            except ImportError:
+                raise RuntimeError("pyarrow lipsește (pip install pyarrow) — folosește --format csv")
+
+    def scrie(self, df):
+        if self.parquet:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            tabel = pa.Table.from_pandas(df, preserve_index=False)
+            if self.writer is None:
+                self.writer = pq.ParquetWriter(self.file_name, tabel.schema, compression=self.compresie)
+            else:
+                tabel = tabel.cast(self.writer.schema)
+            self.writer.write_table(tabel)
+        else:
+            df.to_csv(self.file_name, mode="a" if self.randuri else "w", header=not self.randuri, index=False)
+        self.randuri += len(df)
+
+    def inchide(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+def export_table(table_name, file_name, chunksize=CHUNK_ROWS):
     try:
-        df = pd.read_sql(f"SELECT * FROM {DB_SCHEMA}.{table_name} ORDER BY timestamp", engine)
-        df.to_csv(file_name, index=False)
-        print(f"✅ {table_name} exportat în {file_name} ({len(df)} rânduri)")
+        scriitor = ScriitorBucati(file_name)
+        try:
+            for df in citeste_bucati(engine, table_name, chunksize):
+                scriitor.scrie(df)
+        finally:
+            scriitor.inchide()
+        print(f"✅ {table_name} exportat în {file_name} ({scriitor.randuri} rânduri)")
     except Exception as e:
         print(f"❌ Eroare export {table_name}: {e}")
 
 if __name__ == "__main__":
-    export_table("signals", "signals.csv")
-    export_table("trades", "trades.csv")
-    export_table("prices", "prices.csv")
+    parser = argparse.ArgumentParser(description="Export tabele bot (signals, trades, prices)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--chunk", type=int, default=CHUNK_ROWS, help="rânduri per bucată")
+    args = parser.parse_args()
+
+    for tabel in ("signals", "trades", "prices"):
+        export_table(tabel, f"{tabel}.{args.format}", args.chunk)
@@ -1,8 +1,11 @@
 import os
+import argparse
 import pandas as pd
 from sqlalchemy import create_engine
 from dotenv import load_dotenv
 
+from export_ai_data import CHUNK_ROWS, citeste_bucati, ScriitorBucati
+
 # încarcă variabilele din .env (Kraken + DB)
 load_dotenv()
 
@@ -14,46 +17,72 @@ DB_SCHEMA = os.getenv("DB_SCHEMA", "public")
 engine = create_engine(db_url)
 
 def load_table(table_name):
+    # tot tabelul în memorie — pentru analize ad-hoc; exportul folosește citeste_bucati
     return pd.read_sql(
         f"SELECT * FROM {DB_SCHEMA}.{table_name} ORDER BY timestamp",
         engine
     )
 
+def _lipeste(a, b):
+    # concat fără cadre goale (păstrează dtype-urile)
+    if a.empty:
+        return b
+    if b.empty:
+        return a
+    return pd.concat([a, b], ignore_index=True)
+
+
+# merge_asof(backward, by=symbol) pe bucăți din stânga, cu dreapta citită tot în bucăți.
+# Starea dintre bucăți: ultimul rând din dreapta per simbol (poate potrivi rânduri din
+# bucățile următoare) + rândurile din dreapta citite deja, dar mai noi decât bucata curentă.
+class AsOfIncremental:
+    def __init__(self, bucati_dreapta, suffixes):
+        self.bucati = iter(bucati_dreapta)
+        self.suffixes = suffixes
+        self.tampon = next(self.bucati)
+        self.ultimele = self.tampon.iloc[0:0]
+        self.epuizat = False
+
+    def aplica(self, stanga):
+        if not stanga.empty:
+            t_max = stanga["timestamp"].iloc[-1]
+            while not self.epuizat and (self.tampon.empty or self.tampon["timestamp"].iloc[-1] <= t_max):
+                try:
+                    self.tampon = _lipeste(self.tampon, next(self.bucati))
+                except StopIteration:
+                    self.epuizat = True
+            n = int(self.tampon["timestamp"].searchsorted(t_max, side="right"))
+            dreapta = _lipeste(self.ultimele, self.tampon.iloc[:n])
+            self.tampon = self.tampon.iloc[n:].reset_index(drop=True)
+            self.ultimele = dreapta.groupby("symbol", sort=False).tail(1)
+        else:
+            dreapta = self.ultimele
+        return pd.merge_asof(stanga, dreapta, on="timestamp", by="symbol",
+                             direction="backward", suffixes=self.suffixes)
+
+def exporta_dataset(output_file, chunksize=CHUNK_ROWS):
+    # prices ← signals (cel mai apropiat timestamp anterior, per simbol) ← trades
+    semnale = AsOfIncremental(citeste_bucati(engine, "signals", chunksize), ("_price", "_signal"))
+    tranzactii = AsOfIncremental(citeste_bucati(engine, "trades", chunksize), ("", "_trade"))
+    scriitor = ScriitorBucati(output_file)
+    try:
+        for bucata in citeste_bucati(engine, "prices", chunksize):
+            scriitor.scrie(tranzactii.aplica(semnale.aplica(bucata)))
+    finally:
+        scriitor.inchide()
+    return scriitor.randuri
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Dataset AI: prices + signals + trades (merge as-of)")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv")
+    parser.add_argument("--chunk", type=int, default=CHUNK_ROWS, help="rânduri per bucată")
+    args = parser.parse_args()
+
     try:
-        print("📥 Citim datele din Postgres...")
-        df_prices = load_table("prices")
-        df_signals = load_table("signals")
-        df_trades = load_table("trades")
-
-        print(f"✅ prices: {len(df_prices)} rânduri")
-        print(f"✅ signals: {len(df_signals)} rânduri")
-        print(f"✅ trades: {len(df_trades)} rânduri")
-
-        # merge signals cu prices (pe symbol + cel mai apropiat timestamp)
-        df = pd.merge_asof(
-            df_prices.sort_values("timestamp"),
-            df_signals.sort_values("timestamp"),
-            on="timestamp",
-            by="symbol",
-            direction="backward",
-            suffixes=("_price", "_signal")
-        )
-
-        # adaugăm și trades (pe symbol + timestamp apropiat)
-        df = pd.merge_asof(
-            df.sort_values("timestamp"),
-            df_trades.sort_values("timestamp"),
-            on="timestamp",
-            by="symbol",
-            direction="backward",
-            suffixes=("", "_trade")
-        )
-
-        # salvăm dataset final
-        output_file = "ai_dataset.csv"
-        df.to_csv(output_file, index=False)
-        print(f"📊 Dataset AI exportat în {output_file} ({len(df)} rânduri)")
+        output_file = f"ai_dataset.{args.format}"
+        print("📥 Citim datele din Postgres în bucăți...")
+        randuri = exporta_dataset(output_file, args.chunk)
+        print(f"📊 Dataset AI exportat în {output_file} ({randuri} rânduri)")
 
     except Exception as e:
         print(f"❌ Eroare la export: {e}")
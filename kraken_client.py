@@ -1,55 +1,397 @@
-import krakenex
-from pykrakenapi import KrakenAPI
 import os
+import time
+import heapq
+import random
+import itertools
+import threading
+from concurrent.futures import Future
 from datetime import datetime
+import requests
+from requests.adapters import HTTPAdapter
+import metrics
 
-# Cheile API sunt luate din environment variables
+# Cheile API sunt luate din environment variables — cerute abia la primul apel privat
 api_key = os.getenv("KRAKEN_API_KEY")
 api_secret = os.getenv("KRAKEN_API_SECRET")
 
-if not api_key or not api_secret:
-    raise ValueError("❌ Lipsesc cheile KRAKEN_API_KEY și KRAKEN_API_SECRET!")
 
-api = krakenex.API(key=api_key, secret=api_secret)
-k = KrakenAPI(api)
+class KrakenAPIError(Exception):
+    pass
+
+# -------------------- PLANIFICATOR (rate limit Kraken) --------------------
+# Contorul privat Kraken: plafon + scădere/secundă, pe tier. Publicele: ~1 req/s per IP.
+KRAKEN_TIER       = os.getenv("KRAKEN_TIER", "Starter")
+LIMITE_PRIVATE    = {"Starter": (15, 0.33), "Intermediate": (20, 0.5), "Pro": (20, 1.0)}
+KRAKEN_PUBLIC_RPS = float(os.getenv("KRAKEN_PUBLIC_RPS", "1.0"))
+KRAKEN_POOL       = int(os.getenv("KRAKEN_POOL", "32"))      # conexiuni keep-alive (≥ ASYNC_WORKERS)
+KRAKEN_TIMEOUT    = float(os.getenv("KRAKEN_TIMEOUT", "15"))
+MAX_INCERCARI     = 5
+BACKOFF_BAZA      = 1.0    # s; backoff exponențial cu jitter complet
+BACKOFF_MAX       = 30.0
+
+# priorități (mic = primul): ordinele trec înaintea contului, contul înaintea datelor de piață
+PRIORITATE_ORDIN, PRIORITATE_CONT, PRIORITATE_DATE = 0, 1, 2
+
+ERORI_THROTTLE = ("EAPI:Rate limit exceeded", "EOrder:Rate limit exceeded", "EGeneral:Too many requests",
+                  "EService:Unavailable", "EService:Busy", "EGeneral:Temporary lockout")
+
+
+class TokenBucket:
+    # găleată de jetoane cu coadă de așteptare pe priorități (FIFO la aceeași prioritate)
+    def __init__(self, capacitate, rata):
+        self.capacitate = float(capacitate)
+        self.rata = float(rata)
+        self.jetoane = float(capacitate)
+        self.ultima = time.monotonic()
+        self._cond = threading.Condition()
+        self._coada = []
+        self._secv = itertools.count()
+
+    def _reumple(self):
+        acum = time.monotonic()
+        self.jetoane = min(self.capacitate, self.jetoane + (acum - self.ultima) * self.rata)
+        self.ultima = acum
+
+    def ia(self, cost=1.0, prioritate=PRIORITATE_DATE):
+        with self._cond:
+            bilet = (prioritate, next(self._secv))
+            heapq.heappush(self._coada, bilet)
+            try:
+                while True:
+                    self._reumple()
+                    primul = self._coada[0] == bilet
+                    # cost 0 (ordinele) nu consumă contorul, dar respectă ordinea priorităților
+                    if primul and (cost == 0 or self.jetoane >= cost):
+                        heapq.heappop(self._coada)
+                        self.jetoane -= cost
+                        self._cond.notify_all()
+                        return
+                    asteptare = (cost - self.jetoane) / self.rata if primul else 1.0
+                    self._cond.wait(max(0.01, asteptare))
+            except BaseException:
+                if bilet in self._coada:
+                    self._coada.remove(bilet)
+                    heapq.heapify(self._coada)
+                    self._cond.notify_all()
+                raise
+
+    def penalizeaza(self, secunde):
+        # după un throttle de la Kraken: golim găleata pentru încă `secunde`
+        with self._cond:
+            self._reumple()
+            self.jetoane = min(self.jetoane, 0.0) - secunde * self.rata
+
+
+_cap, _rata = LIMITE_PRIVATE.get(KRAKEN_TIER, LIMITE_PRIVATE["Starter"])
+galeata_privata = TokenBucket(_cap, _rata)
+galeata_publica = TokenBucket(max(1.0, KRAKEN_PUBLIC_RPS), KRAKEN_PUBLIC_RPS)
+
+def _e_throttle(e):
+    if isinstance(e, requests.HTTPError) and e.response is not None:
+        return e.response.status_code in (429, 502, 503, 504)
+    return any(cod in str(e) for cod in ERORI_THROTTLE)
+
+# AddOrder: doar un refuz explicit de rate limit garantează că ordinul nu a ajuns în matching engine.
+# Un 5xx (inclusiv 502/503 Cloudflare) sau un timeout poate sosi după plasare → fără reîncercare.
+ERORI_ORDIN_REFUZAT = ("EAPI:Rate limit exceeded", "EOrder:Rate limit exceeded")
+
+def _e_ordin_refuzat(e):
+    return isinstance(e, KrakenAPIError) and any(cod in str(e) for cod in ERORI_ORDIN_REFUZAT)
+
+def _e_tranzitorie(e):
+    return _e_throttle(e) or isinstance(e, (requests.ConnectionError, requests.Timeout))
+
+def _planifica(endpoint, fn, galeata, cost=1.0, prioritate=PRIORITATE_DATE, reincearca=_e_tranzitorie):
+    for incercare in range(MAX_INCERCARI):
+        galeata.ia(cost, prioritate)
+        metrics.incrementeaza("api_calls", eticheta=endpoint)
+        try:
+            return fn()
+        except Exception as e:
+            if incercare == MAX_INCERCARI - 1 or not reincearca(e):
+                raise
+            pauza = random.uniform(0, min(BACKOFF_MAX, BACKOFF_BAZA * 2 ** incercare))
+            if _e_throttle(e):
+                galeata.penalizeaza(pauza)
+                metrics.incrementeaza("api_throttled", eticheta=endpoint)
+            metrics.incrementeaza("api_retries", eticheta=endpoint)
+            print(f"[{datetime.now()}] ⏳ {endpoint}: {e} — reîncerc în {pauza:.1f}s ({incercare + 1}/{MAX_INCERCARI})")
+            time.sleep(pauza)
+
+# cereri identice aflate deja în zbor → un singur request, rezultat partajat
+_in_zbor = {}
+_lacat_zbor = threading.Lock()
+
+def _coalescat(cheie, fn):
+    with _lacat_zbor:
+        viitor = _in_zbor.get(cheie)
+        proprietar = viitor is None
+        if proprietar:
+            viitor = _in_zbor[cheie] = Future()
+    if not proprietar:
+        metrics.incrementeaza("api_coalesced", eticheta=cheie[0])
+        return viitor.result()
+    try:
+        rezultat = fn()
+        viitor.set_result(rezultat)
+        return rezultat
+    except BaseException as e:
+        viitor.set_exception(e)
+        raise
+    finally:
+        with _lacat_zbor:
+            _in_zbor.pop(cheie, None)
+
+# -------------------- CLIENT --------------------
+# construit la primul apel, nu la import; endpoint-urile publice (Ticker, OHLC) merg și fără chei.
+# Doar krakenex (HTTP + semnătură): pykrakenapi are propriul limitator de apeluri publice
+# (≥1 s între apeluri, CallRateLimitError imediat), care s-ar bate cap în cap cu planificatorul.
+_k = None
+_lacat_client = threading.Lock()
+
+def kraken(privat=False):
+    global _k
+    if privat and (not api_key or not api_secret):
+        raise ValueError("❌ Lipsesc cheile KRAKEN_API_KEY și KRAKEN_API_SECRET!")
+    with _lacat_client:
+        if _k is None:
+            import krakenex
+            _k = krakenex.API(key=api_key or "", secret=api_secret or "")
+            # keep-alive: un pool de conexiuni refolosit de toate thread-urile
+            _k.session.mount("https://", HTTPAdapter(pool_connections=2, pool_maxsize=KRAKEN_POOL))
+            _k._nonce = _nonce
+    return _k
+
+def _rezultat(raspuns):
+    if raspuns.get("error"):
+        raise KrakenAPIError(raspuns["error"])
+    return raspuns["result"]
+
+def _public(metoda, date):
+    return _rezultat(kraken().query_public(metoda, date, timeout=KRAKEN_TIMEOUT))
+
+def _privat_api(metoda, date=None):
+    return _rezultat(kraken(privat=True).query_private(metoda, date, timeout=KRAKEN_TIMEOUT))
+
+# nonce strict crescător: apelurile private din thread-uri diferite pot cădea în aceeași ms
+_nonce_ultim = 0
+_lacat_privat = threading.Lock()
+
+def _nonce():
+    global _nonce_ultim
+    _nonce_ultim = max(_nonce_ultim + 1, int(time.time() * 1000))
+    return _nonce_ultim
+
+def _privat(fn):
+    # nonce-urile trebuie să ajungă în ordine → apelurile private sunt serializate
+    def apel():
+        with _lacat_privat:
+            return fn()
+    return apel
 
 def get_price(pair='XXBTZEUR'):
+    return get_prices([pair])[pair]
+
+def get_prices(pairs):
+    # ⚡ un singur request Ticker pentru toate perechile → {pair: last_price}
+    pairs = list(pairs)
+    if not pairs:
+        return {}
+    try:
+        cerere = ",".join(pairs)
+        with metrics.cronometreaza("api_ticker"):
+            data = _coalescat(("Ticker", cerere), lambda: _planifica(
+                "Ticker", lambda: _public("Ticker", {"pair": cerere}), galeata_publica))
+        preturi = {}
+        for pair in pairs:
+            if pair in data:
+                preturi[pair] = float(data[pair]["c"][0])
+        return preturi
+    except Exception as e:
+        metrics.incrementeaza("erori", eticheta="Ticker")
+        raise RuntimeError(f"[get_prices] Eroare: {e}")
+
+COLOANE_OHLC = ["time", "open", "high", "low", "close", "vwap", "volume", "count"]
+
+def _ohlc_df(rezultat):
+    # (df crescător indexat pe dtime, cursor `last`) — același format ca pykrakenapi.get_ohlc_data
+    import pandas as pd
+    randuri = next((v for k, v in rezultat.items() if k != "last"), [])
+    df = pd.DataFrame(randuri, columns=COLOANE_OHLC)
+    df = df.astype({"time": "int64", "open": float, "high": float, "low": float, "close": float,
+                    "vwap": float, "volume": float, "count": "int64"})
+    df.index = pd.to_datetime(df["time"], unit="s")
+    df.index.name = "dtime"
+    return df.sort_index(), rezultat["last"]
+
+def get_ohlc(pair, interval=60, since=None):
+    date = {"pair": pair, "interval": interval}
+    if since is not None:
+        date["since"] = since
     try:
-        data = k.get_ticker_information(pair)
-        # "c" = [last_trade_price, lot_volume]
-        pret = data["c"].iloc[0][0]
-        return float(pret)
+        with metrics.cronometreaza("api_ohlc"):
+            return _ohlc_df(_coalescat(("OHLC", pair, interval, since), lambda: _planifica(
+                "OHLC", lambda: _public("OHLC", date), galeata_publica)))
     except Exception as e:
-        raise RuntimeError(f"[get_price] Eroare: {e}")
+        metrics.incrementeaza("erori", eticheta="OHLC")
+        raise RuntimeError(f"[get_ohlc] Eroare: {e}")
 
 def get_balance():
     try:
-        balances = k.get_account_balance()
-        return balances["vol"].to_dict()
+        with metrics.cronometreaza("api_balance"):
+            balances = _coalescat(("Balance",), lambda: _planifica(
+                "Balance", _privat(lambda: _privat_api("Balance")), galeata_privata, prioritate=PRIORITATE_CONT))
+        return {activ: float(vol) for activ, vol in balances.items()}
     except Exception as e:
+        metrics.incrementeaza("erori", eticheta="Balance")
         raise RuntimeError(f"[get_balance] Eroare: {e}")
 
+def query_orders(txids):
+    # {txid: {"status", "vol", "pret", "cost", "fee", "inchis_la"}} — un singur QueryOrders pentru tot lotul
+    txids = list(txids)
+    if not txids:
+        return {}
+
+    def interogheaza():
+        return _privat_api("QueryOrders", {"txid": ",".join(txids)})
+
+    try:
+        with metrics.cronometreaza("api_query_orders"):
+            rezultat = _planifica("QueryOrders", _privat(interogheaza), galeata_privata,
+                                  prioritate=PRIORITATE_CONT)
+    except Exception as e:
+        metrics.incrementeaza("erori", eticheta="QueryOrders")
+        raise RuntimeError(f"[query_orders] Eroare: {e}")
+
+    ordine = {}
+    for txid, o in rezultat.items():
+        vol = float(o.get("vol_exec", 0.0))
+        cost = float(o.get("cost", 0.0))
+        ordine[txid] = {
+            "status": o.get("status"),
+            "vol": vol,
+            "pret": float(o.get("price") or 0.0) or (cost / vol if vol > 0 else 0.0),
+            "cost": cost,
+            "fee": float(o.get("fee", 0.0)),
+            "inchis_la": float(o.get("closetm") or 0.0) or None,   # epoch, momentul execuției
+        }
+    return ordine
+
+# -------------------- SOLD (cache) --------------------
+BALANCE_RECONCILE_SEC = float(os.getenv("BALANCE_RECONCILE_SEC", "120"))
+REZERVARE_TTL_SEC     = 30    # rezervare EUR neconsumată de un ordin → eliberată automat
+
+# Soldul se schimbă doar prin ordinele noastre (aplicate imediat în cache) sau prin
+# depuneri/retrageri externe → Balance doar la reconcilierea periodică sau după un ordin eșuat.
+class SoldCache:
+    def __init__(self, sursa=None, reconciliere_sec=BALANCE_RECONCILE_SEC):
+        self.sursa = sursa or get_balance
+        self.reconciliere_sec = reconciliere_sec
+        self._sold = None
+        self._la = 0.0
+        self._invalid = True
+        self._reconciliat_la = 0.0   # epoch la care a plecat ultimul Balance (include execuțiile dinainte)
+        self._rezervari = {}   # cheie (simbol) → (eur, monotonic)
+        self._lacat = threading.Lock()
+
+    def get(self, fortat=False):
+        with self._lacat:
+            if fortat or self._invalid or time.monotonic() - self._la >= self.reconciliere_sec:
+                self._reconciliaza()
+            else:
+                metrics.incrementeaza("balance_cache_hits")
+            return dict(self._sold)
+
+    def _reconciliaza(self):
+        inceput = time.time()
+        nou = {a: float(v) for a, v in self.sursa().items()}
+        if self._sold is not None:
+            for activ in set(nou) | set(self._sold):
+                delta = nou.get(activ, 0.0) - self._sold.get(activ, 0.0)
+                if abs(delta) > 1e-8 * max(1.0, abs(nou.get(activ, 0.0))):
+                    metrics.incrementeaza("balance_drift", eticheta=activ)
+                    print(f"[{datetime.now()}] 🔁 Reconciliere sold {activ}: {self._sold.get(activ, 0.0):.8f} → {nou.get(activ, 0.0):.8f}")
+        self._sold = nou
+        self._la = time.monotonic()
+        self._reconciliat_la = inceput
+        self._invalid = False
+
+    def rezerva(self, cheie, eur):
+        # verificare + rezervare atomică a EUR pentru un BUY; cu mai mulți consumatori pe același
+        # sold (shard-uri) nimeni nu poate cheltui EUR deja promiși altui ordin
+        with self._lacat:
+            if self._sold is None or self._invalid:
+                self._reconciliaza()
+            t = time.monotonic()
+            self._rezervari = {k: r for k, r in self._rezervari.items()
+                               if k != cheie and t - r[1] < REZERVARE_TTL_SEC}
+            liber = self._sold.get("ZEUR", 0.0) - sum(r[0] for r in self._rezervari.values())
+            if liber < float(eur) * 0.99:
+                metrics.incrementeaza("rezervari_refuzate", eticheta=cheie)
+                return False
+            self._rezervari[cheie] = (float(eur), t)
+            return True
+
+    def aplica_ordin(self, side, volume, activ, pret, fee_rate, cheie=None):
+        # estimare din ordinul nostru: EUR ± valoare ∓ comision, activul de bază ± volum
+        with self._lacat:
+            self._rezervari.pop(cheie, None)   # rezervarea devine cheltuială efectivă
+            if self._sold is None:
+                return
+            valoare = float(volume) * float(pret)
+            semn = 1.0 if side == "buy" else -1.0
+            self._sold["ZEUR"] = self._sold.get("ZEUR", 0.0) - semn * valoare - valoare * fee_rate
+            self._sold[activ] = self._sold.get(activ, 0.0) + semn * float(volume)
+
+    def ajusteaza(self, activ, delta, executat_la=None):
+        # corecție după execuția reală (diferența față de estimarea din aplica_ordin).
+        # Un Balance cerut după execuție (executat_la, epoch) conține deja sumele reale
+        # → corecția ar fi numărată de două ori
+        with self._lacat:
+            if self._sold is None:
+                return
+            if executat_la is not None and executat_la <= self._reconciliat_la:
+                metrics.incrementeaza("balance_ajustari_sarite", eticheta=activ)
+                return
+            self._sold[activ] = self._sold.get(activ, 0.0) + float(delta)
+
+    def invalideaza(self):
+        # stare necunoscută (ordin eșuat/timeout) → următorul get() întreabă exchange-ul
+        with self._lacat:
+            self._invalid = True
+
 def place_market_order(side="buy", volume=0.001, pair="XXBTZEUR"):
     try:
         # Precizie corectă pentru Kraken (max 8 zecimale)
         volume_str = f"{volume:.8f}"
 
-        response = api.query_private("AddOrder", {
-            "pair": pair,
-            "type": side,
-            "ordertype": "market",
-            "volume": volume_str
-        })
+        def trimite():
+            response = kraken(privat=True).query_private("AddOrder", {
+                "pair": pair,
+                "type": side,
+                "ordertype": "market",
+                "volume": volume_str
+            }, timeout=KRAKEN_TIMEOUT)
+            if response.get("error"):
+                raise KrakenAPIError(response["error"])
+            return response
+
+        # AddOrder nu consumă contorul REST; se reîncearcă doar la rate limit explicit (ordin respins),
+        # niciodată la HTTP 5xx/timeout/conexiune — ordinul poate fi fost deja plasat
+        try:
+            with metrics.cronometreaza("ordin", pair):
+                response = _planifica("AddOrder", _privat(trimite), galeata_privata, cost=0,
+                                      prioritate=PRIORITATE_ORDIN, reincearca=_e_ordin_refuzat)
+        except KrakenAPIError as e:
+            print(f"[{datetime.now()}] ❌ Kraken order error: {e}")
+            raise RuntimeError(f"[place_market_order] Eroare Kraken: {e}")
 
         # Log prietenos
-        if response.get("error"):
-            print(f"[{datetime.now()}] ❌ Kraken order error: {response['error']}")
-            raise RuntimeError(f"[place_market_order] Eroare Kraken: {response['error']}")
-        else:
-            descr = response.get("result", {}).get("descr", {}).get("order", "")
-            txid = response.get("result", {}).get("txid", [""])[0]
-            print(f"[{datetime.now()}] ✅ ORDIN EXECUTAT: {descr} | TXID={txid}")
+        descr = response.get("result", {}).get("descr", {}).get("order", "")
+        txid = response.get("result", {}).get("txid", [""])[0]
+        print(f"[{datetime.now()}] ✅ ORDIN EXECUTAT: {descr} | TXID={txid}")
 
         return response
     except Exception as e:
+        metrics.incrementeaza("erori", eticheta="AddOrder")
         raise RuntimeError(f"[place_market_order] Eroare: {e}")
@@ -0,0 +1,165 @@
+import os
+import json
+import time
+import random
+import asyncio
+import threading
+from datetime import datetime, timezone
+
+# Feed WebSocket Kraken (v2): ticker + OHLC push, în loc de polling REST
+KRAKEN_WS_URL = os.getenv("KRAKEN_WS_URL", "wss://ws.kraken.com/v2")
+
+# Perechi REST → simboluri WS v2
+WS_SYMBOL = {"XXBTZEUR": "BTC/EUR", "XETHZEUR": "ETH/EUR"}
+
+def ws_symbol(pair):
+    if pair in WS_SYMBOL:
+        return WS_SYMBOL[pair]
+    baza = pair[:-4] if pair.endswith("ZEUR") else pair[:-3]
+    if len(baza) == 4 and baza[0] in "XZ":
+        baza = baza[1:]
+    return f"{baza}/EUR"
+
+
+class KrakenFeed:
+    def __init__(self, pairs, interval=60, url=None, on_price=None, on_candle=None):
+        self.pairs = list(pairs)
+        self.interval = interval
+        self.url = url or KRAKEN_WS_URL
+        self.on_price = on_price
+        self.on_candle = on_candle
+        self.la_pair = {ws_symbol(p): p for p in self.pairs}
+        self.preturi = {}   # pair -> (preț, time.time() la recepție)
+        self.conectat = threading.Event()
+        self._stop = threading.Event()
+        self.thread = None
+
+    # -------------------- API (thread-safe, citiri din starea locală) --------------------
+    def start(self):
+        if self.thread is None:
+            self.thread = threading.Thread(target=lambda: asyncio.run(self._run()),
+                                           name="kraken-ws", daemon=True)
+            self.thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+
+    def get_price(self, pair, max_age=30.0):
+        v = self.preturi.get(pair)
+        if v is None or time.time() - v[1] > max_age:
+            return None
+        return v[0]
+
+    def get_prices(self, pairs, max_age=30.0):
+        preturi = {}
+        for pair in pairs:
+            pret = self.get_price(pair, max_age)
+            if pret is not None:
+                preturi[pair] = pret
+        return preturi
+
+    # -------------------- CONEXIUNE --------------------
+    async def _run(self):
+        import websockets  # doar în modul MARKET_DATA=ws
+        backoff = 1.0
+        while not self._stop.is_set():
+            try:
+                async with websockets.connect(self.url, ping_interval=20) as ws:
+                    symbols = list(self.la_pair)
+                    await ws.send(json.dumps({"method": "subscribe",
+                                              "params": {"channel": "ticker", "symbol": symbols}}))
+                    await ws.send(json.dumps({"method": "subscribe",
+                                              "params": {"channel": "ohlc", "symbol": symbols,
+                                                         "interval": self.interval}}))
+                    self.conectat.set()
+                    backoff = 1.0
+                    print(f"[{datetime.now()}] 🔌 WS conectat ({self.url}) pentru {len(symbols)} perechi")
+                    async for raw in ws:
+                        if self._stop.is_set():
+                            break
+                        self.proceseaza(raw)
+            except Exception as e:
+                print(f"[{datetime.now()}] ⚠️ WS deconectat: {e} — reconectare în {backoff:.1f}s")
+            self.conectat.clear()
+            if self._stop.is_set():
+                break
+            await asyncio.sleep(backoff + random.uniform(0, backoff / 2))
+            backoff = min(backoff * 2, 60.0)
+
+    def proceseaza(self, raw):
+        msg = json.loads(raw)
+        canal = msg.get("channel")
+        if canal == "ticker":
+            for d in msg.get("data", []):
+                pair = self.la_pair.get(d.get("symbol"))
+                if pair is None or d.get("last") is None:
+                    continue
+                pret = float(d["last"])
+                self.preturi[pair] = (pret, time.time())
+                if self.on_price:
+                    self.on_price(pair, pret)
+        elif canal == "ohlc":
+            for d in msg.get("data", []):
+                pair = self.la_pair.get(d.get("symbol"))
+                if pair is None or self.on_candle is None:
+                    continue
+                # "2024-01-01T12:00:00.000000000Z" → unix (fracțiunile de secundă sunt mereu 0)
+                inceput = datetime.strptime(d["interval_begin"][:19], "%Y-%m-%dT%H:%M:%S")
+                self.on_candle(pair, int(d.get("interval", self.interval)), {
+                    "time": int(inceput.replace(tzinfo=timezone.utc).timestamp()),
+                    "open": float(d["open"]), "high": float(d["high"]),
+                    "low": float(d["low"]), "close": float(d["close"]),
+                    "vwap": float(d.get("vwap", d["close"])), "volume": float(d["volume"]),
+                    "count": int(d.get("trades", 0)),
+                })
+
+
+# -------------------- SERVER LOCAL (teste / dezvoltare) --------------------
+# Imită canalele ticker/ohlc din Kraken WS v2 cu un random walk.
+# Pornire: python kraken_ws.py  →  KRAKEN_WS_URL=ws://localhost:8765 MARKET_DATA=ws
+async def server_local(host="localhost", port=8765, preturi=None, pas_sec=0.5):
+    import websockets
+    preturi = dict(preturi or {"BTC/EUR": 60000.0, "ETH/EUR": 3000.0})
+
+    async def handler(ws):
+        abonari = {}
+        async def primeste():
+            async for raw in ws:
+                req = json.loads(raw)
+                if req.get("method") == "subscribe":
+                    params = req.get("params", {})
+                    abonari[params.get("channel")] = params
+                    await ws.send(json.dumps({"method": "subscribe", "success": True,
+                                              "result": {"channel": params.get("channel")}}))
+        receptor = asyncio.create_task(primeste())
+        try:
+            while True:
+                await asyncio.sleep(pas_sec)
+                acum = datetime.now(timezone.utc)
+                for sym in list(preturi):
+                    preturi[sym] *= 1 + random.gauss(0, 0.001)
+                    pret = round(preturi[sym], 2)
+                    if "ticker" in abonari and sym in abonari["ticker"].get("symbol", []):
+                        await ws.send(json.dumps({"channel": "ticker", "type": "update",
+                                                  "data": [{"symbol": sym, "last": pret}]}))
+                    if "ohlc" in abonari and sym in abonari["ohlc"].get("symbol", []):
+                        interval = abonari["ohlc"].get("interval", 60)
+                        sec = interval * 60
+                        inceput = datetime.fromtimestamp(int(acum.timestamp()) // sec * sec, timezone.utc)
+                        await ws.send(json.dumps({"channel": "ohlc", "type": "update", "data": [{
+                            "symbol": sym, "open": pret, "high": pret, "low": pret, "close": pret,
+                            "vwap": pret, "trades": 1, "volume": 0.0, "interval": interval,
+                            "interval_begin": inceput.isoformat().replace("+00:00", "Z"),
+                        }]}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            receptor.cancel()
+
+    async with websockets.serve(handler, host, port):
+        print(f"[{datetime.now()}] 🧪 Server WS local pe ws://{host}:{port}")
+        await asyncio.Future()
+
+if __name__ == "__main__":
+    asyncio.run(server_local())
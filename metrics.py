@@ -0,0 +1,194 @@
+import os
+import json
+import time
+import bisect
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+# Metrici în proces: histograme de latență per etapă (și per simbol) + contoare.
+# Expuse pe un endpoint HTTP local (/metrics text Prometheus, /metrics.json)
+# și într-o linie de sumar periodică în log.
+METRICS_HOST = os.getenv("METRICS_HOST", "127.0.0.1")
+METRICS_PORT = int(os.getenv("METRICS_PORT", "9108"))          # 0 = fără endpoint
+SUMAR_SEC    = int(os.getenv("METRICS_SUMMARY_SEC", "300"))    # 0 = fără sumar periodic
+
+# limitele superioare ale bucket-urilor (ms); ultimul bucket e +Inf
+BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Histograma:
+    def __init__(self):
+        self.counts = [0] * (len(BUCKETS_MS) + 1)
+        self.n = 0
+        self.suma = 0.0
+        self.max = 0.0
+
+    def observa(self, ms):
+        self.counts[bisect.bisect_left(BUCKETS_MS, ms)] += 1
+        self.n += 1
+        self.suma += ms
+        if ms > self.max:
+            self.max = ms
+
+    def copie(self):
+        h = Histograma()
+        h.counts, h.n, h.suma, h.max = list(self.counts), self.n, self.suma, self.max
+        return h
+
+    def minus(self, vechi):
+        # histograma intervalului dintre două copii (max rămâne cel cumulat)
+        h = self.copie()
+        if vechi is not None:
+            h.counts = [a - b for a, b in zip(self.counts, vechi.counts)]
+            h.n -= vechi.n
+            h.suma -= vechi.suma
+        return h
+
+    def cuantila(self, q):
+        # limita superioară a bucket-ului care conține cuantila q (plafonată la max)
+        if self.n == 0:
+            return 0.0
+        prag = q * self.n
+        cumulat = 0
+        for i, c in enumerate(self.counts):
+            cumulat += c
+            if cumulat >= prag:
+                return min(float(BUCKETS_MS[i]), self.max) if i < len(BUCKETS_MS) else self.max
+        return self.max
+
+
+_lacat = threading.Lock()
+histograme = {}   # (etapa, simbol | None) → Histograma; simbol None = toate simbolurile
+contoare = {}     # (nume, eticheta | None) → int
+_ultimul_sumar = {}
+
+def observa(etapa, ms, simbol=None):
+    with _lacat:
+        chei = [(etapa, None)] if simbol is None else [(etapa, None), (etapa, simbol)]
+        for cheie in chei:
+            h = histograme.get(cheie)
+            if h is None:
+                h = histograme[cheie] = Histograma()
+            h.observa(ms)
+
+@contextmanager
+def cronometreaza(etapa, simbol=None):
+    t = time.perf_counter()
+    try:
+        yield
+    finally:
+        observa(etapa, (time.perf_counter() - t) * 1000, simbol)
+
+def incrementeaza(nume, n=1, eticheta=None):
+    with _lacat:
+        contoare[(nume, eticheta)] = contoare.get((nume, eticheta), 0) + n
+
+def reseteaza():
+    with _lacat:
+        histograme.clear()
+        contoare.clear()
+        _ultimul_sumar.clear()
+
+# -------------------- EXPORT --------------------
+def text_prometheus():
+    with _lacat:
+        hs = {k: h.copie() for k, h in histograme.items()}
+        cs = dict(contoare)
+    linii = ["# TYPE bot_stage_latency_ms histogram"]
+    for (etapa, simbol), h in sorted(hs.items(), key=lambda x: (x[0][0], x[0][1] or "")):
+        etichete = f'stage="{etapa}"' + (f',symbol="{simbol}"' if simbol else "")
+        cumulat = 0
+        for limita, c in zip(list(BUCKETS_MS) + ["+Inf"], h.counts):
+            cumulat += c
+            linii.append(f'bot_stage_latency_ms_bucket{{{etichete},le="{limita}"}} {cumulat}')
+        linii.append(f"bot_stage_latency_ms_sum{{{etichete}}} {h.suma:.3f}")
+        linii.append(f"bot_stage_latency_ms_count{{{etichete}}} {h.n}")
+    tipuri = set()
+    for (nume, eticheta), v in sorted(cs.items(), key=lambda x: (x[0][0], x[0][1] or "")):
+        if nume not in tipuri:
+            tipuri.add(nume)
+            linii.append(f"# TYPE bot_{nume}_total counter")
+        linii.append(f'bot_{nume}_total{{label="{eticheta}"}} {v}' if eticheta else f"bot_{nume}_total {v}")
+    return "\n".join(linii) + "\n"
+
+def instantaneu():
+    with _lacat:
+        hs = {k: h.copie() for k, h in histograme.items()}
+        cs = dict(contoare)
+    return {
+        "etape": [{"etapa": e, "simbol": s, "n": h.n, "medie_ms": round(h.suma / h.n, 3) if h.n else 0.0,
+                   "p50_ms": h.cuantila(0.5), "p95_ms": h.cuantila(0.95), "p99_ms": h.cuantila(0.99),
+                   "max_ms": round(h.max, 3)} for (e, s), h in hs.items()],
+        "contoare": [{"nume": n, "eticheta": e, "valoare": v} for (n, e), v in cs.items()],
+    }
+
+def sumar():
+    # o linie: etapele agregate (toate simbolurile) din intervalul de la ultimul sumar
+    with _lacat:
+        curente = {e: h.copie() for (e, s), h in histograme.items() if s is None}
+        cs = dict(contoare)
+        vechi = dict(_ultimul_sumar)
+        _ultimul_sumar.clear()
+        _ultimul_sumar.update({("h", e): h for e, h in curente.items()})
+        _ultimul_sumar.update({("c", k): v for k, v in cs.items()})
+
+    parti = []
+    for etapa, h in sorted(curente.items()):
+        d = h.minus(vechi.get(("h", etapa)))
+        if d.n:
+            parti.append(f"{etapa} n={d.n} avg={d.suma / d.n:.1f} p95≤{d.cuantila(0.95):.1f} max={h.max:.0f}ms")
+    for (nume, eticheta), v in sorted(cs.items(), key=lambda x: (x[0][0], x[0][1] or "")):
+        delta = v - vechi.get(("c", (nume, eticheta)), 0)
+        if delta:
+            parti.append(f"{nume}{'[' + eticheta + ']' if eticheta else ''}=+{delta}")
+    return " | ".join(parti)
+
+# -------------------- ENDPOINT + SUMAR --------------------
+class _Handler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path == "/metrics":
+            corp, tip = text_prometheus().encode(), "text/plain; version=0.0.4"
+        elif self.path == "/metrics.json":
+            corp, tip = json.dumps(instantaneu()).encode(), "application/json"
+        else:
+            self.send_error(404)
+            return
+        self.send_response(200)
+        self.send_header("Content-Type", tip)
+        self.send_header("Content-Length", str(len(corp)))
+        self.end_headers()
+        self.wfile.write(corp)
+
+    def log_message(self, *args):
+        pass  # fără câte o linie de log per scrape
+
+def porneste_server(host=METRICS_HOST, port=METRICS_PORT):
+    server = ThreadingHTTPServer((host, port), _Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="metrics-http", daemon=True).start()
+    print(f"[{datetime.now()}] 📈 Metrici pe http://{host}:{server.server_address[1]}/metrics")
+    return server
+
+def porneste_sumar(interval_sec=SUMAR_SEC):
+    def bucla():
+        while True:
+            time.sleep(interval_sec)
+            linie = sumar()
+            if linie:
+                print(f"[{datetime.now()}] 📈 {linie}")
+    t = threading.Thread(target=bucla, name="metrics-sumar", daemon=True)
+    t.start()
+    return t
+
+def porneste(host=METRICS_HOST, port=METRICS_PORT, interval_sec=SUMAR_SEC):
+    server = None
+    if port:
+        try:
+            server = porneste_server(host, port)
+        except OSError as e:
+            print(f"[{datetime.now()}] ⚠️ Endpoint metrici indisponibil ({host}:{port}): {e}")
+    if interval_sec:
+        porneste_sumar(interval_sec)
+    return server
@@ -0,0 +1,103 @@
+import os
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+import metrics
+
+ORDER_POLL_SEC   = float(os.getenv("ORDER_POLL_SEC", "2"))
+ORDER_WORKERS    = int(os.getenv("ORDER_WORKERS", "2"))
+QUERY_BATCH      = 50      # txid-uri per QueryOrders (limita Kraken)
+STARI_FINALE     = ("closed", "canceled", "expired")
+
+
+# Ordine fără blocarea buclei: AddOrder rulează pe un pool separat, iar un thread
+# urmărește txid-urile deschise cu QueryOrders (în loturi) până la execuție.
+#   la_trimis(ordin)          — AddOrder acceptat, ordin["txid"] setat
+#   la_executie(ordin, fill)  — stare finală: {"status", "vol", "pret", "cost", "fee", "inchis_la"}
+#   la_esec(ordin, eroare)    — AddOrder respins / eșuat
+# `ordin` e dict-ul primit la trimite() (side, volume, pair + contextul apelantului).
+class OrderManager:
+    def __init__(self, plaseaza, interogheaza, la_trimis, la_executie, la_esec,
+                 workers=ORDER_WORKERS, poll_sec=ORDER_POLL_SEC, sincron=False):
+        self.plaseaza = plaseaza
+        self.interogheaza = interogheaza
+        self.la_trimis = la_trimis
+        self.la_executie = la_executie
+        self.la_esec = la_esec
+        self.poll_sec = poll_sec
+        self.sincron = sincron   # replay: totul inline, în ordinea apelurilor
+        self.workers = workers
+        self.executor = None
+        self.thread = None
+        self.in_asteptare = {}   # txid → ordin
+        self._lacat = threading.Lock()
+        self._trezire = threading.Event()
+
+    def start(self):
+        if not self.sincron and self.thread is None:
+            self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="order")
+            self.thread = threading.Thread(target=self._bucla, name="order-tracker", daemon=True)
+            self.thread.start()
+        return self
+
+    def trimite(self, ordin):
+        if self.sincron:
+            self._plaseaza(ordin)
+            self._verifica(list(self.in_asteptare))
+            return None
+        return self.executor.submit(self._plaseaza, ordin)
+
+    def deschise(self):
+        with self._lacat:
+            return len(self.in_asteptare)
+
+    def _plaseaza(self, ordin):
+        try:
+            raspuns = self.plaseaza(ordin["side"], ordin["volume"], ordin["pair"])
+            ordin["txid"] = raspuns.get("result", {}).get("txid", [None])[0]
+        except Exception as e:
+            self._apel(self.la_esec, ordin, e)
+            return
+        ordin["trimis_la"] = time.time()
+        with self._lacat:
+            if ordin["txid"]:
+                self.in_asteptare[ordin["txid"]] = ordin
+        self._apel(self.la_trimis, ordin)
+        self._trezire.set()
+
+    def _bucla(self):
+        while True:
+            self._trezire.wait(self.poll_sec)
+            self._trezire.clear()
+            time.sleep(min(0.5, self.poll_sec))  # market order: lasă timp motorului să execute
+            with self._lacat:
+                txids = list(self.in_asteptare)
+            for i in range(0, len(txids), QUERY_BATCH):
+                try:
+                    self._verifica(txids[i:i + QUERY_BATCH])
+                except Exception as e:
+                    metrics.incrementeaza("erori", eticheta="QueryOrders")
+                    print(f"[{datetime.now()}] ⚠️ QueryOrders eșuat ({len(txids)} ordine): {e}")
+
+    def _verifica(self, txids):
+        if not txids:
+            return
+        info = self.interogheaza(txids)
+        for txid in txids:
+            o = info.get(txid)
+            if o is None or o["status"] not in STARI_FINALE:
+                continue
+            with self._lacat:
+                ordin = self.in_asteptare.pop(txid, None)
+            if ordin is None:
+                continue
+            metrics.observa("ordin_executie", (time.time() - ordin["trimis_la"]) * 1000, ordin["pair"])
+            self._apel(self.la_executie, ordin, o)
+
+    def _apel(self, fn, *args):
+        try:
+            fn(*args)
+        except Exception as e:
+            metrics.incrementeaza("erori", eticheta="ordin_callback")
+            print(f"[{datetime.now()}] ❌ Eroare callback ordin {args[0].get('txid')}: {e}")
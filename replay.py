@@ -0,0 +1,218 @@
+import os
+import argparse
+import contextlib
+from datetime import datetime
+import pandas as pd
+from sqlalchemy import create_engine, text
+
+import ai_auto_trader_real as bot
+import strategie
+import candle_store
+from kraken_client import SoldCache
+from order_manager import OrderManager
+from candle_aggregator import AgregatorLumanari
+
+# Replay rapid al logicii live (proceseaza_simbol) peste prețuri istorice:
+# ceas simulat, exchange simulat, fără sleep, fără rețea, fără scrieri în DB.
+TICK_SEC = 10
+MAX_CANDELE = strategie.MAX_CANDELE
+
+
+class CeasSimulat:
+    def __init__(self):
+        self.t = datetime(1970, 1, 1)
+
+    def __call__(self):
+        return self.t
+
+
+class ExchangeSimulat:
+    def __init__(self, eur, fee_rate=bot.FEE_RATE / 2):
+        self.sold = {"ZEUR": float(eur)}
+        self.fee_rate = fee_rate
+        self.preturi = {}
+        self.ordine = 0
+        self.executii = {}
+
+    def get_balance(self):
+        return dict(self.sold)
+
+    def place_market_order(self, side="buy", volume=0.001, pair="XXBTZEUR"):
+        # execuție instant la ultimul preț văzut, cu comision taker
+        pret = self.preturi[pair]
+        key = bot.PAIR_TO_BAL_KEY.get(pair, pair.replace("ZEUR", ""))
+        valoare = float(volume) * pret
+        fee = valoare * self.fee_rate
+        if side == "buy":
+            self.sold["ZEUR"] -= valoare + fee
+            self.sold[key] = self.sold.get(key, 0.0) + float(volume)
+        else:
+            self.sold["ZEUR"] += valoare - fee
+            self.sold[key] = self.sold.get(key, 0.0) - float(volume)
+        self.ordine += 1
+        txid = f"SIM-{self.ordine}"
+        self.executii[txid] = {"status": "closed", "vol": float(volume), "pret": pret, "cost": valoare, "fee": fee}
+        return {"error": [], "result": {"descr": {"order": f"{side} {volume:.8f} {pair} @ market"},
+                                        "txid": [txid]}}
+
+    def query_orders(self, txids):
+        return {t: self.executii.pop(t) for t in txids if t in self.executii}
+
+    def valoare_eur(self):
+        total = self.sold["ZEUR"]
+        for pair, pret in self.preturi.items():
+            total += self.sold.get(bot.PAIR_TO_BAL_KEY.get(pair, pair.replace("ZEUR", "")), 0.0) * pret
+        return total
+
+
+@contextlib.contextmanager
+def _inlocuieste(modul, valori):
+    vechi = {k: getattr(modul, k) for k in valori}
+    try:
+        for k, v in valori.items():
+            setattr(modul, k, v)
+        yield
+    finally:
+        for k, v in vechi.items():
+            setattr(modul, k, v)
+
+
+@contextlib.contextmanager
+def _stare_strategie_izolata():
+    # replay-ul nu trebuie să atingă cache-urile de semnal ale botului live (și invers)
+    salvat = (dict(strategie.ultima_ora_semnal), dict(strategie.indicatori_stare))
+    strategie.ultima_ora_semnal.clear()
+    strategie.indicatori_stare.clear()
+    try:
+        yield
+    finally:
+        strategie.ultima_ora_semnal.clear()
+        strategie.ultima_ora_semnal.update(salvat[0])
+        strategie.indicatori_stare.clear()
+        strategie.indicatori_stare.update(salvat[1])
+
+# -------------------- SURSE DE DATE --------------------
+def incarca_ticks_db(symbols, de_la=None, pana_la=None, engine=None):
+    q = text(f"""
+        SELECT timestamp, symbol, price FROM {bot.DB_SCHEMA}.prices
+        WHERE symbol = ANY(:syms)
+          AND timestamp >= COALESCE(CAST(:de_la AS TIMESTAMP), '-infinity')
+          AND timestamp <  COALESCE(CAST(:pana_la AS TIMESTAMP), 'infinity')
+        ORDER BY timestamp
+    """)
+    df = pd.read_sql(q, engine or create_engine(bot.db_url), params={"syms": list(symbols), "de_la": de_la, "pana_la": pana_la})
+    df["price"] = df["price"].astype(float)
+    return df
+
+def incarca_ticks_store(symbols, interval=60, de_la=None):
+    # un tick per lumânare: prețul de închidere, la sfârșitul intervalului
+    since = int(pd.Timestamp(de_la).timestamp()) if de_la else None
+    cadre = []
+    for s in symbols:
+        c = candle_store.incarca_df(s, interval, since=since)
+        cadre.append(pd.DataFrame({"timestamp": pd.to_datetime(c["time"] + interval * 60, unit="s"),
+                                   "symbol": s, "price": c["close"].astype(float)}))
+    return pd.concat(cadre).sort_values("timestamp", kind="stable").reset_index(drop=True)
+
+# -------------------- REPLAY --------------------
+def ruleaza_replay(ticks, strat, eur_initial=1000.0, parametri=None, tick_sec=TICK_SEC, liniste=True):
+    # parametri: constante din bot (DCA_DROP_PCT, REENTRY_COOLDOWN_SEC, ...) sau chei din strategie
+    parametri = dict(parametri or {})
+    strat = dict(strat)
+    modul = {k: parametri.pop(k) for k in list(parametri) if k.isupper() and hasattr(bot, k)}
+    strat.update(parametri)
+    symbols = strat["symbols"]
+
+    ceas = CeasSimulat()
+    ex = ExchangeSimulat(eur_initial)
+    pozitii = {s: bot.pozitie_goala() for s in symbols}
+    trend = bot.initializeaza_trend(symbols, din_db=False)
+    # lumânări 1h din tick-uri, în formatul din obtine_ohlc (MAX_CANDELE cu tot cu cea curentă)
+    lumanari = AgregatorLumanari(intervale=(60,), max_bare=MAX_CANDELE - 1)
+    ohlc = {}
+    tranzactii = []
+
+    def log_trade(symbol, action, qty, price, profit_pct, profit_eur, status="EXECUTED", **_):
+        tranzactii.append({"timestamp": ceas(), "symbol": symbol, "action": action, "quantity": float(qty),
+                           "price": float(price), "profit_pct": float(profit_pct),
+                           "profit_eur": float(profit_eur), "status": status})
+
+    # un tick = ultimul preț per simbol în fiecare fereastră de tick_sec (ca bucla live)
+    ticks = ticks[ticks["symbol"].isin(symbols)].copy()
+    ticks["bucket"] = ticks["timestamp"].dt.floor(f"{tick_sec}s")
+    ticks = ticks.drop_duplicates(["bucket", "symbol"], keep="last")
+    # secunde Unix independent de rezoluția coloanei (pandas 3 citește adesea datetime64[us], nu [ns])
+    unix = ticks["bucket"].astype("datetime64[s]").astype("int64").to_numpy()
+
+    inlocuiri = {"acum": ceas, "get_balance": ex.get_balance, "place_market_order": ex.place_market_order,
+                 "sold_cache": SoldCache(ex.get_balance, reconciliere_sec=0),
+                 "ordine": OrderManager(ex.place_market_order, ex.query_orders, bot._ordin_trimis,
+                                        bot._ordin_executat, bot._ordin_esuat, sincron=True),
+                 "log_trade_db": log_trade, "log_trade_fill": lambda *a, **k: None,
+                 "corecteaza_sumar": lambda *a, **k: None, "log_price_db": lambda *a, **k: None,
+                 "log_signal_db": lambda *a, **k: None, "salveaza_pozitii": lambda: None, **modul}
+    iesire = open(os.devnull, "w") if liniste else contextlib.nullcontext()
+    with _inlocuieste(bot, inlocuiri), _stare_strategie_izolata(), iesire as f, \
+            contextlib.redirect_stdout(f) if liniste else contextlib.nullcontext():
+        bucket_curent = None
+        cont = None
+        for (bucket, s, pret), t_unix in zip(ticks[["bucket", "symbol", "price"]].itertuples(index=False), unix):
+            if bucket != bucket_curent:
+                bucket_curent = bucket
+                ceas.t = bucket.to_pydatetime()
+                cont = bot.pregateste_cont(symbols, pozitii, strat)
+            ex.preturi[s] = pret
+
+            # ca buffer-ul live: reconstruit la o oră nouă; semnalul urmează bara curentă la fiecare tick
+            if lumanari.adauga(s, pret, t_unix) or s not in ohlc:
+                ohlc[s] = lumanari.df(s, 60)
+            semnal, scor, vol = strategie.evalueaza_semnal(s, ohlc[s], strat, ultimul_close=pret)
+
+            bot.proceseaza_simbol(s, pret, semnal, scor, vol, pozitii, trend, strat, cont)
+
+    df_tr = pd.DataFrame(tranzactii, columns=["timestamp", "symbol", "action", "quantity", "price",
+                                              "profit_pct", "profit_eur", "status"])
+    valoare_finala = ex.valoare_eur()
+    return {
+        "tranzactii": df_tr,
+        "pozitii": pozitii,
+        "sold": ex.get_balance(),
+        "eur_initial": eur_initial,
+        "valoare_finala": valoare_finala,
+        "pnl_eur": valoare_finala - eur_initial,
+        "pnl_pct": (valoare_finala / eur_initial - 1) * 100 if eur_initial else 0.0,
+        "ticks": len(ticks),
+    }
+
+def _valoare(v):
+    try:
+        return float(v) if "." in v else int(v)
+    except ValueError:
+        return v
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay al logicii live peste prețuri istorice")
+    parser.add_argument("--sursa", choices=["db", "store"], default="db")
+    parser.add_argument("--de-la")
+    parser.add_argument("--pana-la")
+    parser.add_argument("--eur", type=float, default=1000.0)
+    parser.add_argument("--set", action="append", default=[], metavar="CHEIE=VALOARE",
+                        help="ex: DCA_DROP_PCT=3 REENTRY_COOLDOWN_SEC=600 Trailing_TP=2.0")
+    args = parser.parse_args()
+
+    strat = bot.incarca_strategia()
+    parametri = dict((k, _valoare(v)) for k, v in (p.split("=", 1) for p in args.set))
+    if args.sursa == "db":
+        ticks = incarca_ticks_db(strat["symbols"], args.de_la, args.pana_la)
+    else:
+        ticks = incarca_ticks_store(strat["symbols"], de_la=args.de_la)
+
+    t0 = datetime.now()
+    rez = ruleaza_replay(ticks, strat, args.eur, parametri)
+    durata = (datetime.now() - t0).total_seconds()
+
+    tr = rez["tranzactii"]
+    print(f"⏱️ {rez['ticks']} tick-uri în {durata:.2f}s")
+    print(f"💰 Valoare finală: {rez['valoare_finala']:.2f}€ | PnL: {rez['pnl_eur']:.2f}€ ({rez['pnl_pct']:.2f}%)")
+    if not tr.empty:
+        print(tr.groupby(["symbol", "action"]).agg(n=("action", "size"), profit_eur=("profit_eur", "sum")))
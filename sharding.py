@@ -0,0 +1,132 @@
+import os
+import time
+import asyncio
+import secrets
+import threading
+import multiprocessing as mp
+from multiprocessing.managers import BaseManager
+from datetime import datetime
+
+# Mod shard: simbolurile din strategy.json sunt împărțite pe SHARD_WORKERS procese,
+# fiecare cu propria buclă de evaluare (ruleaza_bot pe subset). Procesul coordonator
+# deține soldul EUR comun (SoldCache) și alocările; shard-urile îl accesează printr-un
+# proxy local (multiprocessing.managers) și rezervă EUR atomic înainte de fiecare BUY.
+SHARD_WORKERS   = int(os.getenv("SHARD_WORKERS", str(os.cpu_count() or 1)))
+COORD_HOST      = "127.0.0.1"
+RESTART_SEC     = 10     # pauză minimă între reporniri ale aceluiași shard
+SUPRAVEGHERE_SEC = 5
+
+EXPUSE = ("get", "rezerva", "aplica_ordin", "ajusteaza", "invalideaza", "alloc_sum")
+
+
+class Coordonator:
+    def __init__(self, sold_cache, allocations):
+        self.sold = sold_cache
+        self.allocations = dict(allocations)
+        self.deschise = {}   # simbol → poziție deschisă (raportată de shard-uri la fiecare tick)
+        self._lacat = threading.Lock()
+
+    # interfața SoldCache, delegată — proxy-ul ține locul lui sold_cache în shard-uri
+    def get(self, fortat=False):
+        return self.sold.get(fortat)
+
+    def rezerva(self, cheie, eur):
+        return self.sold.rezerva(cheie, eur)
+
+    def aplica_ordin(self, side, volume, activ, pret, fee_rate, cheie=None):
+        self.sold.aplica_ordin(side, volume, activ, pret, fee_rate, cheie)
+
+    def ajusteaza(self, activ, delta, executat_la=None):
+        self.sold.ajusteaza(activ, delta, executat_la)
+
+    def invalideaza(self):
+        self.sold.invalideaza()
+
+    def seteaza_alocari(self, allocations):
+        with self._lacat:
+            self.allocations = dict(allocations)
+
+    def alloc_sum(self, stare):
+        # suma alocărilor simbolurilor închise din toate shard-urile (ca în pregateste_cont)
+        with self._lacat:
+            self.deschise.update(stare)
+            return sum(self.allocations.get(s, 0.0) for s in self.allocations
+                       if not self.deschise.get(s, False))
+
+
+class _Manager(BaseManager):
+    pass
+
+
+def imparte(symbols, n):
+    # round-robin: simbolurile (în ordinea din strategie) distribuite uniform
+    return [shard for shard in (symbols[i::n] for i in range(max(1, n))) if shard]
+
+def _worker(adresa, cheie, symbols, index):
+    # proces nou (spawn): variabilele de mediu se setează înainte de importul botului
+    os.environ["SHARD_INDEX"] = str(index)
+    port = int(os.getenv("METRICS_PORT", "9108"))
+    if port:
+        os.environ["METRICS_PORT"] = str(port + 1 + index)
+
+    _Manager.register("coordonator")
+    manager = _Manager(address=adresa, authkey=cheie)
+    manager.connect()
+    coord = manager.coordonator()
+
+    import ai_auto_trader_real as bot
+    bot.instaleaza_oprire()
+    bot.sold_cache = coord
+    bot.coordonator = coord
+    print(f"[{datetime.now()}] 🧩 Shard {index}: {', '.join(symbols)}")
+    if bot.ENGINE_MODE == "async":
+        asyncio.run(bot.ruleaza_bot_async(symbols))
+    else:
+        bot.ruleaza_bot(symbols)
+
+def ruleaza_coordonator(n=SHARD_WORKERS):
+    import ai_auto_trader_real as bot
+    import metrics
+
+    bot.instaleaza_oprire()
+    bot.initializeaza_db()   # coordonatorul rulează retenția DB (shard-urile nu)
+    bot.porneste_optimizator()
+    strat = bot.incarca_strategia()
+    shards = imparte(strat.get("symbols", ["XXBTZEUR", "XETHZEUR"]), n)
+    coord = Coordonator(bot.sold_cache, strat.get("allocations", {}))
+
+    cheie = secrets.token_bytes(32)
+    _Manager.register("coordonator", callable=lambda: coord, exposed=EXPUSE)
+    server = _Manager(address=(COORD_HOST, 0), authkey=cheie).get_server()
+    threading.Thread(target=server.serve_forever, name="coordonator", daemon=True).start()
+    print(f"[{datetime.now()}] 🧩 Coordonator pe {server.address[0]}:{server.address[1]} — "
+          f"{len(shards)} shard-uri")
+    metrics.porneste()
+
+    ctx = mp.get_context("spawn")   # fără fork: fiecare shard își deschide propriile conexiuni (DB, HTTP)
+    procese, pornit_la = {}, {}
+
+    def porneste(i):
+        p = ctx.Process(target=_worker, args=(server.address, cheie, shards[i], i), name=f"shard-{i}")
+        p.start()
+        procese[i], pornit_la[i] = p, time.monotonic()
+
+    for i in range(len(shards)):
+        porneste(i)
+
+    while True:
+        time.sleep(SUPRAVEGHERE_SEC)
+        for i, p in procese.items():
+            if not p.is_alive() and time.monotonic() - pornit_la[i] >= RESTART_SEC:
+                print(f"[{datetime.now()}] ❌ Shard {i} oprit (exit={p.exitcode}) — repornesc")
+                metrics.incrementeaza("erori", eticheta="shard")
+                porneste(i)
+        try:
+            coord.get()   # reconcilierea periodică rulează aici, nu în shard-uri
+        except Exception as e:
+            print(f"[{datetime.now()}] ⚠️ Reconciliere sold eșuată: {e}")
+        if bot.verifica_strategie(strat):   # shard-urile își reîncarcă singure parametrii
+            coord.seteaza_alocari(strat["allocations"])
+
+if __name__ == "__main__":
+    ruleaza_coordonator()
@@ -1,7 +1,10 @@
+import time
+import threading
 import pandas as pd
 import numpy as np
 from datetime import datetime
-from kraken_client import k  # KrakenAPI din kraken_client
+from kraken_client import get_ohlc
+from technical_indicators import StreamingRSI, StreamingMACD, StreamingVolatility, peek, warmup
 
 # Dezactivăm avertismentele Pandas
 import warnings
@@ -10,6 +13,140 @@ warnings.filterwarnings("ignore", category=FutureWarning)
 # Cache pentru ultima oră procesată
 ultima_ora_semnal = {}
 
+# Cache lumânări OHLC per (pereche, interval): {"df": DataFrame, "last": cursor Kraken}
+candele_cache = {}
+MAX_CANDELE = 720
+
+# feed-ul WS (și agregatorul local) actualizează buffer-ele din alt thread decât bucla →
+# candele_cache și indicatori_stare sunt citite/scrise doar sub acest lacăt
+lacat_candele = threading.RLock()
+
+def obtine_ohlc(pair, interval=60):
+    cheie = (pair, interval)
+    with lacat_candele:
+        cache = candele_cache.get(cheie)
+        if cache is not None and not cache.get("reconciliaza"):
+            # ⚡ Lumânarea orei curente e deja în buffer → fără request
+            inceput_interval = int(time.time()) // (interval * 60) * (interval * 60)
+            if cache["ultima"] >= inceput_interval:
+                _scrie_curenta(cache)
+                return cache["df"]
+
+    # request-ul REST rulează fără lacăt (feed-ul nu așteaptă după rețea)
+    if cache is not None:
+        # 📥 Doar lumânările noi, prin cursorul `since`
+        noi, last = get_ohlc(pair, interval=interval, since=cache["last"])
+    else:
+        noi, last = get_ohlc(pair, interval=interval)
+
+    with lacat_candele:
+        cache = candele_cache.get(cheie)   # poate fi actualizat între timp de feed
+        if cache is not None:
+            _scrie_curenta(cache)
+            vechi = cache["df"]
+            df = pd.concat([vechi[~vechi.index.isin(noi.index)], noi])
+        else:
+            df = noi
+        df = df.iloc[-MAX_CANDELE:]
+        candele_cache[cheie] = {"df": df, "last": last, "ultima": int(df["time"].iloc[-1]), "curenta": None}
+    return df
+
+def aplica_candela(pair, interval, candela, combina=False):
+    with lacat_candele:
+        _aplica_candela(pair, interval, candela, combina)
+
+def _aplica_candela(pair, interval, candela, combina=False):
+    # 📡 lumânare venită din feed-ul WebSocket sau din agregatorul local → actualizează buffer-ul
+    # (fără request REST). combina=True: bara locală acoperă doar tick-urile văzute de bot →
+    # păstrează open/high/low (și volumul REST) deja știute pentru aceeași lumânare
+    cache = candele_cache.get((pair, interval))
+    if cache is None:
+        return  # buffer-ul se inițializează la primul obtine_ohlc (istoric complet din REST)
+    t = int(candela["time"])
+    ultima = cache["ultima"]
+    if t < ultima:
+        return
+    if t > ultima + interval * 60:
+        # gol în buffer (ex. reconectare, pauză) → completat din REST, nu sărit
+        cache["reconciliaza"] = True
+        return
+    if t == ultima:
+        # bara curentă: doar reținută; scrisă în DataFrame la următoarea citire (obtine_ohlc)
+        if combina:
+            vechi = cache["curenta"] or cache["df"].iloc[-1]
+            candela = dict(candela, open=vechi["open"], high=max(float(vechi["high"]), candela["high"]),
+                           low=min(float(vechi["low"]), candela["low"]), volume=vechi["volume"])
+        cache["curenta"] = candela
+        return
+    # bară nouă: o singură dată pe interval (bara anterioară primește întâi ultimul ei tick)
+    _scrie_curenta(cache)
+    df = cache["df"]
+    rand = pd.DataFrame([candela], index=pd.to_datetime([t], unit="s"))[df.columns]
+    rand.index.name = df.index.name
+    cache.update(df=pd.concat([df, rand]).iloc[-MAX_CANDELE:], ultima=t)
+
+COLOANE_BARA = ("open", "high", "low", "close", "vwap", "volume", "count")
+
+def _scrie_curenta(cache):
+    # bara curentă reținută de _aplica_candela → ultimul rând din buffer, pe loc (fără pd.concat)
+    candela = cache.get("curenta")
+    if candela is not None:
+        df = cache["df"]
+        for col in COLOANE_BARA:
+            df.iat[-1, df.columns.get_loc(col)] = candela[col]
+        cache["curenta"] = None
+
+# Stare indicatori incrementali per pereche (alimentată doar cu lumânări închise)
+indicatori_stare = {}
+
+# indicator → constructor; parametrii fiecăruia sunt urmăriți separat, ca o schimbare
+# de strategie (hot reload) să reconstruiască doar indicatorul ale cărui perioade s-au schimbat
+INDICATORI = {"rsi": StreamingRSI, "macd": StreamingMACD, "vol": StreamingVolatility}
+
+def parametri_indicatori(strategie):
+    return {
+        "rsi": (strategie.get("RSI_Period", 14),),
+        "macd": (strategie.get("MACD_Fast", 12), strategie.get("MACD_Slow", 26), strategie.get("MACD_Signal", 9)),
+        "vol": (14,),
+    }
+
+def _coloane(pair, ohlc):
+    # time/close ca numpy, o singură dată per buffer (semnalul e evaluat la fiecare tick: bara
+    # curentă se mișcă); din close se citesc doar lumânările închise, neschimbate cât timp
+    # buffer-ul e același obiect
+    stare = indicatori_stare.setdefault(pair, {"params": {}, "time": None})
+    if stare.get("ohlc") is not ohlc:
+        stare.update(ohlc=ohlc, timp=ohlc["time"].to_numpy(), close=ohlc["close"].to_numpy())
+    return stare["timp"], stare["close"]
+
+def actualizeaza_indicatori(pair, ohlc, strategie, ultimul):
+    timp, close = _coloane(pair, ohlc)
+    stare = indicatori_stare[pair]
+    n = len(close) - 1   # ultima lumânare e cea deschisă
+    for nume, params in parametri_indicatori(strategie).items():
+        if stare["params"].get(nume) != params:
+            # (re)construit din lumânările închise văzute deja de ceilalți indicatori
+            indicator = INDICATORI[nume](*params)
+            if stare["time"] is not None:
+                warmup(indicator, close[:n][timp[:n] <= stare["time"]])
+            stare[nume] = indicator
+            stare["params"][nume] = params
+
+    # ➕ doar lumânările închise pe care nu le-am văzut încă (de obicei niciuna: bara curentă s-a mișcat)
+    start = 0 if stare["time"] is None else int(np.searchsorted(timp[:n], stare["time"], side="right"))
+    for pret in close[start:n]:
+        stare["rsi"].update(pret)
+        stare["macd"].update(pret)
+        stare["vol"].update(pret)
+    if n > start:
+        stare["time"] = int(timp[n - 1])
+
+    # 🕯️ lumânarea curentă (deschisă) se evaluează fără să modifice starea
+    rsi = peek(stare["rsi"], ultimul)
+    macd, signal_line = peek(stare["macd"], ultimul)
+    volatilitate = peek(stare["vol"], ultimul)
+    return rsi, macd, signal_line, volatilitate
+
 def calculeaza_RSI(prices, period=14):
     delta = prices.diff()
     gain = delta.where(delta > 0, 0)
@@ -30,36 +167,40 @@ def calculeaza_volatilitate(prices, perioada=14):
     return prices.pct_change().rolling(perioada).std().iloc[-1]
 
 def calculeaza_semnal(pair, strategie):
-    global ultima_ora_semnal
     try:
         # 📊 timeframe 1 oră
-        ohlc, _ = k.get_ohlc_data(pair, interval=60, ascending=True)
-        close_prices = ohlc['close']
+        ohlc = obtine_ohlc(pair, interval=60)
+        return evalueaza_semnal(pair, ohlc, strategie)
 
-        ultima_candela = ohlc.index[-1]
-        ultima_ora = ultima_candela.replace(minute=0, second=0, microsecond=0)
-
-        # ⚡ Dacă nu avem o candelă nouă, returnăm semnalul precedent
-        if pair in ultima_ora_semnal and ultima_ora_semnal[pair]["ora"] == ultima_ora:
-            prev = ultima_ora_semnal[pair]
-            return prev["semnal"], prev["scor"], prev["volatilitate"]
+    except Exception as e:
+        print(f"[{datetime.now()}] ❌ Eroare în strategie: {e}")
+        return "HOLD", 0, 0
 
-        # 📈 RSI (perioadă 14, praguri mai sensibile)
-        rsi = calculeaza_RSI(close_prices, strategie.get("RSI_Period", 14))
-        rsi_curent = rsi.iloc[-1]
+def evalueaza_semnal(pair, ohlc, strategie, ultimul_close=None):
+    # semnalul din lumânările deja disponibile (folosit live și în replay).
+    # ultimul_close: prețul curent al barei deschise, dacă rândul ei din `ohlc` nu e la zi (replay)
+    with lacat_candele:
+        return _evalueaza_semnal(pair, ohlc, strategie, ultimul_close)
 
-        # 📉 MACD (12,26,9)
-        macd, signal_line = calculeaza_MACD(
-            close_prices,
-            strategie.get("MACD_Fast", 12),
-            strategie.get("MACD_Slow", 26),
-            strategie.get("MACD_Signal", 9)
-        )
-        macd_curent = macd.iloc[-1]
-        signal_curent = signal_line.iloc[-1]
+def _evalueaza_semnal(pair, ohlc, strategie, ultimul_close=None):
+    global ultima_ora_semnal
+    try:
+        timp, _ = _coloane(pair, ohlc)
+        ultima_ora = int(timp[-1]) // 3600 * 3600
+        # bara curentă (parțială) e actualizată din tick-uri → semnalul urmează ultimul ei close
+        if ultimul_close is None:
+            ultimul_close = float(ohlc["close"].iat[-1])
+        # parametrii care schimbă semnalul: o strategie reîncărcată îl recalculează imediat
+        params = (parametri_indicatori(strategie), strategie.get("RSI_OS", 35), strategie.get("RSI_OB", 65))
+
+        # ⚡ Aceeași candelă, același close → returnăm semnalul precedent
+        prev = ultima_ora_semnal.get(pair)
+        if prev is not None and prev["ora"] == ultima_ora and prev["close"] == ultimul_close \
+                and prev["params"] == params:
+            return prev["semnal"], prev["scor"], prev["volatilitate"]
 
-        # 🔄 Volatilitate
-        volatilitate = calculeaza_volatilitate(close_prices)
+        # 📈 RSI + 📉 MACD + 🔄 Volatilitate (incremental, aceleași formule ca calculeaza_RSI/MACD/volatilitate)
+        rsi_curent, macd_curent, signal_curent, volatilitate = actualizeaza_indicatori(pair, ohlc, strategie, ultimul_close)
 
         # 🧠 Praguri RSI relaxate (35/65)
         rsi_os = strategie.get("RSI_OS", 35)
@@ -79,12 +220,15 @@ def calculeaza_semnal(pair, strategie):
         # 🕐 Salvăm pentru cache
         ultima_ora_semnal[pair] = {
             "ora": ultima_ora,
+            "close": ultimul_close,
+            "params": params,
             "semnal": semnal,
             "scor": scor,
             "volatilitate": volatilitate
         }
 
-        print(f"[{datetime.now()}] 🕐 Lumânare nouă detectată ({pair}) — RSI={rsi_curent:.2f}, MACD={macd_curent:.4f}, Signal={signal_curent:.4f} → {semnal}")
+        if prev is None or prev["ora"] != ultima_ora or prev["semnal"] != semnal:
+            print(f"[{datetime.now()}] 🕐 Lumânare nouă detectată ({pair}) — RSI={rsi_curent:.2f}, MACD={macd_curent:.4f}, Signal={signal_curent:.4f} → {semnal}")
 
         return semnal, scor, volatilitate
 
@@ -1,3 +1,5 @@
+import math
+from collections import deque
 import pandas as pd
 
 def calculate_rsi(prices, period=14):
@@ -25,3 +27,146 @@ def calculate_indicators(df, strategy):
     df["sell_signal"] = (rsi > strategy["RSI_OB"]) & (macd < signal)
 
     return df
+
+
+# -------------------- STREAMING (O(1) per update) --------------------
+# Aceleași formule ca variantele pandas din strategie.py (ewm adjust=False,
+# rolling mean pentru RSI, rolling std pe pct_change), dar cu stare incrementală:
+# sume glisante (se scade valoarea care iese din fereastră, se adună cea care intră).
+# peek(pret) = valoarea pentru o lumânare încă deschisă, calculată din stare fără s-o modifice.
+
+
+class StreamingEMA:
+    def __init__(self, span):
+        self.alpha = 2.0 / (span + 1.0)
+        self.value = None
+
+    def peek(self, price):
+        price = float(price)
+        if self.value is None:
+            return price
+        return (1.0 - self.alpha) * self.value + self.alpha * price
+
+    def update(self, price):
+        self.value = self.peek(price)
+        return self.value
+
+
+class StreamingRSI:
+    def __init__(self, period=14):
+        self.period = period
+        self.prev = None
+        self.gains = deque(maxlen=period)
+        self.losses = deque(maxlen=period)
+        self.suma_gain = 0.0
+        self.suma_loss = 0.0
+        self.n_gain = 0   # câștiguri/pierderi > 0 din fereastră: o sumă glisantă care ar trebui
+        self.n_loss = 0   # să fie 0 poate rămâne 1e-12 din rotunjiri → o forțăm exact la 0
+        self.value = math.nan
+
+    def _pas(self, price):
+        # primul delta e NaN în pandas, iar where(...) îl transformă în 0
+        delta = 0.0 if self.prev is None else price - self.prev
+        gain = delta if delta > 0 else 0.0
+        loss = -delta if delta < 0 else 0.0
+        suma_gain, suma_loss = self.suma_gain + gain, self.suma_loss + loss
+        n_gain, n_loss = self.n_gain + (gain > 0), self.n_loss + (loss > 0)
+        n = len(self.gains) + 1
+        if n > self.period:
+            iese_gain, iese_loss = self.gains[0], self.losses[0]
+            suma_gain, suma_loss = suma_gain - iese_gain, suma_loss - iese_loss
+            n_gain, n_loss = n_gain - (iese_gain > 0), n_loss - (iese_loss > 0)
+            n = self.period
+        if not n_gain:
+            suma_gain = 0.0
+        if not n_loss:
+            suma_loss = 0.0
+
+        if n < self.period or suma_loss == 0:
+            value = math.nan
+        else:
+            value = 100 - (100 / (1 + suma_gain / suma_loss))
+        return gain, loss, suma_gain, suma_loss, n_gain, n_loss, value
+
+    def peek(self, price):
+        return self._pas(float(price))[-1]
+
+    def update(self, price):
+        price = float(price)
+        gain, loss, self.suma_gain, self.suma_loss, self.n_gain, self.n_loss, self.value = self._pas(price)
+        self.prev = price
+        self.gains.append(gain)
+        self.losses.append(loss)
+        return self.value
+
+
+class StreamingMACD:
+    def __init__(self, fast=12, slow=26, signal=9):
+        self.fast = StreamingEMA(fast)
+        self.slow = StreamingEMA(slow)
+        self.signal = StreamingEMA(signal)
+        self.macd = None
+        self.signal_line = None
+
+    def peek(self, price):
+        macd = self.fast.peek(price) - self.slow.peek(price)
+        return macd, self.signal.peek(macd)
+
+    def update(self, price):
+        self.macd = self.fast.update(price) - self.slow.update(price)
+        self.signal_line = self.signal.update(self.macd)
+        return self.macd, self.signal_line
+
+
+class StreamingVolatility:
+    # std (ddof=1) pe fereastra de randamente, prin Welford cu fereastră glisantă
+    def __init__(self, period=14):
+        self.period = period
+        self.prev = None
+        self.returns = deque(maxlen=period)
+        self.medie = 0.0
+        self.m2 = 0.0   # suma pătratelor abaterilor de la medie
+        self.value = math.nan
+
+    def _pas(self, price):
+        if self.prev is None:
+            return None, self.medie, self.m2, self.value
+        r = price / self.prev - 1.0
+        n = len(self.returns)
+        if n == self.period:
+            iese = self.returns[0]
+            medie = self.medie + (r - iese) / n
+            m2 = self.m2 + (r - iese) * (r - medie + iese - self.medie)
+        else:
+            n += 1
+            d = r - self.medie
+            medie = self.medie + d / n
+            m2 = self.m2 + d * (r - medie)
+
+        if n < self.period or n < 2:
+            value = math.nan
+        else:
+            value = math.sqrt(max(m2, 0.0) / (n - 1))
+        return r, medie, m2, value
+
+    def peek(self, price):
+        return self._pas(float(price))[-1]
+
+    def update(self, price):
+        price = float(price)
+        r, self.medie, self.m2, self.value = self._pas(price)
+        if r is not None:
+            self.returns.append(r)
+        self.prev = price
+        return self.value
+
+
+def warmup(indicator, prices):
+    for p in prices:
+        indicator.update(p)
+    return indicator
+
+
+def peek(indicator, price):
+    # valoarea pentru o lumânare încă deschisă, fără să modifice starea
+    return indicator.peek(price)
@@ -0,0 +1,68 @@
+import math
+import numpy as np
+import pandas as pd
+import pytest
+
+from strategie import calculeaza_RSI, calculeaza_MACD
+from technical_indicators import StreamingEMA, StreamingRSI, StreamingMACD, StreamingVolatility, peek, warmup
+
+
+def _preturi(n=2000, seed=7):
+    rng = np.random.default_rng(seed)
+    return pd.Series(30000 * np.exp(np.cumsum(rng.normal(0, 0.01, n))))
+
+
+def _flux(indicator, preturi):
+    return [indicator.update(p) for p in preturi]
+
+
+@pytest.mark.parametrize("span", [5, 12, 26, 200])
+def test_ema_ca_pandas(span):
+    preturi = _preturi()
+    asteptat = preturi.ewm(span=span, adjust=False).mean()
+    np.testing.assert_allclose(_flux(StreamingEMA(span), preturi), asteptat, rtol=1e-12)
+
+
+@pytest.mark.parametrize("period", [7, 14, 21])
+def test_rsi_ca_pandas(period):
+    preturi = _preturi()
+    asteptat = calculeaza_RSI(preturi, period)
+    np.testing.assert_allclose(_flux(StreamingRSI(period), preturi), asteptat, rtol=1e-9, equal_nan=True)
+
+
+def test_rsi_fara_pierderi_e_nan_ca_pandas():
+    # după o pierdere ieșită din fereastră, suma glisantă revine exact la 0 → NaN, nu ~100
+    preturi = pd.Series([10.0, 9.7] + [10.0 + 0.1 * i for i in range(40)])
+    asteptat = calculeaza_RSI(preturi, 14)
+    obtinut = _flux(StreamingRSI(14), preturi)
+    assert math.isnan(obtinut[-1]) and math.isnan(asteptat.iloc[-1])
+    np.testing.assert_allclose(obtinut, asteptat, rtol=1e-9, equal_nan=True)
+
+
+@pytest.mark.parametrize("fast,slow,signal", [(12, 26, 9), (8, 18, 5)])
+def test_macd_ca_pandas(fast, slow, signal):
+    preturi = _preturi()
+    macd, linie = calculeaza_MACD(preturi, fast, slow, signal)
+    obtinut = np.array(_flux(StreamingMACD(fast, slow, signal), preturi))
+    np.testing.assert_allclose(obtinut[:, 0], macd, rtol=1e-9, atol=1e-9)
+    np.testing.assert_allclose(obtinut[:, 1], linie, rtol=1e-9, atol=1e-9)
+
+
+@pytest.mark.parametrize("period", [2, 14, 30])
+def test_volatilitate_ca_pandas(period):
+    preturi = _preturi()
+    asteptat = preturi.pct_change().rolling(period).std()
+    np.testing.assert_allclose(_flux(StreamingVolatility(period), preturi), asteptat,
+                               rtol=1e-7, atol=1e-12, equal_nan=True)
+
+
+@pytest.mark.parametrize("fabrica", [lambda: StreamingEMA(12), lambda: StreamingRSI(14),
+                                     lambda: StreamingMACD(12, 26, 9), lambda: StreamingVolatility(14)])
+def test_peek_nu_modifica_starea(fabrica):
+    preturi = _preturi(300)
+    indicator = warmup(fabrica(), preturi.iloc[:-1])
+    martor = warmup(fabrica(), preturi.iloc[:-1])
+    vazut = peek(indicator, preturi.iloc[-1])
+    np.testing.assert_allclose(vazut, martor.update(preturi.iloc[-1]), rtol=0, atol=0, equal_nan=True)
+    # starea e neschimbată: un update ulterior dă același rezultat ca pe martor
+    np.testing.assert_allclose(indicator.update(preturi.iloc[-1]), vazut, rtol=0, atol=0, equal_nan=True)